@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import ArchivedMonth
+
+
+@admin.register(ArchivedMonth)
+class ArchivedMonthAdmin(admin.ModelAdmin):
+    list_display = ['model', 'month', 'row_count', 'archived_at']
+    list_filter = ['model']
+    readonly_fields = ['model', 'month', 'row_count', 'archived_at']
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def sync_archive_tables(**kwargs):
+    from .registry import ARCHIVED_MODELS
+    from .storage import sync_archive_columns
+    for spec in ARCHIVED_MODELS:
+        sync_archive_columns(spec)
+
+
+class ArchiveConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'archive'
+    verbose_name = 'Archive'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (keeps archived rows in step with deleted parents)
+        # Archive tables are not migrated with their live tables; add the columns they are missing
+        post_migrate.connect(sync_archive_tables, sender=self)
@@ -0,0 +1,8 @@
+from jobs.queue import job
+from .storage import archive_old_rows as move_old_rows
+
+
+@job()
+def archive_old_rows(batch_size=500):
+    """Move rows older than ARCHIVE_AFTER_DAYS into the monthly archive tables"""
+    return move_old_rows(batch_size=batch_size)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from archive.storage import archive_cutoff, archive_old_rows
+
+
+class Command(BaseCommand):
+    help = 'Move order history, payment transactions, stock movements and task notes/notifications older than ARCHIVE_AFTER_DAYS to the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff()
+        if cutoff is None:
+            self.stdout.write(self.style.WARNING('Archiving is disabled (ARCHIVE_AFTER_DAYS < 1)'))
+            return
+        results = archive_old_rows(batch_size=max(options['batch_size'], 1), dry_run=options['dry_run'])
+        verb = 'would move' if options['dry_run'] else 'moved'
+        total = 0
+        for label, months in results.items():
+            for month, count in months.items():
+                self.stdout.write(f'{label} {month}: {verb} {count}')
+                total += count
+        self.stdout.write(self.style.SUCCESS(f'Rows before {cutoff:%Y-%m-%d}: {verb} {total}'))
@@ -0,0 +1,27 @@
+from django.utils.dateparse import parse_date
+
+from .queries import with_archived
+
+
+def _date_param(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+class ArchiveRangeMixin:
+    """List endpoints over an archived model.
+
+    ``?since=`` / ``?until=`` (YYYY-MM-DD, inclusive) filter on the model's
+    archived time column; when the range reaches months that have been
+    archived, the archived rows are included as well.
+    """
+    archive_actions = ('list', 'export')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.archive_actions:
+            return queryset
+        params = self.request.query_params
+        return with_archived(queryset, _date_param(params.get('since')), _date_param(params.get('until')))
@@ -0,0 +1,23 @@
+from django.db import models
+
+
+class ArchivedMonth(models.Model):
+    """One calendar month of a model's rows that has been moved to its archive table.
+
+    The archive tables themselves live outside the ORM (see ``archive.storage``);
+    these rows record what has been moved, so readers only touch the archive
+    when a requested range overlaps an archived month.
+    """
+    model = models.CharField(max_length=100, help_text="Archived model label, e.g. orders.OrderHistory")
+    month = models.DateField(help_text="First day of the month")
+    row_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['model', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'month'], name='archive_month_model_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.month:%Y-%m}: {self.row_count} rows"
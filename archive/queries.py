@@ -0,0 +1,137 @@
+"""Reading archived rows alongside live ones.
+
+:func:`archived` re-points a queryset at the model's archive table, keeping
+every filter, join, annotation and ``select_related`` and returning ordinary
+model instances. :func:`with_archived` combines the two with ``UNION ALL``
+when a requested date range reaches archived months, so list endpoints,
+pagination and exports keep working on a single queryset;
+:func:`with_archived_after` does the same for the rows of one parent (an
+order's history or payments). :func:`aggregate` and :func:`grouped` total
+such a union part by part.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import QuerySet
+from django.db.models.sql.datastructures import BaseTable
+from django.utils import timezone
+
+from .models import ArchivedMonth
+from .registry import get_spec
+from .storage import archive_cutoff
+
+
+def archived(queryset):
+    """``queryset`` reading from the archive table of its model instead of the live table."""
+    spec = get_spec(queryset.model)
+    queryset = queryset._chain()
+    # The base table keeps its alias, so every column reference and join still resolves
+    alias = queryset.query.get_initial_alias()
+    queryset.query.alias_map[alias] = BaseTable(spec.archive_table, alias)
+    return queryset
+
+
+def in_range(queryset, since=None, until=None):
+    """Filter ``queryset`` to rows dated on/after ``since`` and on/before ``until`` (local dates)."""
+    field = get_spec(queryset.model).time_field
+    # Plain range bounds (not __date) so the time-column index and partition pruning apply
+    if since:
+        queryset = queryset.filter(**{f'{field}__gte': timezone.make_aware(datetime.combine(since, time.min))})
+    if until:
+        end = timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    return queryset
+
+
+def reaches_archive(model, since=None, until=None):
+    """Whether [since, until] overlaps any archived month of ``model``.
+
+    Without either bound nothing is read from the archive, so unfiltered
+    lists stay on the live table.
+    """
+    spec = get_spec(model)
+    if spec is None or (since is None and until is None):
+        return False
+    cutoff = archive_cutoff()
+    # Archived months all precede the current cutoff
+    if cutoff is not None and since is not None and since >= cutoff.date():
+        return False
+    months = ArchivedMonth.objects.filter(model=spec.label)
+    if since:
+        months = months.filter(month__gte=since.replace(day=1))
+    if until:
+        months = months.filter(month__lte=until)
+    return months.exists()
+
+
+def with_archived(queryset, since=None, until=None):
+    """Rows of ``queryset`` dated within [since, until], from the archive too when the range reaches it.
+
+    The result is a ``UNION ALL`` ordered like ``queryset``; it supports
+    pagination, ``count()`` and ``values_list()``, but aggregates need
+    :func:`aggregate`.
+    """
+    queryset = in_range(queryset, since, until)
+    if not reaches_archive(queryset.model, since, until):
+        return queryset
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+    # A union can only be ordered by its own columns
+    if any('__' in term or term == '?' for term in ordering):
+        ordering = [f'-{get_spec(queryset.model).time_field}']
+    live = queryset.order_by()
+    return live.union(archived(live), all=True).order_by(*ordering)
+
+
+def with_archived_after(queryset, created_at):
+    """``queryset`` over the rows of one parent created at ``created_at``, archived rows included.
+
+    The rows all date from after the parent was created, so for a parent
+    newer than the archive cutoff ``queryset`` is returned as it is (and any
+    prefetched rows are still used).
+    """
+    cutoff = archive_cutoff()
+    if cutoff is not None and created_at >= cutoff:
+        return queryset
+    return with_archived(queryset, since=timezone.localdate(created_at))
+
+
+def parts(queryset):
+    """The querysets a :func:`with_archived` union is made of, or just ``queryset``."""
+    query = queryset.query
+    if not query.combinator:
+        return [queryset]
+    return [QuerySet(model=queryset.model, query=part.chain()) for part in query.combined_queries]
+
+
+def _add(totals, result):
+    for key, value in result.items():
+        if value is not None:
+            totals[key] = value if totals[key] is None else totals[key] + value
+
+
+def aggregate(queryset, **expressions):
+    """``queryset.aggregate(**expressions)`` that also works on a :func:`with_archived` union.
+
+    Each part of a union is aggregated separately and the results added, so
+    only additive aggregates (``Sum``, ``Count``) are supported there.
+    """
+    totals = dict.fromkeys(expressions)
+    for part in parts(queryset):
+        _add(totals, part.order_by().aggregate(**expressions))
+    return totals
+
+
+def grouped(queryset, key, by=None, **expressions):
+    """``queryset.values(key).annotate(**expressions)`` as a list of dicts, also on a union.
+
+    ``by`` is an expression to group on, annotated as ``key`` (otherwise
+    ``key`` is a field). As with :func:`aggregate`, a union's parts are
+    grouped separately and their additive aggregates added.
+    """
+    groups = {}
+    for part in parts(queryset):
+        part = part.order_by()
+        if by is not None:
+            part = part.annotate(**{key: by})
+        for row in part.values(key).annotate(**expressions):
+            _add(groups.setdefault(row.pop(key), dict.fromkeys(expressions)), row)
+    return [{key: value, **totals} for value, totals in groups.items()]
@@ -0,0 +1,57 @@
+"""Models whose old rows are moved to archive tables, and the column that dates them."""
+from django.apps import apps
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class ArchiveSpec:
+    """An archived model: rows older than the horizon by ``time_field`` move to ``archive_table``.
+
+    Rows matching ``keep`` are never archived (e.g. unread notifications).
+    """
+
+    def __init__(self, label, time_field, keep=None):
+        self.label = label
+        self.time_field = time_field
+        self.keep = keep
+
+    @cached_property
+    def model(self):
+        return apps.get_model(self.label)
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def archive_table(self):
+        return f'{self.table}_archive'
+
+    @property
+    def time_column(self):
+        return self.model._meta.get_field(self.time_field).column
+
+    def partition_table(self, month):
+        return f'{self.archive_table}_{month:%Y%m}'
+
+    def live_rows(self):
+        queryset = self.model._base_manager.all()
+        return queryset.exclude(self.keep) if self.keep is not None else queryset
+
+
+ARCHIVED_MODELS = [
+    ArchiveSpec('orders.OrderHistory', 'timestamp'),
+    ArchiveSpec('orders.PaymentTransaction', 'created_at'),
+    ArchiveSpec('inventory.StockMovement', 'created_at'),
+    ArchiveSpec('tasks.TaskNote', 'created_at'),
+    ArchiveSpec('tasks.TaskNotification', 'created_at', keep=Q(is_read=False)),
+]
+
+
+def get_spec(model):
+    """The :class:`ArchiveSpec` for ``model`` (class or label), or ``None`` if it is not archived."""
+    label = model if isinstance(model, str) else model._meta.label
+    for spec in ARCHIVED_MODELS:
+        if spec.label == label:
+            return spec
+    return None
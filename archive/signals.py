@@ -0,0 +1,44 @@
+"""Apply foreign-key ``on_delete`` rules to archived rows.
+
+Archive tables have no foreign-key constraints, so when a parent row (an
+order, task, material or user) is deleted its archived children are deleted
+(``CASCADE``) or have the reference cleared (``SET_NULL``) here, in the same
+transaction as the delete.
+"""
+from django.db import connection, models
+from django.db.models.signals import post_delete
+
+from .models import ArchivedMonth
+from .registry import ARCHIVED_MODELS
+
+
+def _receiver(spec, field):
+    table = connection.ops.quote_name(spec.archive_table)
+    column = connection.ops.quote_name(field.column)
+    if field.remote_field.on_delete is models.CASCADE:
+        sql = f'DELETE FROM {table} WHERE {column} = %s'
+    else:
+        sql = f'UPDATE {table} SET {column} = NULL WHERE {column} = %s'
+
+    def receiver(sender, instance, **kwargs):
+        if not ArchivedMonth.objects.filter(model=spec.label).exists():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [instance.pk])
+    return receiver
+
+
+def connect_receivers():
+    for spec in ARCHIVED_MODELS:
+        for field in spec.model._meta.concrete_fields:
+            if not field.many_to_one or field.remote_field.on_delete not in (models.CASCADE, models.SET_NULL):
+                continue
+            post_delete.connect(
+                _receiver(spec, field),
+                sender=field.related_model,
+                weak=False,
+                dispatch_uid=f'archive_{spec.label}_{field.name}',
+            )
+
+
+connect_receivers()
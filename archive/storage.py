@@ -0,0 +1,178 @@
+"""Archive tables and moving old rows into them.
+
+Each archived model (see :mod:`archive.registry`) gets a ``<table>_archive``
+table with the same columns as the live table, created on first use:
+
+* Postgres: a natively partitioned table (``PARTITION BY RANGE`` on the time
+  column) with one ``<table>_archive_YYYYMM`` partition per month, so ranged
+  reads only scan the months they cover and a month can be detached or
+  dropped on its own.
+* SQLite (and anything else): a single plain table indexed on the time column.
+
+Migrations only change the live tables, so :func:`sync_archive_columns` adds
+columns the model gained to its archive table (nullable, as archived rows
+predate them) and lets columns it lost go unfilled. It runs after every
+``migrate`` (``post_migrate``, see :mod:`archive.apps`) and before each move.
+
+Rows move a whole calendar month at a time, in primary-key batches of
+``INSERT ... SELECT`` + ``DELETE`` inside one transaction each, keeping their
+ids so a row is never in both tables. Archive tables carry no foreign-key
+constraints; :mod:`archive.signals` deletes or nulls archived references
+when a parent row is deleted.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import ArchivedMonth
+from .registry import ARCHIVED_MODELS
+
+
+def month_start(value):
+    """Midnight (local time) on the first day of ``value``'s month."""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    return timezone.make_aware(datetime(value.year, value.month, 1))
+
+
+def next_month(start):
+    return month_start((start.replace(tzinfo=None) + timedelta(days=32)).date())
+
+
+def archive_cutoff(now=None):
+    """Rows dated before this are archived: the start of the month ``ARCHIVE_AFTER_DAYS`` ago.
+
+    ``None`` when archiving is disabled (``ARCHIVE_AFTER_DAYS`` < 1).
+    """
+    days = settings.ARCHIVE_AFTER_DAYS
+    if days < 1:
+        return None
+    return month_start((now or timezone.now()) - timedelta(days=days))
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _indexed_columns(spec):
+    """The time column, the primary key and every foreign-key column."""
+    opts = spec.model._meta
+    columns = [spec.time_column, opts.pk.column]
+    columns += [field.column for field in opts.concrete_fields if field.many_to_one]
+    return columns
+
+
+def ensure_archive_table(spec, month):
+    """Create ``spec``'s archive table (and on Postgres the partition for ``month``) if missing."""
+    archive = spec.archive_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {_quote(archive)} (LIKE {_quote(spec.table)}) '
+                f'PARTITION BY RANGE ({_quote(spec.time_column)})'
+            )
+            # Bounds are generated here, never user input; DDL cannot take bound parameters
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {_quote(spec.partition_table(month))} PARTITION OF {_quote(archive)} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            )
+        else:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {_quote(archive)} AS SELECT * FROM {_quote(spec.table)} WHERE 1 = 0'
+            )
+        # Indexes on a partitioned table are created on every partition, present and future
+        for column in _indexed_columns(spec):
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {_quote(f"{archive}_{column}_idx")} '
+                f'ON {_quote(archive)} ({_quote(column)})'
+            )
+    sync_archive_columns(spec)
+
+
+def sync_archive_columns(spec):
+    """Bring an existing archive table's columns in line with ``spec``'s model after migrations."""
+    archive = spec.archive_table
+    with connection.cursor() as cursor:
+        if archive not in connection.introspection.table_names(cursor):
+            return
+        existing = {column.name for column in connection.introspection.get_table_description(cursor, archive)}
+        columns = {field.column: field for field in spec.model._meta.concrete_fields}
+        for column, field in columns.items():
+            if column not in existing:
+                # On Postgres this reaches every partition
+                cursor.execute(f'ALTER TABLE {_quote(archive)} ADD COLUMN {_quote(column)} {field.db_type(connection)}')
+        if connection.vendor == 'postgresql':
+            # LIKE copied the live NOT NULL constraints; a column the model dropped is no longer filled in
+            for column in existing - set(columns):
+                cursor.execute(f'ALTER TABLE {_quote(archive)} ALTER COLUMN {_quote(column)} DROP NOT NULL')
+
+
+def pending_months(spec, cutoff):
+    """``{month_start: row_count}`` of live rows dated before ``cutoff``."""
+    rows = (
+        spec.live_rows()
+        .filter(**{f'{spec.time_field}__lt': cutoff})
+        .annotate(archive_month=TruncMonth(spec.time_field))
+        .values_list('archive_month')
+        .annotate(n=Count('pk'))
+        .order_by('archive_month')
+    )
+    return {month_start(month): count for month, count in rows}
+
+
+def archive_month(spec, month, batch_size=500):
+    """Move ``spec``'s live rows dated in ``month`` to its archive table; returns the number moved."""
+    ensure_archive_table(spec, month)
+    opts = spec.model._meta
+    columns = ', '.join(_quote(field.column) for field in opts.concrete_fields)
+    pk = _quote(opts.pk.column)
+    batch = (
+        spec.live_rows()
+        .filter(**{f'{spec.time_field}__gte': month, f'{spec.time_field}__lt': next_month(month)})
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(batch.select_for_update()[:batch_size])
+            if not ids:
+                break
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {_quote(spec.archive_table)} ({columns}) '
+                    f'SELECT {columns} FROM {_quote(spec.table)} WHERE {pk} IN ({placeholders})',
+                    ids,
+                )
+                cursor.execute(f'DELETE FROM {_quote(spec.table)} WHERE {pk} IN ({placeholders})', ids)
+            record, _ = ArchivedMonth.objects.get_or_create(model=spec.label, month=month.date())
+            ArchivedMonth.objects.filter(pk=record.pk).update(
+                row_count=F('row_count') + len(ids), archived_at=timezone.now()
+            )
+        moved += len(ids)
+    return moved
+
+
+def archive_old_rows(batch_size=500, dry_run=False, now=None):
+    """Archive every registered model's rows older than the cutoff.
+
+    Returns ``{label: {'YYYY-MM': rows}}``; with ``dry_run`` the rows that
+    would move are counted and nothing is changed.
+    """
+    cutoff = archive_cutoff(now)
+    if cutoff is None:
+        return {}
+    results = {}
+    for spec in ARCHIVED_MODELS:
+        months = pending_months(spec, cutoff)
+        if not dry_run:
+            months = {month: archive_month(spec, month, batch_size) for month in months}
+        results[spec.label] = {f'{month:%Y-%m}': count for month, count in months.items() if count}
+    return results
@@ -0,0 +1,61 @@
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.queue import job
+from .models import Material, StockAlert, MaterialConsumptionPrediction
+
+
+@job()
+def calculate_predictions():
+    """Calculate consumption predictions for all active materials"""
+    materials = Material.objects.filter(is_active=True)
+    predictions_created = 0
+    for material in materials:
+        if MaterialConsumptionPrediction.calculate_for_material(material):
+            predictions_created += 1
+    return {'predictions_created': predictions_created, 'total_materials': len(materials)}
+
+
+@job()
+def generate_low_stock_alerts():
+    """Create an active alert for every low/critical material that does not have one yet"""
+    materials = list(Material.objects.filter(
+        is_active=True,
+        current_stock__lte=F('minimum_stock')
+    ))
+    existing = set(StockAlert.objects.filter(
+        material__in=materials, status='active'
+    ).values_list('material_id', 'alert_type'))
+
+    new_alerts = []
+    for material in materials:
+        alert_type = 'critical_stock' if material.is_critical_stock else 'low_stock'
+        if (material.id, alert_type) in existing:
+            continue
+        message = f"{material.name} stock is {'critically low' if material.is_critical_stock else 'low'}. Current: {material.current_stock} {material.unit}, Minimum: {material.minimum_stock} {material.unit}"
+        new_alerts.append(StockAlert(material=material, alert_type=alert_type, message=message))
+    StockAlert.objects.bulk_create(new_alerts, ignore_conflicts=True)
+    return {'alerts_created': len(new_alerts), 'total_low_stock_materials': len(materials)}
+
+
+@job()
+def maintain_stock_alerts():
+    """Keep active low/critical stock alerts in line with current stock levels.
+
+    New shortages get an alert (see generate_low_stock_alerts); active alerts whose
+    material has recovered, or moved between low and critical, are resolved.
+    """
+    created = generate_low_stock_alerts()
+
+    wanted = {
+        (material.id, 'critical_stock' if material.is_critical_stock else 'low_stock')
+        for material in Material.objects.filter(is_active=True, current_stock__lte=F('minimum_stock'))
+    }
+    active = StockAlert.objects.filter(status='active', alert_type__in=['low_stock', 'critical_stock'])
+    stale_ids = [
+        alert_id for alert_id, material_id, alert_type in active.values_list('id', 'material_id', 'alert_type')
+        if (material_id, alert_type) not in wanted
+    ]
+    if stale_ids:
+        StockAlert.objects.filter(pk__in=stale_ids, status='active').update(status='resolved', resolved_at=timezone.now())
+    return {**created, 'alerts_resolved': len(stale_ids)}
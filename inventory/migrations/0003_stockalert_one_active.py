@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_remove_category_requirement'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='stockalert',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('material', 'alert_type'), name='inventory_stockalert_one_active'),
+        ),
+    ]
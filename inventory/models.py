@@ -236,7 +236,11 @@ class StockAlert(models.Model):
     
     class Meta:
         ordering = ['-created_at']
-        unique_together = ['material', 'alert_type', 'status']
+        constraints = [
+            # One open alert per shortage; acknowledged and resolved alerts are kept as history
+            models.UniqueConstraint(fields=['material', 'alert_type'], condition=models.Q(status='active'),
+                                    name='inventory_stockalert_one_active'),
+        ]
     
     def __str__(self):
         return f"{self.get_alert_type_display()}: {self.material.name}"
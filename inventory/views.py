@@ -1,6 +1,6 @@
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db.models import Q, Sum, F
+from django.db.models import Q, Sum, F, DecimalField, ExpressionWrapper
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
@@ -9,6 +9,10 @@ from django_filters.rest_framework import DjangoFilterBackend
 from datetime import timedelta
 from decimal import Decimal
 
+from jobs.queue import enqueue
+from oox_system.exports import EXPORT_FORMATS, streaming_export
+from archive.mixins import ArchiveRangeMixin
+
 from .models import (
     MaterialCategory, Supplier, Material, StockMovement,
     ProductMaterial, StockAlert, MaterialConsumptionPrediction
@@ -433,7 +437,7 @@ class MaterialViewSet(viewsets.ModelViewSet):
         return Response(response_data)
 
 
-class StockMovementViewSet(viewsets.ModelViewSet):
+class StockMovementViewSet(ArchiveRangeMixin, viewsets.ModelViewSet):
     """Stock movement management for warehouse operations"""
     queryset = StockMovement.objects.all()
     serializer_class = StockMovementSerializer
@@ -455,6 +459,33 @@ class StockMovementViewSet(viewsets.ModelViewSet):
         # Other roles can only see movements they created
         return queryset.filter(created_by=user)
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the filtered stock movements as CSV or XLSX (?file_format=csv|xlsx)"""
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f'file_format must be one of: {", ".join(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        # Annotated before filtering: archived ranges come back as a union, which cannot be annotated
+        queryset = self.filter_queryset(self.get_queryset().annotate(
+            line_cost=ExpressionWrapper(F('quantity') * F('unit_cost'), output_field=DecimalField(max_digits=14, decimal_places=2))
+        ))
+        return streaming_export(queryset, [
+            ('Date', 'created_at'),
+            ('Material', 'material__name'),
+            ('Movement Type', 'movement_type'),
+            ('Quantity', 'quantity'),
+            ('Unit Cost', 'unit_cost'),
+            ('Line Cost', 'line_cost'),
+            ('Reason', 'reason'),
+            ('Reference Type', 'reference_type'),
+            ('Reference ID', 'reference_id'),
+            ('Created By', 'created_by__username'),
+            ('Notes', 'notes'),
+        ], 'stock-movements', export_format, totals={
+            'quantity': Sum('quantity'),
+            'line_cost': Sum('line_cost'),
+        })
+    
     def perform_create(self, serializer):
         """Create stock movement and update material stock"""
         try:
@@ -627,36 +658,13 @@ class StockAlertViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def generate_low_stock_alerts(self, request):
-        """Generate alerts for low stock materials"""
-        materials = Material.objects.filter(
-            is_active=True,
-            current_stock__lte=F('minimum_stock')
-        )
-        
-        created_count = 0
-        for material in materials:
-            alert_type = 'critical_stock' if material.is_critical_stock else 'low_stock'
-            message = f"{material.name} stock is {'critically low' if material.is_critical_stock else 'low'}. Current: {material.current_stock} {material.unit}, Minimum: {material.minimum_stock} {material.unit}"
-            
-            # Check if alert already exists
-            existing_alert = StockAlert.objects.filter(
-                material=material,
-                alert_type=alert_type,
-                status='active'
-            ).first()
-            
-            if not existing_alert:
-                StockAlert.objects.create(
-                    material=material,
-                    alert_type=alert_type,
-                    message=message
-                )
-                created_count += 1
-        
+        """Queue generation of alerts for low stock materials"""
+        queued = enqueue('inventory.generate_low_stock_alerts', idempotency_key='inventory.generate_low_stock_alerts')
         return Response({
-            'message': f'{created_count} new stock alerts generated',
-            'total_low_stock_materials': materials.count()
-        })
+            'message': 'Low stock alert generation queued',
+            'job_id': queued.id,
+            'job_status': queued.status
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class MaterialConsumptionPredictionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -669,19 +677,13 @@ class MaterialConsumptionPredictionViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['post'])
     def calculate_predictions(self, request):
-        """Calculate consumption predictions for all materials"""
-        materials = Material.objects.filter(is_active=True)
-        predictions_created = 0
-        
-        for material in materials:
-            prediction = MaterialConsumptionPrediction.calculate_for_material(material)
-            if prediction:
-                predictions_created += 1
-        
+        """Queue consumption prediction calculation for all materials"""
+        queued = enqueue('inventory.calculate_predictions', idempotency_key='inventory.calculate_predictions')
         return Response({
-            'message': f'Calculated predictions for {predictions_created} materials',
-            'total_materials': materials.count()
-        })
+            'message': 'Prediction calculation queued',
+            'job_id': queued.id,
+            'job_status': queued.status
+        }, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['get'])
     def shortage_predictions(self, request):
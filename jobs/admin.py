@@ -0,0 +1,31 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Job, ScheduleState, SchedulerLease
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'name', 'created_at']
+    search_fields = ['name', 'idempotency_key', 'last_error']
+    readonly_fields = ['created_at', 'updated_at', 'finished_at', 'locked_by', 'locked_at', 'result', 'last_error']
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected failed jobs')
+    def retry_jobs(self, request, queryset):
+        updated = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f'{updated} job(s) queued for retry')
+
+
+@admin.register(ScheduleState)
+class ScheduleStateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_status', 'last_run_at', 'last_finished_at', 'next_run_at']
+    list_filter = ['last_status']
+    readonly_fields = ['last_run_at', 'last_finished_at', 'last_status', 'last_result', 'last_error', 'next_run_at']
+
+
+@admin.register(SchedulerLease)
+class SchedulerLeaseAdmin(admin.ModelAdmin):
+    list_display = ['name', 'holder', 'expires_at']
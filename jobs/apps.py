@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+    verbose_name = 'Background Jobs'
+
+    def ready(self):
+        from django.utils.module_loading import autodiscover_modules
+        from oox_system.metrics import register_collector
+        from .queue import queue_depth_metrics
+
+        # Job handlers live in each app's jobs.py (orders/jobs.py, tasks/jobs.py, ...)
+        autodiscover_modules('jobs')
+        register_collector(queue_depth_metrics)
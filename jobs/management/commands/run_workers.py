@@ -0,0 +1,53 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import worker_id, worker_loop
+from jobs.scheduler import scheduler_loop
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (claims jobs from the database queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to wait when the queue is empty (default: JOBS_POLL_INTERVAL)')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue has no runnable jobs instead of polling forever')
+        parser.add_argument('--scheduler', action='store_true',
+                            help='Also run the periodic scheduler (JOBS_SCHEDULE); safe alongside other schedulers')
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write('Stopping workers after their current job...')
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        threads = []
+        for index in range(concurrency):
+            thread = threading.Thread(
+                target=worker_loop,
+                args=(worker_id(index), stop_event, options['poll_interval'], options['burst']),
+                name=f'job-worker-{index}',
+            )
+            thread.start()
+            threads.append(thread)
+
+        if options['scheduler'] and not options['burst']:
+            thread = threading.Thread(target=scheduler_loop, args=(stop_event,), name='job-scheduler')
+            thread.start()
+            threads.append(thread)
+
+        self.stdout.write(self.style.SUCCESS(f'Started {concurrency} job worker(s)'))
+        # Join with a timeout so the main thread keeps receiving signals
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+        self.stdout.write('Workers stopped')
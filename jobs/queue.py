@@ -0,0 +1,233 @@
+"""Database-backed job queue.
+
+Handlers are registered with ``@job`` in each app's ``jobs.py`` and queued
+with :func:`enqueue`. Workers (``manage.py run_workers``, or in-process
+threads when ``JOBS_IN_PROCESS_WORKERS`` is set) claim one job at a time with
+``SELECT ... FOR UPDATE SKIP LOCKED`` on Postgres; every claim is also guarded
+by a conditional ``UPDATE ... WHERE status = 'queued'`` so SQLite stays correct.
+Failed jobs are retried with exponential backoff until ``max_attempts``.
+"""
+import logging
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class JobHandler:
+    def __init__(self, func, name, max_attempts, priority):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+
+def job(name=None, max_attempts=None, priority=0):
+    """Register a function as a job handler. It stays callable synchronously.
+
+    The default name is ``<app>.<function>``, e.g. ``inventory.calculate_predictions``
+    for ``calculate_predictions`` in ``inventory/jobs.py``. Handlers take the job
+    payload as keyword arguments and may return a JSON-serializable result.
+    """
+    def decorator(func):
+        job_name = name or f"{func.__module__.rsplit('.', 1)[0]}.{func.__name__}"
+        handler = JobHandler(
+            func, job_name,
+            max_attempts if max_attempts is not None else settings.JOBS_DEFAULT_MAX_ATTEMPTS,
+            priority,
+        )
+        _registry[job_name] = handler
+        return handler
+    return decorator
+
+
+def get_handler(name):
+    return _registry.get(name)
+
+
+def enqueue(name, payload=None, priority=None, run_at=None, idempotency_key=None, max_attempts=None):
+    """Queue a job and return it.
+
+    With an ``idempotency_key``, a job with the same key that is still queued or
+    running is returned instead of creating a duplicate.
+    """
+    handler = get_handler(name)
+    if handler is None:
+        raise ValueError(f"Unknown job '{name}'")
+
+    if idempotency_key:
+        existing = Job.objects.filter(idempotency_key=idempotency_key, status__in=Job.ACTIVE_STATUSES).first()
+        if existing:
+            return existing
+
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'priority': handler.priority if priority is None else priority,
+        'run_at': run_at or timezone.now(),
+        'idempotency_key': idempotency_key or None,
+        'max_attempts': handler.max_attempts if max_attempts is None else max_attempts,
+    }
+    try:
+        with transaction.atomic():
+            queued = Job.objects.create(**fields)
+    except IntegrityError:
+        # Lost a race with a concurrent enqueue of the same key
+        return Job.objects.get(idempotency_key=idempotency_key, status__in=Job.ACTIVE_STATUSES)
+
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_job(claim_job(queued.pk, 'eager')))
+    return queued
+
+
+def claim_job(job_id=None, worker_id=''):
+    """Claim the next runnable job (or a specific one) for ``worker_id``; None if nothing is available."""
+    for _ in range(3):
+        now = timezone.now()
+        with transaction.atomic():
+            candidates = Job.objects.filter(status='queued', run_at__lte=now)
+            if job_id is not None:
+                candidates = candidates.filter(pk=job_id)
+            candidates = candidates.order_by('-priority', 'run_at', 'id')
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            candidate = candidates.only('id').first()
+            if candidate is None:
+                return None
+            claimed = Job.objects.filter(pk=candidate.pk, status='queued').update(
+                status='running', locked_by=worker_id, locked_at=now,
+                attempts=F('attempts') + 1, updated_at=now,
+            )
+        if claimed:
+            return Job.objects.get(pk=candidate.pk)
+    # Another worker kept winning the same rows (possible on SQLite); try again next poll
+    return None
+
+
+def run_job(claimed):
+    """Run a claimed job and record success, a scheduled retry, or final failure."""
+    if claimed is None:
+        return None
+    handler = get_handler(claimed.name)
+    if handler is None:
+        return _finish(claimed, 'failed', error=f"No handler registered for '{claimed.name}'")
+
+    try:
+        result = handler(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s #%s failed (attempt %s/%s)", claimed.name, claimed.id,
+                       claimed.attempts, claimed.max_attempts, exc_info=True)
+        if claimed.attempts < claimed.max_attempts:
+            return _retry_later(claimed, error)
+        return _finish(claimed, 'failed', error=error)
+
+    if not isinstance(result, (dict, list, str, int, float, bool)):
+        result = None
+    return _finish(claimed, 'succeeded', result=result)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: base, 2x base, 4x base, ... capped at JOBS_RETRY_MAX_DELAY."""
+    delay = min(settings.JOBS_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), settings.JOBS_RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _retry_later(claimed, error):
+    now = timezone.now()
+    Job.objects.filter(pk=claimed.pk).update(
+        status='queued', run_at=now + retry_delay(claimed.attempts),
+        locked_by='', locked_at=None, last_error=error, updated_at=now,
+    )
+    return 'queued'
+
+
+def _finish(claimed, job_status, result=None, error=''):
+    now = timezone.now()
+    Job.objects.filter(pk=claimed.pk).update(
+        status=job_status, result=result, last_error=error,
+        locked_by='', locked_at=None, finished_at=now, updated_at=now,
+    )
+    return job_status
+
+
+def requeue_stale_jobs():
+    """Return jobs whose worker died mid-run to the queue (or fail them if out of attempts)."""
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', last_error='Worker stopped responding', locked_by='', locked_at=None,
+        finished_at=now, updated_at=now,
+    )
+    requeued = stale.update(status='queued', run_at=now, locked_by='', locked_at=None, updated_at=now)
+    return requeued + failed
+
+
+def worker_loop(worker_id, stop_event, poll_interval=None, burst=False):
+    """Claim and run jobs until ``stop_event`` is set (or the queue is empty, with ``burst``)."""
+    poll_interval = settings.JOBS_POLL_INTERVAL if poll_interval is None else poll_interval
+    last_reaped = None
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            if last_reaped is None or (timezone.now() - last_reaped).total_seconds() > settings.JOBS_LOCK_TIMEOUT:
+                requeue_stale_jobs()
+                last_reaped = timezone.now()
+            claimed = claim_job(worker_id=worker_id)
+            if claimed is not None:
+                run_job(claimed)
+                continue
+        except Exception:
+            logger.exception("Job worker %s hit an error while polling", worker_id)
+        if burst:
+            break
+        stop_event.wait(poll_interval)
+    close_old_connections()
+
+
+def worker_id(index=0):
+    return f"{socket.gethostname()}:{threading.get_native_id()}:{index}"
+
+
+def start_in_process_workers():
+    """Start JOBS_IN_PROCESS_WORKERS daemon threads in this (web) process."""
+    stop_event = threading.Event()
+    for index in range(settings.JOBS_IN_PROCESS_WORKERS):
+        thread = threading.Thread(
+            target=lambda i=index: worker_loop(worker_id(i), stop_event),
+            name=f'job-worker-{index}', daemon=True,
+        )
+        thread.start()
+    return stop_event
+
+
+def queue_depth_metrics():
+    """Metrics collector: jobs by name and status, and age of the oldest runnable job."""
+    rows = Job.objects.filter(status__in=['queued', 'running', 'failed']).values('name', 'status').annotate(
+        count=Count('id'), oldest=Min('run_at')
+    )
+    now = timezone.now()
+    oldest_runnable = None
+    for row in rows:
+        yield ('oox_jobs', 'gauge', 'Background jobs by name and status (succeeded jobs are not counted).',
+               {'name': row['name'], 'status': row['status']}, row['count'])
+        if row['status'] == 'queued' and row['oldest'] <= now:
+            if oldest_runnable is None or row['oldest'] < oldest_runnable:
+                oldest_runnable = row['oldest']
+    age = (now - oldest_runnable).total_seconds() if oldest_runnable else 0
+    yield ('oox_jobs_oldest_queued_age_seconds', 'gauge', 'Seconds the oldest runnable queued job has waited.', {}, age)
@@ -0,0 +1,171 @@
+"""Periodic scheduler for registered jobs.
+
+``JOBS_SCHEDULE`` maps job names to five-field cron specs (minute hour
+day-of-month month day-of-week, evaluated in ``TIME_ZONE``). Any number of
+processes may run the scheduler loop; a lease row in the database elects a
+single leader, and only the leader runs due jobs. Last-run state is stored in
+:class:`~jobs.models.ScheduleState`, so restarts and leader changes neither
+skip nor repeat runs.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ScheduleState, SchedulerLease
+from .queue import get_handler
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'scheduler'
+
+
+class CronSpec:
+    """Minimal cron expression: ``*``, ``*/n``, ``a-b``, ``a-b/n`` and comma lists per field."""
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron spec '{expression}' must have 5 fields")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        ]
+        # Standard cron: when both day fields are restricted, either one matching is enough
+        self.day_or = fields[2] != '*' and fields[4] != '*'
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/')
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-'))
+            else:
+                start = end = int(part)
+            if start < low or end > high or step < 1:
+                raise ValueError(f"Cron field '{field}' is out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def matches(self, moment):
+        weekday = (moment.weekday() + 1) % 7  # cron counts Sunday as 0
+        day_match = (
+            (moment.day in self.days or weekday in self.weekdays) if self.day_or
+            else (moment.day in self.days and weekday in self.weekdays)
+        )
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and moment.month in self.months and day_match)
+
+    def next_after(self, moment):
+        """First matching minute strictly after ``moment`` (within a year), in local time."""
+        candidate = timezone.localtime(moment).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 24 * 60):
+            if self.matches(candidate):
+                return candidate
+            candidate += timedelta(minutes=1)
+        return None
+
+
+def holder_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_leadership(holder):
+    """Take or renew the scheduler lease; True if ``holder`` is the leader."""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.JOBS_SCHEDULER_LEASE_SECONDS)
+    renewed = SchedulerLease.objects.filter(name=LEASE_NAME).filter(
+        Q(holder=holder) | Q(expires_at__lt=now)
+    ).update(holder=holder, expires_at=expires_at)
+    if renewed:
+        return True
+    try:
+        with transaction.atomic():
+            SchedulerLease.objects.create(name=LEASE_NAME, holder=holder, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_leadership(holder):
+    SchedulerLease.objects.filter(name=LEASE_NAME, holder=holder).update(expires_at=timezone.now())
+
+
+def run_due_schedules(holder, now=None):
+    """Run every scheduled job whose next cron slot has passed. Returns the names that ran."""
+    ran = []
+    for name, expression in settings.JOBS_SCHEDULE.items():
+        spec = CronSpec(expression)
+        state, _ = ScheduleState.objects.get_or_create(name=name)
+        if state.last_run_at is not None:
+            due_at = spec.next_after(state.last_run_at)
+            if due_at is None or due_at > (now or timezone.now()):
+                continue
+        # Renew before each job so a long run does not let another process take over
+        if not acquire_leadership(holder):
+            break
+        run_scheduled_job(state, spec)
+        ran.append(name)
+    return ran
+
+
+def run_scheduled_job(state, spec):
+    handler = get_handler(state.name)
+    started = timezone.now()
+    state.last_run_at = started
+    if handler is None:
+        state.last_status, state.last_result = 'failed', None
+        state.last_error = f"No handler registered for '{state.name}'"
+    else:
+        try:
+            result = handler()
+        except Exception:
+            logger.exception("Scheduled job %s failed", state.name)
+            state.last_status, state.last_result, state.last_error = 'failed', None, traceback.format_exc()
+        else:
+            state.last_status, state.last_error = 'succeeded', ''
+            state.last_result = result if isinstance(result, (dict, list, str, int, float, bool)) else None
+    state.last_finished_at = timezone.now()
+    state.next_run_at = spec.next_after(started)
+    state.save()
+
+
+def scheduler_loop(stop_event, holder=None):
+    """Tick every JOBS_SCHEDULER_TICK seconds; run due jobs while holding the lease."""
+    holder = holder or holder_id()
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            if acquire_leadership(holder):
+                run_due_schedules(holder)
+        except Exception:
+            logger.exception("Scheduler tick failed")
+        stop_event.wait(settings.JOBS_SCHEDULER_TICK)
+    try:
+        release_leadership(holder)
+    except Exception:
+        pass
+    close_old_connections()
+
+
+def start_scheduler():
+    """Start the scheduler loop in a daemon thread of this process."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=scheduler_loop, args=(stop_event,), name='job-scheduler', daemon=True)
+    thread.start()
+    return stop_event
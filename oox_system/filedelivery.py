@@ -0,0 +1,174 @@
+"""Serve stored files without tying up a Python worker for the transfer.
+
+Views call :func:`deliver_file` once their permission or signed-token checks
+pass. ``FILE_DELIVERY_BACKEND`` decides who sends the bytes:
+
+* ``nginx``: an empty response with ``X-Accel-Redirect:
+  <FILE_DELIVERY_ACCEL_PREFIX><name>``, served by nginx from an ``internal``
+  location over ``MEDIA_ROOT``::
+
+      location /protected-media/ {
+          internal;
+          alias /srv/oox/media/;
+      }
+
+* ``sendfile``: ``X-Sendfile: <absolute path>`` for Apache ``mod_xsendfile``
+  or lighttpd. Storages without local paths fall back to ``python``.
+* ``python`` (default, for local runs): Django answers with the open file.
+  Under gunicorn it is handed to ``wsgi.file_wrapper``, which sends it with
+  ``sendfile(2)``, so the bytes never pass through Python.
+
+A dotted path to a class with the same ``response()`` method also works.
+Front servers answer ``Range`` requests themselves. The ``python`` backend
+honours a single ``bytes=`` range (206/416, ``If-Range`` by date) and sends
+the whole file for multi-range requests.
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """``(start, end)`` (inclusive) of a single ``bytes=`` range, or ``None`` to send the whole file.
+
+    Raises :class:`RangeNotSatisfiable` when the range lies past the end of the file.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class _FileRange:
+    """``length`` bytes of ``file`` from ``start``.
+
+    ``fileno()`` passes through with the OS file position at ``start``, so
+    gunicorn's sendfile(2) path sends exactly ``Content-Length`` bytes from
+    there; ``read()`` stops at the end of the range for servers that iterate.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _modified_time(storage, name):
+    try:
+        return storage.get_modified_time(name)
+    except (NotImplementedError, OSError):
+        return None
+
+
+class PythonBackend:
+    """Stream from Django (sendfile(2) via ``wsgi.file_wrapper`` under gunicorn), with ``Range`` support."""
+
+    def response(self, request, storage, name):
+        size = storage.size(name)
+        modified = _modified_time(storage, name)
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if not if_range or (modified and parse_http_date_safe(if_range) == int(modified.timestamp())):
+            try:
+                byte_range = parse_range(request.headers.get('Range'), size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+        response = FileResponse(_FileRange(storage.open(name, 'rb'), start, length),
+                                status=206 if byte_range else 200)
+        response['Content-Length'] = str(length)
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        if modified:
+            response['Last-Modified'] = http_date(modified.timestamp())
+        return response
+
+
+class AccelRedirectBackend:
+    """nginx ``X-Accel-Redirect`` to the internal location at ``FILE_DELIVERY_ACCEL_PREFIX``."""
+
+    def response(self, request, storage, name):
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.FILE_DELIVERY_ACCEL_PREFIX.rstrip('/') + '/' + quote(name)
+        return response
+
+
+class SendfileHeaderBackend:
+    """``X-Sendfile`` with the file's absolute path (Apache ``mod_xsendfile``, lighttpd)."""
+
+    def response(self, request, storage, name):
+        try:
+            path = storage.path(name)
+        except NotImplementedError:
+            return PythonBackend().response(request, storage, name)
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+
+
+BACKENDS = {
+    'python': PythonBackend,
+    'nginx': AccelRedirectBackend,
+    'sendfile': SendfileHeaderBackend,
+}
+
+
+def get_backend():
+    name = settings.FILE_DELIVERY_BACKEND
+    backend = BACKENDS.get(name) or import_string(name)
+    return backend()
+
+
+def deliver_file(request, name, storage=None, content_type=None, filename=None, as_attachment=False):
+    """Response that serves the stored file ``name`` through the configured backend."""
+    response = get_backend().response(request, storage or default_storage, name)
+    if response.status_code == 416:
+        return response
+    response['Content-Type'] = content_type or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename or name.rsplit('/', 1)[-1])
+    response['Accept-Ranges'] = 'bytes'
+    return response
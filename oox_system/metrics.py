@@ -0,0 +1,321 @@
+"""In-process request metrics exposed in Prometheus text format at ``/metrics``.
+
+Each process counts into plain dictionaries (no locks; gunicorn sync workers
+serve one request at a time) and periodically writes a snapshot to its own
+file under ``METRICS_DIR``. The ``/metrics`` view merges every snapshot, so
+counters and histograms add up across all gunicorn workers without Redis or a
+push gateway. The snapshots of workers that have exited (restarts, deploys,
+crashes) are folded into one retired-totals file, so counters keep their
+totals without a file per past worker. Gauges (DB connections, job queue depth, ...) are computed at
+scrape time by collectors registered with :func:`register_collector`.
+"""
+import atexit
+import glob
+import json
+import os
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .profiling import QueryRecorder
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited workers are kept as they are
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'oox_http_requests_total': ('counter', 'HTTP requests served, by view, method and status code.'),
+    'oox_http_request_duration_seconds': ('histogram', 'Wall time spent serving a request, by view.'),
+    'oox_db_queries_total': ('counter', 'SQL statements executed while serving requests, by view.'),
+    'oox_db_query_duration_seconds_total': ('counter', 'Time spent in SQL while serving requests, by view.'),
+}
+
+_collectors = []
+
+
+def register_collector(collector):
+    """Register a callable yielding ``(name, type, help, labels, value)`` gauge samples at scrape time."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+    return collector
+
+
+class MetricsStore:
+    """Counters and histograms for the current process, persisted to a per-process snapshot file."""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._last_flush = 0.0
+        self._pid = None
+        self._filename = None
+
+    def inc(self, name, labels, amount=1):
+        self.counters[(name, _label_key(labels))] += amount
+
+    def observe(self, name, labels, value):
+        key = (name, _label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+        buckets = histogram[0]
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                buckets[index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def snapshot(self):
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+            'histograms': [[name, list(labels), data] for (name, labels), data in self.histograms.items()],
+        }
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if self._pid != os.getpid():
+            # Forked worker (e.g. gunicorn --preload): start a file of its own. The
+            # pid alone can be reused by a later worker, the start time keeps it unique.
+            self._pid = os.getpid()
+            self._filename = f'metrics-{self._pid}-{int(time.time() * 1000)}.json'
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            path = os.path.join(settings.METRICS_DIR, self._filename)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as fh:
+                json.dump(self.snapshot(), fh)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Metrics must never break request handling.
+            pass
+
+
+def _label_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+store = MetricsStore()
+atexit.register(store.flush)
+
+
+RETIRED_FILE = 'metrics-retired.json'
+
+
+def _load(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data.get('counters', []):
+        counters[(name, tuple(map(tuple, labels)))] += value
+    for name, labels, (buckets, total, count) in data.get('histograms', []):
+        key = (name, tuple(map(tuple, labels)))
+        merged = histograms.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def _owner(path):
+    """``(pid, start ms)`` of the process that wrote a snapshot, ``None`` for the retired totals."""
+    parts = os.path.basename(path)[len('metrics-'):-len('.json')].split('-')
+    if len(parts) != 2 or not all(part.isdigit() for part in parts):
+        return None
+    return int(parts[0]), int(parts[1])
+
+
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _exited(paths):
+    """Snapshots of processes that are gone: their pid is not running, or a later worker reused it."""
+    if fcntl is None:
+        # os.kill() would terminate the process on Windows
+        return set()
+    owners = {path: _owner(path) for path in paths}
+    latest = {}
+    for pid, started in filter(None, owners.values()):
+        latest[pid] = max(latest.get(pid, started), started)
+    return {
+        path for path, owner in owners.items()
+        if owner and (owner[1] < latest[owner[0]] or not _pid_running(owner[0]))
+    }
+
+
+def _retire(paths):
+    """Fold the snapshots at ``paths`` into the retired totals and remove them."""
+    retired_path = os.path.join(settings.METRICS_DIR, RETIRED_FILE)
+    retired = MetricsStore()
+    _merge(retired.counters, retired.histograms, _load(retired_path) or {})
+    for path in paths:
+        _merge(retired.counters, retired.histograms, _load(path) or {})
+    tmp_path = f'{retired_path}.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(retired.snapshot(), fh)
+    os.replace(tmp_path, retired_path)
+    for path in paths:
+        os.remove(path)
+
+
+def merged_snapshot():
+    """Sum the snapshots of every worker process, including this one and the retired totals."""
+    store.flush()
+    counters = defaultdict(float)
+    histograms = {}
+    processes = 0
+    lock = None
+    try:
+        if fcntl is not None:
+            # One process at a time reads and folds, so a folded snapshot is never counted twice
+            lock = open(os.path.join(settings.METRICS_DIR, 'metrics.lock'), 'w')
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        paths = glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json'))
+        exited = _exited(paths)
+        if exited:
+            try:
+                _retire(exited)
+                paths = glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json'))
+            except OSError:
+                pass
+        for path in paths:
+            data = _load(path)
+            if data is None:
+                continue
+            if _owner(path) and path not in exited:
+                processes += 1
+            _merge(counters, histograms, data)
+    except OSError:
+        # Metrics must never break request handling.
+        pass
+    finally:
+        if lock is not None:
+            lock.close()
+    return counters, histograms, processes
+
+
+@register_collector
+def database_connections():
+    """Open database connections; on Postgres, server-wide counts by state from pg_stat_activity."""
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COALESCE(state, 'unknown'), count(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() GROUP BY 1"
+                )
+                rows = cursor.fetchall()
+            for state, count in rows:
+                yield ('oox_db_connections', 'gauge', 'Database connections by state.',
+                       {'database': alias, 'state': state}, count)
+        else:
+            yield ('oox_db_connections', 'gauge', 'Database connections by state.',
+                   {'database': alias, 'state': 'open'}, 1 if connection.connection is not None else 0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    ]
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    counters, histograms, processes = merged_snapshot()
+    families = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        families[name].append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+            families[name].append(
+                f'{name}_bucket{_format_labels(labels + (("le", repr(bound)),))} {bucket_count}'
+            )
+        families[name].append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+        families[name].append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+        families[name].append(f'{name}_count{_format_labels(labels)} {count}')
+
+    help_text = dict(METRIC_HELP)
+    help_text['oox_metrics_processes'] = ('gauge', 'Worker processes contributing to these metrics.')
+    families['oox_metrics_processes'].append(f'oox_metrics_processes {processes}')
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception:
+            continue
+        for name, metric_type, help_line, labels, value in sorted(samples, key=lambda s: (s[0], _label_key(s[3]))):
+            help_text.setdefault(name, (metric_type, help_line))
+            families[name].append(f'{name}{_format_labels(_label_key(labels))} {_format_value(value)}')
+
+    lines = []
+    for name in sorted(families):
+        metric_type, help_line = help_text.get(name, ('untyped', ''))
+        lines.append(f'# HELP {name} {help_line}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        lines.extend(families[name])
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Count requests, latency and SQL statements per resolved view."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else 'unmatched'
+        store.inc('oox_http_requests_total', {'view': view, 'method': request.method, 'status': response.status_code})
+        store.observe('oox_http_request_duration_seconds', {'view': view}, elapsed)
+        store.inc('oox_db_queries_total', {'view': view}, recorder.count)
+        store.inc('oox_db_query_duration_seconds_total', {'view': view}, recorder.total_time)
+        store.maybe_flush()
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint. Requires ``Authorization: Bearer <METRICS_TOKEN>`` unless DEBUG."""
+    token = settings.METRICS_TOKEN
+    if token:
+        if request.headers.get('Authorization', '') != f'Bearer {token}':
+            return HttpResponseForbidden('Invalid metrics token')
+    elif not settings.DEBUG:
+        return HttpResponseForbidden('Set METRICS_TOKEN to enable /metrics')
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
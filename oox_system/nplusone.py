@@ -0,0 +1,127 @@
+"""N+1 query detection.
+
+SQL executed during a request (or inside :func:`detect_n_plus_one`) is grouped
+by normalized shape: literals, placeholders and ``IN (...)`` lists are folded,
+so ``SELECT ... WHERE id = 1`` and ``... WHERE id = 2`` count as the same
+statement. Any shape executed more than ``NPLUSONE_THRESHOLD`` times is
+reported with the project call sites that issued it.
+
+Under ``manage.py test`` the middleware raises :class:`NPlusOneError`; with
+``DEBUG`` on it logs a warning instead. Outside those two it is not installed.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s|\?')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_SKIP_PATHS = (
+    os.path.dirname(os.path.abspath(__file__)) + os.sep + 'nplusone.py',
+    os.path.dirname(os.path.abspath(__file__)) + os.sep + 'profiling.py',
+)
+
+
+class NPlusOneError(AssertionError):
+    """Raised when a statement shape repeats more often than allowed."""
+
+
+def normalize_sql(sql):
+    """Fold literals, placeholders and IN lists so per-row variants of a query compare equal."""
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _PLACEHOLDER_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('IN (...)', shape)
+    return _WHITESPACE_RE.sub(' ', shape).strip()
+
+
+def _project_call_site():
+    """Innermost stack frame that belongs to this project rather than Django or a library."""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and 'site-packages' not in filename
+                and filename not in _SKIP_PATHS):
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class NPlusOneDetector(QueryRecorder):
+    """QueryRecorder that also remembers each statement's shape and project call site."""
+
+    def __init__(self, threshold=None):
+        super().__init__()
+        self.threshold = settings.NPLUSONE_THRESHOLD if threshold is None else threshold
+        self.call_sites = defaultdict(Counter)  # shape -> Counter(call site)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.call_sites[normalize_sql(sql)][_project_call_site()] += 1
+        return super().__call__(execute, sql, params, many, context)
+
+    def offenders(self):
+        """Return [(shape, executions, [(call_site, n), ...])] for shapes above the threshold."""
+        found = []
+        for shape, sites in self.call_sites.items():
+            total = sum(sites.values())
+            if total > self.threshold:
+                found.append((shape, total, sites.most_common(3)))
+        found.sort(key=lambda item: item[1], reverse=True)
+        return found
+
+    def report(self, label):
+        lines = [f'Possible N+1 queries in {label} (threshold {self.threshold}):']
+        for shape, total, sites in self.offenders():
+            lines.append(f'  {total}x {shape[:300]}')
+            for site, n in sites:
+                lines.append(f'      {n}x from {site}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def detect_n_plus_one(label='block', threshold=None, raise_error=True):
+    """Check a block of code, e.g. in a test::
+
+        with detect_n_plus_one('orders_with_tasks'):
+            client.get('/api/tasks/dashboard/orders_with_tasks/')
+    """
+    with NPlusOneDetector(threshold) as detector:
+        yield detector
+    if detector.offenders():
+        message = detector.report(label)
+        if raise_error:
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+class NPlusOneMiddleware:
+    """Run every request under an NPlusOneDetector; raise or warn on repeated statement shapes."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'NPLUSONE_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with NPlusOneDetector() as detector:
+            response = self.get_response(request)
+        if detector.offenders():
+            message = detector.report(f'{request.method} {request.path}')
+            if settings.NPLUSONE_RAISE:
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
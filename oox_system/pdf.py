@@ -0,0 +1,258 @@
+"""Minimal PDF writer with precompiled page templates.
+
+Business documents here only need text, rules and tables in the standard
+Helvetica fonts, so this writes PDF operators directly instead of pulling in a
+rendering library. A :class:`PageTemplate` turns its static elements (titles,
+labels, rules, table headers) into a ready-made content-stream prefix once,
+when the template is defined; rendering only formats field values and table
+rows. Rendered pages are plain ``bytes`` content streams, so they can be
+cached and concatenated into a single file with :func:`build_pdf`.
+"""
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+
+FONTS = {'F1': 'Helvetica', 'F2': 'Helvetica-Bold'}
+
+# Advance widths (1/1000 em) of ASCII 32-126 from the standard Type 1 metrics
+_WIDTHS = {
+    'F1': (
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015,
+        667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778, 667, 778,
+        722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 333,
+        556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556,
+        333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ),
+    'F2': (
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611, 975,
+        722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778, 667, 778,
+        722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556, 333,
+        556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611, 611, 611,
+        389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ),
+}
+_DEFAULT_WIDTH = 556
+_ELLIPSIS = '...'
+
+
+def text_width(text, font='F1', size=10):
+    widths = _WIDTHS[font]
+    units = sum(widths[ord(ch) - 32] if 32 <= ord(ch) <= 126 else _DEFAULT_WIDTH for ch in text)
+    return units * size / 1000.0
+
+
+def fit_text(text, width, font='F1', size=10):
+    """Truncate ``text`` with an ellipsis so it fits in ``width`` points."""
+    if width is None or text_width(text, font, size) <= width:
+        return text
+    while text and text_width(text + _ELLIPSIS, font, size) > width:
+        text = text[:-1]
+    return text.rstrip() + _ELLIPSIS
+
+
+def wrap_text(text, width, font='F1', size=10, max_lines=None):
+    """Word-wrap ``text`` (honouring newlines) into lines no wider than ``width``."""
+    lines = []
+    for paragraph in text.splitlines() or ['']:
+        line = ''
+        for word in paragraph.split():
+            candidate = f'{line} {word}' if line else word
+            if line and text_width(candidate, font, size) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    if max_lines and len(lines) > max_lines:
+        lines = lines[:max_lines]
+        lines[-1] = fit_text(lines[-1] + _ELLIPSIS, width, font, size)
+    return [fit_text(line, width, font, size) for line in lines]
+
+
+def _pdf_string(text):
+    raw = text.encode('cp1252', 'replace')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _num(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def _text_op(x, y, text, font, size, align='left', width=None):
+    if align == 'right':
+        x = x + (width or 0) - text_width(text, font, size)
+    elif align == 'center':
+        x = x + ((width or 0) - text_width(text, font, size)) / 2
+    return (f'BT /{font} {_num(size)} Tf {_num(x)} {_num(y)} Td '.encode('ascii')
+            + _pdf_string(text) + b' Tj ET\n')
+
+
+class Text:
+    """Fixed text, compiled into the template."""
+
+    def __init__(self, x, y, text, font='F1', size=10, align='left', width=None):
+        self.x, self.y, self.text = x, y, text
+        self.font, self.size, self.align, self.width = font, size, align, width
+
+    def compile(self):
+        return _text_op(self.x, self.y, self.text, self.font, self.size, self.align, self.width)
+
+
+class Rule:
+    """Straight line, compiled into the template."""
+
+    def __init__(self, x1, y1, x2, y2, width=0.5, gray=0.6):
+        self.points = (x1, y1, x2, y2)
+        self.width, self.gray = width, gray
+
+    def compile(self):
+        x1, y1, x2, y2 = (_num(value) for value in self.points)
+        return f'q {_num(self.gray)} G {_num(self.width)} w {x1} {y1} m {x2} {y2} l S Q\n'.encode('ascii')
+
+
+class Field:
+    """Text filled from the render context by ``key``; wraps over ``lines`` lines when > 1."""
+
+    def __init__(self, key, x, y, font='F1', size=10, align='left', width=None, lines=1, leading=None):
+        self.key, self.x, self.y = key, x, y
+        self.font, self.size, self.align, self.width = font, size, align, width
+        self.lines, self.leading = lines, leading or size * 1.25
+
+    def render(self, context):
+        value = context.get(self.key)
+        text = '' if value is None else str(value)
+        if not text:
+            return b''
+        if self.lines > 1 and self.width:
+            lines = wrap_text(text, self.width, self.font, self.size, self.lines)
+        else:
+            lines = [fit_text(' '.join(text.split()), self.width, self.font, self.size)]
+        return b''.join(
+            _text_op(self.x, self.y - index * self.leading, line, self.font, self.size, self.align, self.width)
+            for index, line in enumerate(lines)
+        )
+
+
+class Column:
+    def __init__(self, key, header, x, width, align='left'):
+        self.key, self.header, self.x, self.width, self.align = key, header, x, width, align
+
+
+class Table:
+    """Rows of ``columns`` between ``top`` and ``bottom``; ``reserve`` keeps room on the last page for the summary."""
+
+    PADDING = 4
+
+    def __init__(self, columns, top, bottom, row_height=16, size=9, reserve=0):
+        self.columns, self.top, self.bottom = columns, top, bottom
+        self.row_height, self.size, self.reserve = row_height, size, reserve
+        self.capacity = int((top - bottom) // row_height) - 1
+        self.last_page_capacity = int((top - bottom - reserve) // row_height) - 1
+
+    def compile(self):
+        left = min(column.x for column in self.columns)
+        right = max(column.x + column.width for column in self.columns)
+        ops = [_text_op(column.x, self.top, column.header, 'F2', self.size, column.align, column.width)
+               for column in self.columns]
+        ops.append(Rule(left, self.top - 5, right, self.top - 5, width=0.75, gray=0.2).compile())
+        return b''.join(ops)
+
+    def paginate(self, rows):
+        """Split rows into per-page chunks; the last chunk leaves room for the summary."""
+        rows = list(rows)
+        chunks = []
+        while len(rows) > self.last_page_capacity:
+            chunks.append(rows[:self.capacity])
+            rows = rows[self.capacity:]
+        chunks.append(rows)
+        return chunks
+
+    def render(self, rows):
+        ops = []
+        y = self.top
+        for row in rows:
+            y -= self.row_height
+            for column in self.columns:
+                value = row.get(column.key)
+                text = fit_text('' if value is None else str(value), column.width - self.PADDING, 'F1', self.size)
+                if text:
+                    ops.append(_text_op(column.x, y, text, 'F1', self.size, column.align, column.width))
+        return b''.join(ops)
+
+
+class PageTemplate:
+    """A page layout compiled once at definition time.
+
+    ``elements`` appear on every page; ``summary`` elements only on the last
+    page (place them in the table's reserved area). The context keys
+    ``page_number``, ``page_count`` and ``page_label`` are filled in per page.
+    """
+
+    def __init__(self, elements, table=None, summary=()):
+        self.table = table
+        static = [element for element in elements if not isinstance(element, Field)]
+        self._static = b''.join(element.compile() for element in static)
+        if table is not None:
+            self._static += table.compile()
+        self._fields = [element for element in elements if isinstance(element, Field)]
+        self._summary_static = b''.join(element.compile() for element in summary if not isinstance(element, Field))
+        self._summary_fields = [element for element in summary if isinstance(element, Field)]
+
+    def render(self, context, rows=()):
+        """Return one content stream (``bytes``) per page."""
+        chunks = self.table.paginate(rows) if self.table is not None else [[]]
+        pages = []
+        for number, chunk in enumerate(chunks, start=1):
+            page_context = dict(context, page_number=number, page_count=len(chunks),
+                                page_label=f'Page {number} of {len(chunks)}')
+            ops = [self._static]
+            ops.extend(field.render(page_context) for field in self._fields)
+            if self.table is not None:
+                ops.append(self.table.render(chunk))
+            if number == len(chunks):
+                ops.append(self._summary_static)
+                ops.extend(field.render(page_context) for field in self._summary_fields)
+            pages.append(b''.join(ops))
+        return pages
+
+
+def build_pdf(pages, title=''):
+    """Assemble page content streams (from :meth:`PageTemplate.render`) into a PDF file."""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once page object numbers are known
+    ]
+    font_refs = []
+    for name, base_font in FONTS.items():
+        objects.append(f'<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} '
+                       f'/Encoding /WinAnsiEncoding >>'.encode('ascii'))
+        font_refs.append(f'/{name} {len(objects)} 0 R')
+    resources = f'<< /Font << {" ".join(font_refs)} >> >>'
+
+    page_numbers = []
+    for content in pages:
+        compressed = zlib.compress(content)
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(compressed)
+                       + compressed + b'\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                       f'/Resources {resources} /Contents {len(objects)} 0 R >>'.encode('ascii'))
+        page_numbers.append(len(objects))
+    kids = ' '.join(f'{number} 0 R' for number in page_numbers)
+    objects[1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>'.encode('ascii')
+    objects.append(b'<< /Title ' + _pdf_string(title) + b' /Producer (OOX) >>')
+    info_number = len(objects)
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += (b'trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+               % (len(objects) + 1, info_number, xref_offset))
+    return bytes(output)
@@ -0,0 +1,193 @@
+"""Per-request profiling: SQL counts and time, render time, Server-Timing headers
+and a rotating log of slow requests with optional sampled cProfile dumps.
+
+Switched on with ``PROFILING_ENABLED``. When it is off the middleware raises
+``MiddlewareNotUsed`` at startup, so Django drops it from the stack entirely.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+class QueryRecorder:
+    """Record every SQL statement executed on any configured database while active.
+
+    Usage::
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.total_time, recorder.duplicate_count
+    """
+
+    def __init__(self):
+        self.queries = []  # (sql, params, seconds)
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+        return False
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def duplicates(self):
+        """Return [(sql, times_executed)] for statement shapes run more than once.
+
+        Statements are compared by their normalized shape, so an N+1 loop running
+        the same query with a different id each time counts as repeats; ``sql`` is
+        the first statement seen of each shape.
+        """
+        from .nplusone import normalize_sql  # nplusone builds on QueryRecorder
+
+        counts = Counter()
+        examples = {}
+        for sql, _, _ in self.queries:
+            shape = normalize_sql(sql)
+            counts[shape] += 1
+            examples.setdefault(shape, sql)
+        repeated = [(examples[shape], n) for shape, n in counts.items() if n > 1]
+        repeated.sort(key=lambda pair: pair[1], reverse=True)
+        return repeated
+
+    @property
+    def duplicate_count(self):
+        """Number of executions that repeated the shape of an earlier statement."""
+        return sum(n - 1 for _, n in self.duplicates())
+
+
+def _slow_request_logger():
+    """Logger writing one JSON line per slow request to a size-rotated file."""
+    logger = logging.getLogger('oox_system.profiling.slow_requests')
+    if not logger.handlers:
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        handler = RotatingFileHandler(
+            os.path.join(settings.PROFILING_DIR, 'slow_requests.log'),
+            maxBytes=settings.PROFILING_LOG_MAX_BYTES,
+            backupCount=settings.PROFILING_LOG_BACKUP_COUNT,
+            delay=True,
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class RequestProfilingMiddleware:
+    """Measure wall time, SQL and render cost of every request.
+
+    Adds a ``Server-Timing`` header (``db``, ``render``, ``app``, ``total``) and,
+    for requests slower than ``PROFILING_SLOW_REQUEST_MS``, writes a JSON line to
+    ``PROFILING_DIR/slow_requests.log`` including the most repeated statements.
+    A fraction ``PROFILING_CPROFILE_SAMPLE_RATE`` of requests run under cProfile;
+    the stats are kept only when the sampled request turns out to be slow.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_ms = settings.PROFILING_SLOW_REQUEST_MS
+        self.sample_rate = settings.PROFILING_CPROFILE_SAMPLE_RATE
+        self.logger = _slow_request_logger()
+
+    def __call__(self, request):
+        profiler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            profiler = cProfile.Profile()
+
+        request._profiling_render_started = None
+        started = time.perf_counter()
+        with QueryRecorder() as recorder:
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        finished = time.perf_counter()
+
+        total_ms = (finished - started) * 1000
+        db_ms = recorder.total_time * 1000
+        render_ms = 0.0
+        if request._profiling_render_started is not None:
+            render_ms = (finished - request._profiling_render_started) * 1000
+        app_ms = max(total_ms - db_ms - render_ms, 0.0)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries, {recorder.duplicate_count} duplicate"',
+            f'render;dur={render_ms:.1f}',
+            f'app;dur={app_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        if total_ms >= self.slow_ms:
+            profile_path = self._dump_profile(request, profiler) if profiler else None
+            self._log_slow_request(request, response, recorder, total_ms, db_ms, render_ms, profile_path)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook returns; everything from
+        # here until get_response() returns is serialization/rendering time.
+        request._profiling_render_started = time.perf_counter()
+        return response
+
+    def _dump_profile(self, request, profiler):
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_')[:80] or 'root'
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{request.method}-{slug}.prof"
+        path = os.path.join(settings.PROFILING_DIR, filename)
+        try:
+            profiler.dump_stats(path)
+        except OSError:
+            return None
+        return path
+
+    def _log_slow_request(self, request, response, recorder, total_ms, db_ms, render_ms, profile_path):
+        resolver_match = getattr(request, 'resolver_match', None)
+        self.logger.info(json.dumps({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'db_ms': round(db_ms, 1),
+            'render_ms': round(render_ms, 1),
+            'queries': recorder.count,
+            'duplicate_queries': recorder.duplicate_count,
+            'top_duplicates': [
+                {'sql': sql[:500], 'count': n} for sql, n in recorder.duplicates()[:5]
+            ],
+            'profile': profile_path,
+        }))
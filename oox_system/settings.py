@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from decouple import config
 
@@ -27,10 +28,16 @@ INSTALLED_APPS = [
     'users',
     'inventory',
     'tasks',
+    'jobs',
+    'search',
+    'archive',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'oox_system.profiling.RequestProfilingMiddleware',  # no-op unless PROFILING_ENABLED
+    'oox_system.metrics.MetricsMiddleware',  # no-op unless METRICS_ENABLED
+    'oox_system.nplusone.NPlusOneMiddleware',  # no-op unless NPLUSONE_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -162,6 +169,92 @@ CSRF_TRUSTED_ORIGINS = [
     "https://internaloox-frontend-52go.onrender.com",
 ]
 
+# Request profiling (Server-Timing headers, slow-request log, sampled cProfile dumps)
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SLOW_REQUEST_MS = config('PROFILING_SLOW_REQUEST_MS', default=500, cast=int)
+PROFILING_CPROFILE_SAMPLE_RATE = config('PROFILING_CPROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=os.path.join(BASE_DIR, 'profiling'))
+PROFILING_LOG_MAX_BYTES = config('PROFILING_LOG_MAX_BYTES', default=5 * 1024 * 1024, cast=int)
+PROFILING_LOG_BACKUP_COUNT = config('PROFILING_LOG_BACKUP_COUNT', default=5, cast=int)
+
+# Prometheus metrics at /metrics. Each worker writes its counters to METRICS_DIR
+# and the endpoint sums them, so all gunicorn workers are reported together.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+
+# N+1 detection: a statement shape repeated more than NPLUSONE_THRESHOLD times in
+# one request is logged when DEBUG is on and raises NPlusOneError under `manage.py test`.
+RUNNING_TESTS = len(sys.argv) > 1 and sys.argv[1] == 'test'
+NPLUSONE_ENABLED = config('NPLUSONE_ENABLED', default=DEBUG or RUNNING_TESTS, cast=bool)
+NPLUSONE_RAISE = config('NPLUSONE_RAISE', default=RUNNING_TESTS, cast=bool)
+NPLUSONE_THRESHOLD = config('NPLUSONE_THRESHOLD', default=5, cast=int)
+
+# Background job queue (jobs app). Nothing runs queued jobs unless one of these is set up:
+# `python manage.py run_workers --concurrency N` as a separate process (the Procfile's
+# `worker`), JOBS_IN_PROCESS_WORKERS to poll from each web worker (render.yaml sets it),
+# or JOBS_EAGER to run each job in the request that queued it.
+JOBS_IN_PROCESS_WORKERS = config('JOBS_IN_PROCESS_WORKERS', default=0, cast=int)
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)  # run jobs right after the enqueueing transaction commits
+JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=2.0, cast=float)
+JOBS_DEFAULT_MAX_ATTEMPTS = config('JOBS_DEFAULT_MAX_ATTEMPTS', default=3, cast=int)
+JOBS_RETRY_BASE_DELAY = config('JOBS_RETRY_BASE_DELAY', default=30, cast=int)
+JOBS_RETRY_MAX_DELAY = config('JOBS_RETRY_MAX_DELAY', default=3600, cast=int)
+JOBS_LOCK_TIMEOUT = config('JOBS_LOCK_TIMEOUT', default=900, cast=int)  # running jobs older than this are requeued
+
+# Periodic jobs (cron specs in TIME_ZONE). The scheduler runs in every web process unless
+# disabled, and/or `run_workers --scheduler`; a database lease makes exactly one of them the
+# leader. Lay-buys only turn overdue through orders.flag_overdue_laybuys, so keep one running.
+JOBS_SCHEDULER_ENABLED = config('JOBS_SCHEDULER_ENABLED', default=True, cast=bool)
+JOBS_SCHEDULER_TICK = config('JOBS_SCHEDULER_TICK', default=30, cast=int)
+JOBS_SCHEDULER_LEASE_SECONDS = config('JOBS_SCHEDULER_LEASE_SECONDS', default=300, cast=int)
+JOBS_SCHEDULE = {
+    'orders.flag_overdue_laybuys': '*/30 * * * *',
+    'tasks.notify_overdue_tasks': '*/5 * * * *',
+    'tasks.refresh_duration_estimates': '10 * * * *',
+    'tasks.refresh_order_etas': '*/15 * * * *',
+    'inventory.maintain_stock_alerts': '*/15 * * * *',
+    'archive.archive_old_rows': '30 2 * * *',
+}
+
+# Task template whose steps forecast the completion of queued orders without tasks (blank: first active one)
+PRODUCTION_TEMPLATE = config('PRODUCTION_TEMPLATE', default='')
+
+# Rows fetched per round trip by streaming CSV/XLSX exports (server-side cursor on Postgres)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Uploaded product images are downscaled to fit this box by a background job
+PRODUCT_IMAGE_MAX_DIMENSION = config('PRODUCT_IMAGE_MAX_DIMENSION', default=1600, cast=int)
+
+# Largest payment-proof upload accepted (bytes); larger uploads are cut off mid-stream
+PAYMENT_PROOF_MAX_BYTES = config('PAYMENT_PROOF_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+
+# Payment-proof photos/PDFs get an EXIF-free display JPEG and a thumbnail fitting these boxes
+PAYMENT_PROOF_DISPLAY_DIMENSION = config('PAYMENT_PROOF_DISPLAY_DIMENSION', default=1600, cast=int)
+PAYMENT_PROOF_THUMBNAIL_DIMENSION = config('PAYMENT_PROOF_THUMBNAIL_DIMENSION', default=320, cast=int)
+
+# Who sends stored files (payment proofs, delivery runs): 'python' (Django, sendfile(2) under
+# gunicorn), 'nginx' (X-Accel-Redirect to the internal location below) or 'sendfile' (X-Sendfile)
+FILE_DELIVERY_BACKEND = config('FILE_DELIVERY_BACKEND', default='python')
+FILE_DELIVERY_ACCEL_PREFIX = config('FILE_DELIVERY_ACCEL_PREFIX', default='/protected-media/')
+
+# Rendered invoice/delivery-note pages are cached per order version for this long (seconds)
+DOCUMENT_CACHE_TIMEOUT = config('DOCUMENT_CACHE_TIMEOUT', default=86400, cast=int)
+
+# Country dialling code: local numbers (0...) are stored and matched as <code>...
+PHONE_COUNTRY_CODE = config('PHONE_COUNTRY_CODE', default='27')
+
+# Search: candidates fetched from the index per query, minimum relevance shown, and the
+# most rows a ?search= list filter will match
+SEARCH_CANDIDATE_LIMIT = config('SEARCH_CANDIDATE_LIMIT', default=200, cast=int)
+SEARCH_MIN_SCORE = config('SEARCH_MIN_SCORE', default=0.3, cast=float)
+SEARCH_FILTER_LIMIT = config('SEARCH_FILTER_LIMIT', default=5000, cast=int)
+
+# Order history, payment transactions, stock movements and task notes/notifications older than
+# this many days (whole months) move to archive tables nightly; 0 disables archiving
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=365, cast=int)
+
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
@@ -7,14 +7,19 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('orders.urls')),
     path('api/users/', include('users.urls')),
     path('api/inventory/', include('inventory.urls')),
     path('api/tasks/', include('tasks.urls')),
+    path('api/jobs/', include('jobs.urls')),
+    path('api/search/', include('search.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -13,4 +13,14 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oox_system.settings')
 
-application = get_wsgi_application() 
\ No newline at end of file
+application = get_wsgi_application() 
+# Optional job workers and scheduler inside each web process, for deployments without a separate worker service
+from django.conf import settings  # noqa: E402
+
+if settings.JOBS_IN_PROCESS_WORKERS:
+    from jobs.queue import start_in_process_workers  # noqa: E402
+    start_in_process_workers()
+
+if settings.JOBS_SCHEDULER_ENABLED:
+    from jobs.scheduler import start_scheduler  # noqa: E402
+    start_scheduler()
@@ -0,0 +1,349 @@
+"""Invoice and delivery-note documents.
+
+Payloads are built from a single prefetched order query (items with their
+products) plus one lookup each for the colour and fabric reference boards,
+however many orders are rendered together. PDFs are drawn with templates that
+are compiled once at import, and rendered pages are cached under the order's
+and customer's ``updated_at`` and the issue date printed on them; item
+changes touch the order, so a cached document never outlives the data it was
+drawn from or the day it was issued.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from oox_system.pdf import Column, Field, PageTemplate, Rule, Table, Text, build_pdf
+from .models import ColorReference, FabricReference, Order, OrderItem
+
+# Bump when a template changes so cached pages are not reused
+TEMPLATE_VERSION = 1
+
+DOCUMENT_KINDS = ('invoice', 'delivery_note')
+
+LEFT, RIGHT = 40, 555
+
+
+def document_queryset(queryset=None):
+    """Orders with everything a document needs, loaded in two queries."""
+    queryset = Order.objects.all() if queryset is None else queryset
+    return queryset.select_related('customer', 'assigned_to_delivery').prefetch_related(
+        Prefetch('items', OrderItem.objects.select_related('product').order_by('id'))
+    )
+
+
+def reference_names(orders):
+    """Colour and fabric names for every code used by ``orders``, one query per board."""
+    color_codes, fabric_letters = set(), set()
+    for order in orders:
+        for item in order.items.all():
+            if item.assigned_color_code:
+                color_codes.add(item.assigned_color_code)
+            if item.assigned_fabric_letter:
+                fabric_letters.add(item.assigned_fabric_letter)
+    colors = dict(ColorReference.objects.filter(color_code__in=color_codes).values_list(
+        'color_code', 'color_name')) if color_codes else {}
+    fabrics = dict(FabricReference.objects.filter(fabric_letter__in=fabric_letters).values_list(
+        'fabric_letter', 'fabric_name')) if fabric_letters else {}
+    return colors, fabrics
+
+
+def _customer(order):
+    customer = order.customer
+    return {
+        'id': customer.id if customer else None,
+        'name': (customer.name if customer else None) or order.customer_name or '',
+        'phone': customer.phone if customer else '',
+        'email': (customer.email if customer else None) or '',
+        'address': (customer.address if customer else None) or '',
+    }
+
+
+def _items(order, references):
+    colors, fabrics = references
+    items = []
+    for item in order.items.all():
+        items.append({
+            'id': item.id,
+            'product_id': item.product_id,
+            'product_name': item.product.display_name,
+            'description': item.product_description or '',
+            'quantity': item.quantity,
+            'unit_price': item.unit_price,
+            'line_total': item.total_price,
+            'fabric_letter': item.assigned_fabric_letter,
+            'fabric_name': fabrics.get(item.assigned_fabric_letter, ''),
+            'color_code': item.assigned_color_code,
+            'color_name': colors.get(item.assigned_color_code, ''),
+        })
+    if not items and order.order_type in ('revamp', 'repair') and order.revamp_name:
+        price = order.revamp_price if order.revamp_price is not None else order.total_amount
+        items.append({
+            'id': None, 'product_id': None,
+            'product_name': f"{order.get_order_type_display()}: {order.revamp_name}",
+            'description': order.revamp_description or '',
+            'quantity': 1, 'unit_price': price, 'line_total': price,
+            'fabric_letter': '', 'fabric_name': '', 'color_code': '', 'color_name': '',
+        })
+    return items
+
+
+def _json_amounts(values):
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in values.items()}
+
+
+def build_invoice(order, references):
+    items = _items(order, references)
+    subtotal = sum((item['line_total'] for item in items), Decimal('0'))
+    payload = {
+        'document': 'invoice',
+        'invoice_number': f"INV-{order.order_number}",
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'order_type': order.order_type,
+        'order_date': order.order_date,
+        'customer': _customer(order),
+        'items': items,
+        'subtotal': subtotal,
+        'total_amount': order.total_amount,
+        'deposit_amount': order.deposit_amount,
+        'amount_paid': order.total_amount - order.balance_amount,
+        'balance_amount': order.balance_amount,
+        'payment_status': order.payment_status,
+        'payment_status_display': order.get_payment_status_display(),
+        'payment_method': order.payment_method or '',
+        'laybuy': None,
+    }
+    if order.is_laybuy:
+        payload['laybuy'] = {
+            'terms': order.get_laybuy_terms_display() if order.laybuy_terms else '',
+            'due_date': order.laybuy_due_date,
+            'balance': order.laybuy_balance,
+            'payments_made': order.laybuy_payments_made,
+            'status': order.laybuy_status,
+        }
+    return payload
+
+
+def build_delivery_note(order, references):
+    items = _items(order, references)
+    driver = order.assigned_to_delivery
+    return {
+        'document': 'delivery_note',
+        'delivery_note_number': f"DN-{order.order_number}",
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'order_status': order.order_status,
+        'delivery_date': order.expected_delivery_date or order.delivery_deadline,
+        'customer': _customer(order),
+        'driver': (driver.get_full_name() or driver.username) if driver else '',
+        'items': [{key: item[key] for key in (
+            'id', 'product_id', 'product_name', 'description', 'quantity',
+            'fabric_letter', 'fabric_name', 'color_code', 'color_name',
+        )} for item in items],
+        'total_quantity': sum(item['quantity'] for item in items),
+        'balance_to_collect': order.balance_amount,
+        'delivery_notes': order.delivery_notes,
+    }
+
+
+BUILDERS = {'invoice': build_invoice, 'delivery_note': build_delivery_note}
+
+
+def build_payload(order, kind, references=None):
+    """JSON-ready payload for one document (amounts as floats, like the other endpoints)."""
+    payload = BUILDERS[kind](order, references or reference_names([order]))
+    payload = _json_amounts(payload)
+    payload['items'] = [_json_amounts(item) for item in payload['items']]
+    if payload.get('laybuy'):
+        payload['laybuy'] = _json_amounts(payload['laybuy'])
+    return payload
+
+
+# --- PDF templates (compiled at import) -------------------------------------
+
+def _money(value):
+    return f"R{value:,.2f}"
+
+
+def _date(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'hour') and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.strftime('%d %b %Y')
+
+
+def _finish(item):
+    fabric = ' '.join(filter(None, [item['fabric_letter'], item['fabric_name']]))
+    color = ' '.join(filter(None, [item['color_code'], item['color_name']]))
+    return ' / '.join(filter(None, [fabric, color]))
+
+
+_HEADER_FIELDS = [
+    Field('customer_name', LEFT, 722, font='F2', size=11, width=270),
+    Field('customer_phone', LEFT, 707, width=270),
+    Field('customer_email', LEFT, 693, width=270),
+    Field('customer_address', LEFT, 679, width=270, lines=3),
+    Field('page_label', RIGHT - 150, 30, size=8, align='right', width=150),
+    Field('footer', LEFT, 30, size=8, width=300),
+]
+
+INVOICE_TEMPLATE = PageTemplate(
+    elements=[
+        Text(LEFT, 790, 'INVOICE', font='F2', size=22),
+        Field('invoice_number', RIGHT - 200, 798, font='F2', size=12, align='right', width=200),
+        Field('issued', RIGHT - 200, 782, size=9, align='right', width=200),
+        Rule(LEFT, 765, RIGHT, 765, width=1, gray=0.2),
+        Text(LEFT, 740, 'BILL TO', font='F2', size=8),
+        Text(340, 740, 'Order number', size=9),
+        Text(340, 725, 'Order date', size=9),
+        Text(340, 710, 'Payment status', size=9),
+        Text(340, 695, 'Payment method', size=9),
+        Field('order_number', 440, 740, font='F2', size=9, width=115),
+        Field('order_date', 440, 725, size=9, width=115),
+        Field('payment_status', 440, 710, size=9, width=115),
+        Field('payment_method', 440, 695, size=9, width=115),
+        *_HEADER_FIELDS,
+    ],
+    table=Table([
+        Column('product', 'Product', LEFT, 190),
+        Column('finish', 'Fabric / Colour', 232, 122),
+        Column('quantity', 'Qty', 356, 40, align='right'),
+        Column('unit_price', 'Unit price', 400, 72, align='right'),
+        Column('line_total', 'Amount', 474, RIGHT - 474, align='right'),
+    ], top=620, bottom=50, reserve=140),
+    summary=[
+        Rule(340, 180, RIGHT, 180),
+        Text(340, 165, 'Subtotal', size=9),
+        Text(340, 150, 'Order total', size=9),
+        Text(340, 135, 'Paid to date', size=9),
+        Text(340, 116, 'Balance due', font='F2', size=11),
+        Field('subtotal', 455, 165, size=9, align='right', width=RIGHT - 455),
+        Field('total_amount', 455, 150, size=9, align='right', width=RIGHT - 455),
+        Field('amount_paid', 455, 135, size=9, align='right', width=RIGHT - 455),
+        Field('balance_amount', 435, 116, font='F2', size=11, align='right', width=RIGHT - 435),
+        Field('laybuy', LEFT, 165, size=9, width=270, lines=3),
+    ],
+)
+
+DELIVERY_NOTE_TEMPLATE = PageTemplate(
+    elements=[
+        Text(LEFT, 790, 'DELIVERY NOTE', font='F2', size=22),
+        Field('delivery_note_number', RIGHT - 200, 798, font='F2', size=12, align='right', width=200),
+        Field('issued', RIGHT - 200, 782, size=9, align='right', width=200),
+        Rule(LEFT, 765, RIGHT, 765, width=1, gray=0.2),
+        Text(LEFT, 740, 'DELIVER TO', font='F2', size=8),
+        Text(340, 740, 'Order number', size=9),
+        Text(340, 725, 'Delivery date', size=9),
+        Text(340, 710, 'Driver', size=9),
+        Text(340, 695, 'Items', size=9),
+        Field('order_number', 440, 740, font='F2', size=9, width=115),
+        Field('delivery_date', 440, 725, size=9, width=115),
+        Field('driver', 440, 710, size=9, width=115),
+        Field('total_quantity', 440, 695, size=9, width=115),
+        *_HEADER_FIELDS,
+    ],
+    table=Table([
+        Column('product', 'Product', LEFT, 200),
+        Column('description', 'Description', 242, 170),
+        Column('finish', 'Fabric / Colour', 414, 100),
+        Column('quantity', 'Qty', 515, RIGHT - 515, align='right'),
+    ], top=620, bottom=50, reserve=160),
+    summary=[
+        Text(LEFT, 180, 'NOTES', font='F2', size=8),
+        Field('delivery_notes', LEFT, 166, size=9, width=280, lines=3),
+        Text(340, 180, 'Balance to collect', font='F2', size=10),
+        Field('balance_to_collect', 455, 180, font='F2', size=10, align='right', width=RIGHT - 455),
+        Text(LEFT, 112, 'Received in good order by', size=9),
+        Rule(LEFT, 80, 260, 80),
+        Text(LEFT, 68, 'Name and signature', size=8),
+        Rule(340, 80, RIGHT, 80),
+        Text(340, 68, 'Date', size=8),
+    ],
+)
+
+TEMPLATES = {'invoice': INVOICE_TEMPLATE, 'delivery_note': DELIVERY_NOTE_TEMPLATE}
+
+
+def _page_context(payload, issued):
+    customer = payload['customer']
+    context = {
+        'issued': f"Issued {_date(issued)}",
+        'footer': f"Order {payload['order_number']}",
+        'order_number': payload['order_number'],
+        'customer_name': customer['name'],
+        'customer_phone': customer['phone'],
+        'customer_email': customer['email'],
+        'customer_address': customer['address'],
+    }
+    if payload['document'] == 'invoice':
+        laybuy = payload['laybuy']
+        context.update({
+            'invoice_number': payload['invoice_number'],
+            'order_date': _date(payload['order_date']),
+            'payment_status': payload['payment_status_display'],
+            'payment_method': payload['payment_method'],
+            'subtotal': _money(payload['subtotal']),
+            'total_amount': _money(payload['total_amount']),
+            'amount_paid': _money(payload['amount_paid']),
+            'balance_amount': _money(payload['balance_amount']),
+            'laybuy': (
+                f"Lay-buy {laybuy['terms']}: {_money(laybuy['payments_made'])} paid, "
+                f"{_money(laybuy['balance'])} outstanding, final payment due {_date(laybuy['due_date'])}."
+            ) if laybuy else '',
+        })
+        rows = [{
+            'product': item['product_name'],
+            'finish': _finish(item),
+            'quantity': item['quantity'],
+            'unit_price': _money(item['unit_price']),
+            'line_total': _money(item['line_total']),
+        } for item in payload['items']]
+    else:
+        context.update({
+            'delivery_note_number': payload['delivery_note_number'],
+            'delivery_date': _date(payload['delivery_date']),
+            'driver': payload['driver'],
+            'total_quantity': payload['total_quantity'],
+            'delivery_notes': payload['delivery_notes'],
+            'balance_to_collect': _money(payload['balance_to_collect']),
+        })
+        rows = [{
+            'product': item['product_name'],
+            'description': item['description'],
+            'finish': _finish(item),
+            'quantity': item['quantity'],
+        } for item in payload['items']]
+    return context, rows
+
+
+def cache_key(order, kind, issued):
+    customer_stamp = order.customer.updated_at.timestamp() if order.customer else 0
+    return (f"orders:document:{kind}:v{TEMPLATE_VERSION}:{order.pk}:"
+            f"{order.updated_at.timestamp()}:{customer_stamp}:{issued.isoformat()}")
+
+
+def render_pages(orders, kind):
+    """Rendered page streams for each order, in order; cache misses share one reference lookup."""
+    issued = timezone.localdate()
+    keys = [cache_key(order, kind, issued) for order in orders]
+    cached = cache.get_many(keys)
+    missing = [order for order, key in zip(orders, keys) if key not in cached]
+    if missing:
+        references = reference_names(missing)
+        rendered = {}
+        for order in missing:
+            context, rows = _page_context(BUILDERS[kind](order, references), issued)
+            rendered[cache_key(order, kind, issued)] = TEMPLATES[kind].render(context, rows)
+        cache.set_many(rendered, settings.DOCUMENT_CACHE_TIMEOUT)
+        cached.update(rendered)
+    return [cached[key] for key in keys]
+
+
+def render_pdf(orders, kind, title=''):
+    """One PDF holding the ``kind`` document of every order in ``orders``."""
+    pages = [page for order_pages in render_pages(list(orders), kind) for page in order_pages]
+    return build_pdf(pages, title=title)
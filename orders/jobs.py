@@ -0,0 +1,176 @@
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.queue import job
+from oox_system.pdf import build_pdf
+from .documents import document_queryset, render_pages
+from .models import Order, PaymentProof, Product
+
+
+@job()
+def process_product_image(product_id, sha256):
+    """Auto-orient and downscale an uploaded product main image.
+
+    ``sha256`` identifies the upload this job was queued for; if the image has
+    been replaced since, the newer upload's own job handles it.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return {'processed': False, 'reason': 'Pillow is not installed'}
+
+    product = Product.objects.filter(pk=product_id).only('id', 'main_image').first()
+    if not product or not product.main_image:
+        return {'processed': False, 'reason': 'No image'}
+    blob = bytes(product.main_image)
+    if hashlib.sha256(blob).hexdigest() != sha256:
+        return {'processed': False, 'reason': 'Image was replaced'}
+
+    try:
+        image = Image.open(io.BytesIO(blob))
+        image.load()
+    except Exception:
+        return {'processed': False, 'reason': 'Not a readable image'}
+
+    max_dimension = settings.PRODUCT_IMAGE_MAX_DIMENSION
+    oriented = ImageOps.exif_transpose(image)
+    needs_resize = max(oriented.size) > max_dimension
+    if oriented is image and not needs_resize:
+        return {'processed': False, 'reason': 'Already normalized'}
+    if needs_resize:
+        oriented.thumbnail((max_dimension, max_dimension))
+
+    output = io.BytesIO()
+    if image.format == 'PNG' or 'A' in oriented.mode or 'transparency' in oriented.info:
+        oriented.save(output, format='PNG', optimize=True)
+    else:
+        oriented.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+
+    with transaction.atomic():
+        current = Product.objects.select_for_update().filter(pk=product_id).only('id', 'main_image').first()
+        if not current or not current.main_image or hashlib.sha256(bytes(current.main_image)).hexdigest() != sha256:
+            return {'processed': False, 'reason': 'Image was replaced'}
+        current.main_image = output.getvalue()
+        current.save(update_fields=['main_image'])
+    return {'processed': True, 'size': list(oriented.size), 'bytes': len(output.getvalue())}
+
+
+def _pdf_first_page(blob, max_dimension):
+    """First page of a PDF as a PIL image via poppler's ``pdftoppm``, or ``None`` if it is not installed."""
+    from PIL import Image
+
+    executable = shutil.which('pdftoppm')
+    if not executable:
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'proof.pdf')
+        with open(source, 'wb') as file:
+            file.write(blob)
+        subprocess.run(
+            [executable, '-png', '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(max_dimension),
+             source, os.path.join(directory, 'page')],
+            check=True, capture_output=True, timeout=60,
+        )
+        with Image.open(os.path.join(directory, 'page.png')) as page:
+            page.load()
+            return page
+
+
+def _jpeg(image, max_dimension, quality):
+    from PIL import Image
+
+    image = image.copy()
+    image.thumbnail((max_dimension, max_dimension))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency (screenshots) onto white rather than black
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    output = io.BytesIO()
+    # No exif= argument: the variants carry no EXIF (GPS, device) data
+    image.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+@job()
+def process_payment_proof(sha256):
+    """Render the display and thumbnail JPEGs for a payment-proof file, shared by every proof of it.
+
+    Images are auto-oriented from EXIF and re-encoded without it; PDFs get a
+    first-page preview when poppler's ``pdftoppm`` is available.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return {'processed': False, 'reason': 'Pillow is not installed'}
+
+    proof = PaymentProof.objects.filter(sha256=sha256).exclude(proof_image='').first()
+    if not proof:
+        return {'processed': False, 'reason': 'No proof with this file'}
+    display_dimension = settings.PAYMENT_PROOF_DISPLAY_DIMENSION
+    with proof.proof_image.open('rb') as file:
+        blob = file.read()
+
+    try:
+        if proof.content_type == 'application/pdf':
+            image = _pdf_first_page(blob, display_dimension)
+            if image is None:
+                return {'processed': False, 'reason': 'pdftoppm is not installed'}
+        else:
+            image = Image.open(io.BytesIO(blob))
+            # Let the JPEG decoder downscale by a power of two while decoding
+            image.draft('RGB', (display_dimension, display_dimension))
+            image = ImageOps.exif_transpose(image)
+    except Exception:
+        return {'processed': False, 'reason': 'Not a readable image'}
+
+    variants = {}
+    for field_name, max_dimension, quality in (
+        ('display_image', display_dimension, 82),
+        ('thumbnail', settings.PAYMENT_PROOF_THUMBNAIL_DIMENSION, 75),
+    ):
+        field = PaymentProof._meta.get_field(field_name)
+        name = field.generate_filename(proof, f'{sha256[:2]}/{sha256}.jpg')
+        if field.storage.exists(name):
+            field.storage.delete(name)
+        variants[field_name] = field.storage.save(name, ContentFile(_jpeg(image, max_dimension, quality)))
+
+    updated = PaymentProof.objects.filter(sha256=sha256).update(**variants)
+    return {'processed': True, 'proofs': updated, 'size': list(image.size)}
+
+
+@job()
+def flag_overdue_laybuys():
+    """Mark active lay-buys with an outstanding balance past their due date as overdue"""
+    now = timezone.now()
+    flagged = Order.objects.filter(
+        is_laybuy=True, laybuy_status='active', laybuy_balance__gt=0, laybuy_due_date__lt=now.date()
+    ).update(laybuy_status='overdue', updated_at=now)
+    return {'flagged': flagged}
+
+
+@job()
+def render_delivery_run():
+    """Render delivery notes for every order out for delivery into one PDF, grouped by driver"""
+    orders = list(document_queryset().filter(order_status='out_for_delivery').order_by(
+        'assigned_to_delivery_id', 'delivery_deadline', 'order_number'
+    ))
+    stamp = timezone.localtime()
+    pages = [page for order_pages in render_pages(orders, 'delivery_note') for page in order_pages]
+    title = f"Delivery run {stamp:%Y-%m-%d}"
+    path = default_storage.save(
+        f"documents/delivery_runs/delivery-run-{stamp:%Y%m%d-%H%M%S}.pdf",
+        ContentFile(build_pdf(pages, title=title)),
+    )
+    return {'file': path, 'orders': len(orders), 'pages': len(pages)}
@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+
+from orders.models import Customer, Order, phone_key_is_matchable
+from search.indexing import index_objects
+
+MATCH_KEYS = ('phone', 'email')
+
+
+class Command(BaseCommand):
+    help = 'Find customers sharing a phone number (or email) and merge each group into one record'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--match', default='phone,email',
+                            help=f'Comma-separated keys that identify the same customer ({", ".join(MATCH_KEYS)})')
+        parser.add_argument('--apply', action='store_true', help='Merge the groups (default: only report them)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Duplicates re-pointed per UPDATE')
+
+    def handle(self, *args, **options):
+        keys = [key.strip() for key in options['match'].split(',') if key.strip()]
+        unknown = set(keys) - set(MATCH_KEYS)
+        if unknown:
+            self.stderr.write(self.style.ERROR(f'Unknown match keys: {", ".join(sorted(unknown))}'))
+            return
+
+        groups = self.find_groups(keys)
+        if not groups:
+            self.stdout.write(self.style.SUCCESS('No duplicate customers found'))
+            return
+
+        survivors = self.pick_survivors(groups)
+        for survivor_id, group in survivors.items():
+            others = ', '.join(str(pk) for pk in group if pk != survivor_id)
+            self.stdout.write(f'  keep #{survivor_id}, merge {others}')
+        duplicates = sum(len(group) - 1 for group in groups)
+        if not options['apply']:
+            self.stdout.write(f'{len(groups)} group(s), {duplicates} duplicate(s). Re-run with --apply to merge.')
+            return
+
+        moved = self.merge(survivors, max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {duplicates} duplicate(s) into {len(groups)} customer(s); {moved} order(s) re-pointed'
+        ))
+
+    def find_groups(self, keys):
+        """Block customers by each match key in one pass and join overlapping blocks (union-find).
+
+        Only customers sharing a key value are ever compared, so this is linear in
+        the number of customers rather than quadratic.
+        """
+        parent = {}
+
+        def find(pk):
+            root = pk
+            while parent[root] != root:
+                root = parent[root]
+            while parent[pk] != root:
+                parent[pk], pk = root, parent[pk]
+            return root
+
+        blocks = {}
+        rows = Customer.objects.order_by('id').values_list('id', 'phone_key', 'email')
+        for pk, phone_key, email in rows.iterator(chunk_size=2000):
+            parent[pk] = pk
+            block_keys = []
+            if 'phone' in keys and phone_key_is_matchable(phone_key):
+                block_keys.append(('phone', phone_key))
+            if 'email' in keys and email and email.strip():
+                block_keys.append(('email', email.strip().lower()))
+            for block_key in block_keys:
+                first = blocks.setdefault(block_key, pk)
+                if first != pk:
+                    parent[find(pk)] = find(first)
+
+        members = defaultdict(list)
+        for pk in parent:
+            members[find(pk)].append(pk)
+        return [sorted(group) for group in members.values() if len(group) > 1]
+
+    def pick_survivors(self, groups):
+        """Keep the customer with the most orders in each group (the oldest on a tie)."""
+        ids = [pk for group in groups for pk in group]
+        order_counts = dict(
+            Order.objects.filter(customer_id__in=ids).values_list('customer_id').annotate(n=Count('id')).order_by()
+        )
+        survivors = {}
+        for group in groups:
+            survivor = max(group, key=lambda pk: (order_counts.get(pk, 0), -pk))
+            survivors[survivor] = group
+        return survivors
+
+    @transaction.atomic
+    def merge(self, survivors, batch_size):
+        repoint = {pk: survivor for survivor, group in survivors.items() for pk in group if pk != survivor}
+        customers = Customer.objects.in_bulk(list(survivors) + list(repoint))
+
+        # Survivors inherit contact details they are missing, oldest duplicate first
+        changed = []
+        for survivor_id, group in survivors.items():
+            survivor = customers[survivor_id]
+            updated = False
+            for pk in group:
+                for field in ('email', 'address'):
+                    value = getattr(customers[pk], field)
+                    if value and not getattr(survivor, field):
+                        setattr(survivor, field, value)
+                        updated = True
+            if updated:
+                changed.append(survivor)
+        if changed:
+            now = timezone.now()
+            for survivor in changed:
+                survivor.updated_at = now
+            Customer.objects.bulk_update(changed, ['email', 'address', 'updated_at'], batch_size=batch_size)
+
+        moved = 0
+        items = list(repoint.items())
+        now = timezone.now()
+        for start in range(0, len(items), batch_size):
+            chunk = dict(items[start:start + batch_size])
+            moved += Order.objects.filter(customer_id__in=chunk).update(
+                customer_id=Case(
+                    *[When(customer_id=old, then=Value(new)) for old, new in chunk.items()],
+                    output_field=IntegerField(),
+                ),
+                updated_at=now,
+            )
+        Customer.objects.filter(id__in=list(repoint)).delete()
+
+        # Bulk updates skip the save signals that keep the search index current
+        index_objects('customer', Customer.objects.filter(id__in=list(survivors)))
+        index_objects('order', Order.objects.filter(customer_id__in=list(survivors)).select_related('customer'))
+        return moved
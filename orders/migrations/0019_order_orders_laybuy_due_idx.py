@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0018_order_is_laybuy_order_laybuy_balance_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['is_laybuy', 'laybuy_status', 'laybuy_due_date'], name='orders_laybuy_due_idx'),
+        ),
+    ]
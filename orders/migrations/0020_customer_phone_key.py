@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:30
+
+from django.db import migrations, models
+
+
+def fill_phone_keys(apps, schema_editor):
+    from orders.models import normalize_phone
+    Customer = apps.get_model('orders', 'Customer')
+    batch = []
+    for customer in Customer.objects.only('id', 'phone').iterator(chunk_size=1000):
+        customer.phone_key = normalize_phone(customer.phone)
+        batch.append(customer)
+        if len(batch) >= 1000:
+            Customer.objects.bulk_update(batch, ['phone_key'])
+            batch = []
+    Customer.objects.bulk_update(batch, ['phone_key'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0019_order_orders_laybuy_due_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Normalized phone digits used for lookups and de-duplication', max_length=20),
+        ),
+        migrations.RunPython(fill_phone_keys, migrations.RunPython.noop),
+    ]
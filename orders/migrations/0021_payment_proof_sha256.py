@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+def hash_existing_proofs(apps, schema_editor):
+    """Record hashes of stored proofs so new uploads of the same file reuse them; files stay where they are."""
+    from orders.uploads import _describe
+    PaymentProof = apps.get_model('orders', 'PaymentProof')
+    batch = []
+    for proof in PaymentProof.objects.exclude(proof_image='').only('id', 'proof_image').iterator(chunk_size=200):
+        try:
+            with proof.proof_image.open('rb') as file:
+                proof.sha256, proof.content_type = _describe(file)
+                proof.size = proof.proof_image.size
+        except OSError:
+            continue  # file missing from storage
+        batch.append(proof)
+        if len(batch) >= 200:
+            PaymentProof.objects.bulk_update(batch, ['sha256', 'size', 'content_type'])
+            batch = []
+    PaymentProof.objects.bulk_update(batch, ['sha256', 'size', 'content_type'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0020_customer_phone_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentproof',
+            name='content_type',
+            field=models.CharField(blank=True, editable=False, help_text="Sniffed from the file's first bytes", max_length=100),
+        ),
+        migrations.AddField(
+            model_name='paymentproof',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='paymentproof',
+            name='size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(hash_existing_proofs, migrations.RunPython.noop),
+    ]
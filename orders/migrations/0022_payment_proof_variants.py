@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:42
+
+from django.db import migrations, models
+
+
+def queue_existing_proofs(apps, schema_editor):
+    """Queue variant rendering once per stored file already on record."""
+    PaymentProof = apps.get_model('orders', 'PaymentProof')
+    Job = apps.get_model('jobs', 'Job')
+    hashes = PaymentProof.objects.exclude(sha256='').values_list('sha256', flat=True).distinct()
+    Job.objects.bulk_create([
+        Job(name='orders.process_payment_proof', payload={'sha256': sha256},
+            idempotency_key=f'orders.process_payment_proof:{sha256}')
+        for sha256 in hashes.iterator()
+    ], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0021_payment_proof_sha256'),
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentproof',
+            name='display_image',
+            field=models.FileField(blank=True, editable=False, upload_to='payment_proofs/display/'),
+        ),
+        migrations.AddField(
+            model_name='paymentproof',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, upload_to='payment_proofs/thumbnails/'),
+        ),
+        migrations.RunPython(queue_existing_proofs, migrations.RunPython.noop),
+    ]
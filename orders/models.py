@@ -1,3 +1,6 @@
+import re
+
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils import timezone
@@ -7,13 +10,48 @@ from users.models import User
 def get_default_delivery_date():
     return timezone.now().date()
 
+def normalize_phone(phone):
+    """E.164-style digits for a phone number: '082 555 0011' and '+27 82 555 0011' -> '27825550011'"""
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('00'):
+        return digits[2:]
+    if digits.startswith('0'):
+        return settings.PHONE_COUNTRY_CODE + digits[1:]
+    return digits
+
+# Shorter phone keys are placeholders or junk ('0', '123'), never evidence of the same customer
+MIN_MATCHABLE_PHONE_DIGITS = 7
+
+def phone_key_is_matchable(phone_key):
+    """Whether customers sharing ``phone_key`` can be taken to be the same customer"""
+    return len(phone_key or '') >= MIN_MATCHABLE_PHONE_DIGITS
+
+class CustomerManager(models.Manager):
+    def find_by_phone(self, phone):
+        """The oldest customer with the same phone number in any format, or None (also for unmatchable numbers)"""
+        phone_key = normalize_phone(phone)
+        if not phone_key_is_matchable(phone_key):
+            return None
+        return self.filter(phone_key=phone_key).order_by('id').first()
+
+    def get_or_create_by_phone(self, phone, defaults=None):
+        """Return (customer, created), matching on the indexed phone_key rather than the raw text"""
+        customer = self.find_by_phone(phone)
+        if customer:
+            return customer, False
+        return self.create(phone=phone, **(defaults or {})), True
+
 class Customer(models.Model):
     name = models.CharField(max_length=200)
     phone = models.CharField(max_length=15)
+    phone_key = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False,
+                                 help_text="Normalized phone digits used for lookups and de-duplication")
     email = models.EmailField(blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CustomerManager()
     
     class Meta:
         ordering = ['-created_at']
@@ -21,6 +59,13 @@ class Customer(models.Model):
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
+    def save(self, *args, **kwargs):
+        self.phone_key = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'phone_key'}
+        super().save(*args, **kwargs)
+
 class Product(models.Model):
     # Match EXACT Supabase orders_product table structure
     id = models.BigAutoField(primary_key=True)
@@ -271,6 +316,9 @@ class Order(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_laybuy', 'laybuy_status', 'laybuy_due_date'], name='orders_laybuy_due_idx'),
+        ]
     def __str__(self):
         try:
             customer_display = None
@@ -322,15 +370,14 @@ class Order(models.Model):
             
             self.queue_position = (highest_position or 0) + 1
             
-            # Calculate estimated completion date (20 business days from deposit paid)
+            # Estimate completion from the work queued ahead and recent throughput
+            # (20 business days from deposit paid until there is enough task history)
             if self.deposit_paid_date:
-                business_days = 20
-                current_date = self.deposit_paid_date.date()
-                while business_days > 0:
-                    current_date += timedelta(days=1)
-                    if current_date.weekday() < 5:  # Monday to Friday
-                        business_days -= 1
-                self.estimated_completion_date = current_date
+                from tasks.estimates import initial_completion_date
+                self.estimated_completion_date = initial_completion_date(self, self.deposit_paid_date.date())
+            # Then refined by the production forecast
+            from tasks.forecast import request_refresh
+            request_refresh()
     
     def can_set_delivery_date(self):
         """Check if delivery date can be set"""
@@ -364,6 +411,8 @@ class Order(models.Model):
                 order_status='deposit_paid',
                 queue_position__gte=1
             ).exclude(id=self.id).update(queue_position=models.F('queue_position') + 1)
+            from tasks.forecast import request_refresh
+            request_refresh()
             return True
         return False
 
@@ -431,6 +480,17 @@ class OrderItem(models.Model):
         color = self.assigned_color_code or "N/A"
         return f"{self.product.product_name} x{self.quantity} (Fabric: {fabric}, Color: {color})"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Rendered invoices/delivery notes are cached by the order's updated_at
+        Order.objects.filter(pk=self.order_id).update(updated_at=timezone.now())
+
+    def delete(self, *args, **kwargs):
+        order_id = self.order_id
+        result = super().delete(*args, **kwargs)
+        Order.objects.filter(pk=order_id).update(updated_at=timezone.now())
+        return result
+
     @property
     def total_price(self):
         return self.quantity * self.unit_price
@@ -462,6 +522,13 @@ class PaymentProof(models.Model):
     payment_type = models.CharField(max_length=50)  # e.g., "Final Payment", "Balance Payment"
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     proof_image = models.FileField(upload_to='payment_proofs/')
+    # Content hash of proof_image; identical uploads share one stored file
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    size = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    content_type = models.CharField(max_length=100, blank=True, editable=False, help_text="Sniffed from the file's first bytes")
+    # Oriented, EXIF-free JPEG variants rendered in the background (first page for PDFs)
+    display_image = models.FileField(upload_to='payment_proofs/display/', blank=True, editable=False)
+    thumbnail = models.FileField(upload_to='payment_proofs/thumbnails/', blank=True, editable=False)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
@@ -472,6 +539,15 @@ class PaymentProof(models.Model):
     def __str__(self):
         return f"Payment Proof for Order #{self.order.order_number} - {self.payment_type}"
 
+    def save(self, *args, **kwargs):
+        if self.proof_image and not self.proof_image._committed:
+            from .uploads import store_proof_file
+            store_proof_file(self)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'proof_image' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'sha256', 'size', 'content_type', 'display_image', 'thumbnail'}
+        super().save(*args, **kwargs)
+
     def clean(self):
         """Restrict uploads to images or PDFs."""
         file = self.proof_image
@@ -1,5 +1,8 @@
+from django.db.models import Q
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .models import Order
+
 class CanCreateProducts(BasePermission):
     """Allow reading products to anyone, but restrict create/update/delete to privileged roles."""
     allowed_roles = {'owner', 'admin', 'warehouse'}
@@ -7,4 +10,39 @@ class CanCreateProducts(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
             return True
-        return request.user.is_authenticated and request.user.role in self.allowed_roles
\ No newline at end of file
+        return request.user.is_authenticated and request.user.role in self.allowed_roles
+
+
+def visible_orders(user, queryset=None):
+    """Orders ``user`` may see, based on their role"""
+    queryset = Order.objects.all() if queryset is None else queryset
+
+    # Owner and Admin can see all orders
+    if user.role in ['owner', 'admin']:
+        return queryset
+
+    # Warehouse Manager can see orders assigned to warehouse or ready for production
+    elif user.role == 'warehouse':
+        return queryset.filter(
+            Q(assigned_to_warehouse=user) |
+            Q(order_status__in=['deposit_paid', 'order_ready']) |
+            Q(production_status__in=['cutting', 'sewing', 'finishing', 'quality_check'])
+        )
+
+    # Warehouse Worker can see orders assigned to them or general warehouse orders
+    elif user.role in ['warehouse_worker', 'warehouse']:
+        return queryset.filter(
+            Q(assigned_to_warehouse=user) |
+            Q(order_status__in=['deposit_paid', 'order_ready'])
+        )
+
+    # Delivery can see orders ready for delivery or assigned to them
+    elif user.role == 'delivery':
+        return queryset.filter(
+            Q(assigned_to_delivery=user) |
+            Q(order_status__in=['order_ready', 'out_for_delivery'])
+        )
+
+    # Other roles can only see orders they created
+    else:
+        return queryset.filter(created_by=user)
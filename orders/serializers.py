@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Order, Customer, PaymentProof, PaymentTransaction, OrderHistory, Product, Color, Fabric, OrderItem, ColorReference, FabricReference
 from users.serializers import UserSerializer
+from archive.queries import with_archived_after
 from decimal import Decimal
 import mimetypes
 import uuid
@@ -15,25 +16,46 @@ class CustomerSerializer(serializers.ModelSerializer):
 class PaymentProofSerializer(serializers.ModelSerializer):
 	uploaded_by = UserSerializer(read_only=True)
 	absolute_url = serializers.SerializerMethodField(read_only=True)
+	display_url = serializers.SerializerMethodField(read_only=True)
+	thumbnail_url = serializers.SerializerMethodField(read_only=True)
 	content_type = serializers.SerializerMethodField(read_only=True)
 	file_name = serializers.SerializerMethodField(read_only=True)
 	
 	class Meta:
 		model = PaymentProof
 		fields = '__all__'
-		read_only_fields = ['uploaded_by', 'uploaded_at', 'absolute_url', 'content_type', 'file_name']
+		read_only_fields = ['uploaded_by', 'uploaded_at', 'absolute_url', 'display_url', 'thumbnail_url', 'content_type', 'file_name', 'sha256', 'size']
 	
-	def get_absolute_url(self, obj):
+	def _url(self, file):
 		try:
-			if not obj.proof_image:
+			if not file:
 				return None
 			request = self.context.get('request') if hasattr(self, 'context') else None
-			url = obj.proof_image.url
+			url = file.url
 			return request.build_absolute_uri(url) if request else url
 		except Exception:
 			return None
 	
+	def get_absolute_url(self, obj):
+		return self._url(obj.proof_image)
+	
+	def _variant_url(self, obj, variant):
+		# Until the background job has rendered it, images fall back to the original; PDFs have no preview
+		if variant:
+			return self._url(variant)
+		if self.get_content_type(obj).startswith('image/'):
+			return self._url(obj.proof_image)
+		return None
+	
+	def get_display_url(self, obj):
+		return self._variant_url(obj, obj.display_image)
+	
+	def get_thumbnail_url(self, obj):
+		return self._variant_url(obj, obj.thumbnail)
+	
 	def get_content_type(self, obj):
+		if obj.content_type:
+			return obj.content_type
 		try:
 			name = getattr(obj.proof_image, 'name', '') or ''
 			ctype, _ = mimetypes.guess_type(name)
@@ -151,7 +173,7 @@ class OrderSerializer(serializers.ModelSerializer):
 	assigned_to_warehouse = UserSerializer(read_only=True)
 	assigned_to_delivery = UserSerializer(read_only=True)
 	payment_proofs = PaymentProofSerializer(many=True, read_only=True)
-	history = OrderHistorySerializer(many=True, read_only=True)
+	history = serializers.SerializerMethodField()
 	items = OrderItemSerializer(many=True, read_only=True)
 	# Add write-only items field for order creation
 	items_data = serializers.ListField(write_only=True, required=False)
@@ -168,6 +190,11 @@ class OrderSerializer(serializers.ModelSerializer):
 			'order_number', 'created_by', 'created_at', 'updated_at'
 		]
 	
+	def get_history(self, obj):
+		# An old order's history may have been moved to the archive
+		history = with_archived_after(obj.history.all(), obj.created_at)
+		return OrderHistorySerializer(history, many=True, context=self.context).data
+	
 	def validate(self, attrs):
 		# For updates, financial fields are optional
 		if self.instance:  # update
@@ -297,23 +324,27 @@ class OrderSerializer(serializers.ModelSerializer):
 		validated_data.pop('order_discount_percent', None)
 		validated_data.pop('order_discount_amount', None)
 		validated_data['created_by'] = self.context['request'].user
+
+		# Customer details instead of customer_id: reuse the customer with the same phone number
+		customer_data = validated_data.pop('customer_update', None) or self.initial_data.get('customer_data') or self.initial_data.get('customer')
+		if not validated_data.get('customer_id') and isinstance(customer_data, dict) and customer_data.get('phone'):
+			customer, created = Customer.objects.get_or_create_by_phone(customer_data['phone'], defaults={
+				'name': customer_data.get('name') or validated_data.get('customer_name') or '',
+				'email': customer_data.get('email') or None,
+				'address': customer_data.get('address') or None,
+			})
+			if not created:
+				# Only fill in what the existing record is missing
+				missing = [field for field in ('email', 'address') if customer_data.get(field) and not getattr(customer, field)]
+				for field in missing:
+					setattr(customer, field, customer_data[field])
+				if missing:
+					customer.save(update_fields=missing + ['updated_at'])
+			validated_data['customer'] = customer
 		order = super().create(validated_data)
 		
 		print(f"ORDER CREATE - Order created with ID: {order.id}")
 		
-		# Auto-calculate estimated_completion_date to 20 business days from creation
-		from datetime import timedelta
-		from django.utils import timezone
-		
-		business_days = 20
-		current_date = timezone.now().date()
-		while business_days > 0:
-			current_date += timedelta(days=1)
-			if current_date.weekday() < 5:  # Monday to Friday
-				business_days -= 1
-		order.estimated_completion_date = current_date
-		order.save()
-		
 		# Create order items
 		created_items = []
 		for item_data in items_data:
@@ -400,6 +431,14 @@ class OrderSerializer(serializers.ModelSerializer):
 				# Continue with other items instead of failing the entire order
 				continue
 		
+		# Orders joining the production queue were dated by Order._add_to_queue; date the rest from today
+		if not order.estimated_completion_date:
+			from django.utils import timezone
+			from tasks.estimates import initial_completion_date
+			
+			order.estimated_completion_date = initial_completion_date(order, timezone.localdate())
+			order.save(update_fields=['estimated_completion_date', 'updated_at'])
+		
 		print("ORDER CREATE - Order created successfully with", len(created_items), "items")
 		print("ORDER CREATE - Created item IDs:", [item.id for item in created_items])
 		return order
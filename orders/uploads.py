@@ -0,0 +1,151 @@
+"""Payment-proof uploads: streamed, hashed, size-limited, sniffed and deduplicated.
+
+:class:`PaymentProofUploadHandler` replaces Django's default upload handlers
+on the payment-proof endpoints. Each chunk is written straight to a temporary
+file while a SHA-256 is computed, so nothing is buffered in memory; the upload
+is rejected as soon as it passes ``PAYMENT_PROOF_MAX_BYTES`` (or up front,
+from the request's Content-Length) and as soon as its first bytes show it is
+not a PDF, PNG or JPEG, whatever its name or declared type says.
+
+:func:`store_proof_file` then gives the file a content-addressed name
+(``payment_proofs/ab/abcdef....png``). If a proof with the same hash already
+exists the new proof points at that blob and nothing is written; otherwise the
+temporary file is moved into storage (a rename on the local filesystem).
+Display and thumbnail variants are likewise rendered once per blob, by the
+``orders.process_payment_proof`` job, and shared by every proof that uses it.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from jobs.queue import enqueue
+
+# Leading bytes of each accepted type
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf', '.pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+    (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+]
+SNIFF_BYTES = max(len(signature) for signature, _, _ in SIGNATURES)
+EXTENSIONS = {content_type: extension for _, content_type, extension in SIGNATURES}
+
+
+class UploadRejected(Exception):
+    status_code = 400
+
+
+class UploadTooLarge(UploadRejected):
+    status_code = 413
+
+
+def sniff_content_type(head):
+    """Content type of a file from its first bytes, or ``None`` if it is not an accepted type."""
+    for signature, content_type, _ in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def _too_large():
+    limit_mb = settings.PAYMENT_PROOF_MAX_BYTES / (1024 * 1024)
+    return UploadTooLarge(f'File exceeds {limit_mb:.3g} MB limit')
+
+
+class PaymentProofUploadHandler(FileUploadHandler):
+    """Stream uploaded files to disk while hashing, limiting and sniffing them.
+
+    The finished file is a ``TemporaryUploadedFile`` with ``sha256`` set and
+    ``content_type`` replaced by the sniffed type.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # The whole body includes form fields and multipart framing, so allow some slack
+        if content_length and content_length > settings.PAYMENT_PROOF_MAX_BYTES + 64 * 1024:
+            raise _too_large()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.head = b''
+        self.sniffed = None
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+
+    def _reject(self, error):
+        self.file.close()
+        raise error
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.PAYMENT_PROOF_MAX_BYTES:
+            self._reject(_too_large())
+        if self.sniffed is None and len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._sniff()
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def _sniff(self):
+        self.sniffed = sniff_content_type(self.head)
+        if self.sniffed is None:
+            self._reject(UploadRejected('Unsupported file content. Allowed: pdf, png, jpg, jpeg'))
+
+    def file_complete(self, file_size):
+        if self.sniffed is None:
+            self._sniff()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.content_type = self.sniffed
+        self.file.sha256 = self.hasher.hexdigest()
+        return self.file
+
+
+def _describe(upload):
+    """``(sha256, content_type)`` of ``upload``, reading it only if the upload handler did not."""
+    sha256 = getattr(upload, 'sha256', None)
+    content_type = getattr(upload, 'content_type', None)
+    if sha256 and content_type in EXTENSIONS:
+        return sha256, content_type
+    hasher = hashlib.sha256()
+    head = b''
+    upload.seek(0)
+    for chunk in upload.chunks():
+        if len(head) < SNIFF_BYTES:
+            head += chunk[:SNIFF_BYTES - len(head)]
+        hasher.update(chunk)
+    upload.seek(0)
+    return hasher.hexdigest(), sniff_content_type(head) or content_type or ''
+
+
+def store_proof_file(proof):
+    """Store ``proof``'s new upload under its content hash, reusing an identical existing blob."""
+    field = proof.proof_image
+    upload = field.file
+    sha256, content_type = _describe(upload)
+    proof.sha256 = sha256
+    proof.size = upload.size
+    proof.content_type = content_type
+
+    existing = (
+        type(proof).objects.filter(sha256=sha256).exclude(proof_image='').exclude(pk=proof.pk)
+        .values('proof_image', 'display_image', 'thumbnail').first()
+    )
+    if existing:
+        field.name = existing['proof_image']
+        field._committed = True
+        upload.close()
+        proof.display_image = existing['display_image']
+        proof.thumbnail = existing['thumbnail']
+        if proof.thumbnail:
+            return
+    else:
+        extension = EXTENSIONS.get(content_type) or os.path.splitext(upload.name or '')[1].lower()
+        field.save(f'{sha256[:2]}/{sha256}{extension}', upload, save=False)
+        proof.display_image = proof.thumbnail = ''
+    # Queued in the same transaction as the proof, so the worker only sees it once the row is committed
+    enqueue('orders.process_payment_proof', {'sha256': sha256},
+            idempotency_key=f'orders.process_payment_proof:{sha256}')
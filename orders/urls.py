@@ -18,6 +18,9 @@ router.register(r'order-items', views.OrderItemViewSet)
 router.register(r'payments/transactions', views.PaymentTransactionViewSet, basename='payment-transactions')
 
 urlpatterns = [
+    # Proof of payment signed access (ahead of the router, whose payment-proofs/<pk>/ would match it)
+    path('payment-proofs/signed_file/', views.payment_proof_signed_file, name='paymentproof-signed-file'),
+
     path('', include(router.urls)),
     
     # Status options
@@ -42,9 +45,6 @@ urlpatterns = [
     path('orders/<int:pk>/invoice_data/', views.OrderViewSet.as_view({'get': 'invoice_data'}), name='invoice_data'),
     path('orders/<int:pk>/delivery_note_data/', views.OrderViewSet.as_view({'get': 'delivery_note_data'}), name='delivery_note_data'),
 
-    # Proof of payment signed access
-    path('payment-proofs/signed_file/', views.payment_proof_signed_file, name='paymentproof-signed-file'),
-
     # Dashboards/analytics
     path('orders/warehouse_analytics/', views.OrderViewSet.as_view({'get': 'warehouse_analytics'}), name='warehouse_analytics'),
     path('orders/owner_dashboard/', views.OrderViewSet.as_view({'get': 'owner_dashboard_orders'}), name='owner_dashboard_orders'),
@@ -1,7 +1,8 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
+import hashlib
 import sys
 import traceback
-from django.http import JsonResponse, FileResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404
 from rest_framework import status, viewsets, filters
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
@@ -12,14 +13,25 @@ from django.utils import timezone
 from datetime import timedelta, datetime
 from decimal import Decimal
 from django.db.models import F, Sum, Q, Count
-from .models import Order, Customer, PaymentProof, OrderHistory, Product, Color, Fabric, OrderItem, ColorReference, FabricReference
+from django.db.models.functions import TruncDate
+from django.core.files.storage import default_storage
+from .models import Order, Customer, PaymentProof, OrderHistory, Product, Color, Fabric, OrderItem, ColorReference, FabricReference, normalize_phone
 from .serializers import (
     OrderSerializer, OrderListSerializer, OrderStatusUpdateSerializer,
     CustomerSerializer, PaymentProofSerializer, OrderHistorySerializer,
     ProductSerializer, ColorSerializer, FabricSerializer, OrderItemSerializer,
     ColorReferenceSerializer, FabricReferenceSerializer
 )
-from .permissions import CanCreateProducts
+from .permissions import CanCreateProducts, visible_orders
+from oox_system.exports import EXPORT_FORMATS, streaming_export
+from oox_system.filedelivery import deliver_file
+from search.filters import IndexedSearchFilter
+from archive.mixins import ArchiveRangeMixin
+from archive.queries import aggregate, grouped, with_archived, with_archived_after
+from jobs.models import Job
+from jobs.queue import enqueue
+from .documents import build_payload, document_queryset, render_pdf
+from .uploads import PaymentProofUploadHandler, UploadRejected
 from django.db import models
 from django.urls import reverse
 
@@ -27,8 +39,9 @@ class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated]  # Change from AllowAny
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'phone', 'email']
+    search_entity = 'customer'  # ?search= uses the search index
     ordering_fields = ['created_at', 'name']
     ordering = ['-created_at']
 
@@ -68,9 +81,25 @@ class CustomerViewSet(viewsets.ModelViewSet):
                 'error': 'Permission denied: Only Owner and Admin can create customers',
                 'your_role': user.role
             }, status=status.HTTP_403_FORBIDDEN)
+
+        # A customer with the same number already exists: return it instead of a duplicate
+        existing = Customer.objects.find_by_phone(request.data.get('phone'))
+        if existing:
+            data = self.get_serializer(existing).data
+            data['existing'] = True
+            return Response(data, status=status.HTTP_200_OK)
         
         return super().create(request, *args, **kwargs)
 
+    @action(detail=False, methods=['get'])
+    def by_phone(self, request):
+        """Exact lookup by phone number in any format (?phone=082 555 0011 or +27825550011)"""
+        phone_key = normalize_phone(request.query_params.get('phone'))
+        if not phone_key:
+            return Response({'error': 'phone is required'}, status=status.HTTP_400_BAD_REQUEST)
+        customers = Customer.objects.filter(phone_key=phone_key).order_by('id')
+        return Response(self.get_serializer(customers, many=True).data)
+
     def update(self, request, *args, **kwargs):
         """Update customer with role-based permissions"""
         user = request.user
@@ -96,9 +125,10 @@ class CustomerViewSet(viewsets.ModelViewSet):
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]  # Change from AllowAny to IsAuthenticated
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['payment_status', 'order_status', 'production_status', 'created_by', 'assigned_to_warehouse', 'assigned_to_delivery']
     search_fields = ['order_number', 'customer__name', 'customer_name']
+    search_entity = 'order'
     ordering_fields = ['created_at', 'expected_delivery_date', 'total_amount']
     ordering = ['-created_at']
 
@@ -110,38 +140,7 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Filter orders based on user role"""
-        user = self.request.user
-        queryset = Order.objects.all()
-        
-        # Owner and Admin can see all orders
-        if user.role in ['owner', 'admin']:
-            return queryset
-        
-        # Warehouse Manager can see orders assigned to warehouse or ready for production
-        elif user.role == 'warehouse':
-            return queryset.filter(
-                models.Q(assigned_to_warehouse=user) |
-                models.Q(order_status__in=['deposit_paid', 'order_ready']) |
-                models.Q(production_status__in=['cutting', 'sewing', 'finishing', 'quality_check'])
-            )
-        
-        # Warehouse Worker can see orders assigned to them or general warehouse orders
-        elif user.role in ['warehouse_worker', 'warehouse']:
-            return queryset.filter(
-                models.Q(assigned_to_warehouse=user) |
-                models.Q(order_status__in=['deposit_paid', 'order_ready'])
-            )
-        
-        # Delivery can see orders ready for delivery or assigned to them
-        elif user.role == 'delivery':
-            return queryset.filter(
-                models.Q(assigned_to_delivery=user) |
-                models.Q(order_status__in=['order_ready', 'out_for_delivery'])
-            )
-        
-        # Other roles can only see orders they created
-        else:
-            return queryset.filter(created_by=user)
+        return visible_orders(self.request.user)
 
     def create(self, request, *args, **kwargs):
         """Create order with role-based permissions"""
@@ -469,6 +468,7 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def create_task(self, request, pk=None):
         """Create a task within a specific order"""
+        from tasks.estimates import estimate_duration
         from tasks.models import Task, TaskType, create_notification
         from tasks.serializers import TaskSerializer
         from users.models import User
@@ -520,9 +520,15 @@ class OrderViewSet(viewsets.ModelViewSet):
                 'priority': request.data.get('priority', 'normal'),
                 'instructions': request.data.get('instructions', ''),
                 'materials_needed': request.data.get('materials_needed', ''),
-                'estimated_duration': timedelta(minutes=request.data.get('estimated_duration', 60)),
                 'order_item_id': request.data.get('order_item_id'),
             }
+            if 'estimated_duration' in request.data:
+                task_data['estimated_duration'] = timedelta(minutes=request.data['estimated_duration'])
+            else:
+                product_id = OrderItem.objects.filter(
+                    pk=task_data['order_item_id'], order=order,
+                ).values_list('product_id', flat=True).first() if task_data['order_item_id'] else None
+                task_data['estimated_duration'] = estimate_duration(task_type, product_id, assigned_worker.pk)
             
             # Set deadline if provided
             if 'deadline' in request.data:
@@ -580,7 +586,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         queue_orders = Order.objects.filter(
             order_status='deposit_paid',
             queue_position__isnull=False
-        ).order_by('queue_position')
+        ).select_related('customer').order_by('queue_position')
         
         queue_data = []
         for order in queue_orders:
@@ -591,7 +597,10 @@ class OrderViewSet(viewsets.ModelViewSet):
                 'queue_position': order.queue_position,
                 'deposit_paid_date': order.deposit_paid_date,
                 'days_in_queue': order.days_in_queue(),
+                # Kept up to date by the production forecast (tasks.forecast)
                 'estimated_completion_date': order.estimated_completion_date,
+                'forecast_late': bool(order.estimated_completion_date and order.delivery_deadline
+                                      and order.estimated_completion_date > order.delivery_deadline),
                 'is_priority_order': order.is_priority_order,
                 'is_queue_expired': order.is_queue_expired()
             })
@@ -814,10 +823,8 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def laybuy_orders(self, request):
         """Get all active/overdue lay-buy orders."""
-        today = timezone.now().date()
         queryset = Order.objects.filter(is_laybuy=True).filter(models.Q(laybuy_status__in=['active', 'overdue']) | models.Q(order_status='deposit_paid_laybuy'))
-        # Auto-flag overdue
-        queryset.filter(laybuy_due_date__lt=today, laybuy_status='active', laybuy_balance__gt=0).update(laybuy_status='overdue')
+        # laybuy_status is flipped to overdue by the scheduled orders.flag_overdue_laybuys job
         orders = OrderListSerializer(queryset.order_by('laybuy_due_date'), many=True).data
         return Response({'orders': orders, 'count': len(orders)})
 
@@ -825,8 +832,8 @@ class OrderViewSet(viewsets.ModelViewSet):
     def overdue_laybuy(self, request):
         """Get overdue lay-buy orders."""
         today = timezone.now().date()
+        # Read-only: orders.flag_overdue_laybuys keeps laybuy_status current on a schedule
         queryset = Order.objects.filter(is_laybuy=True, laybuy_balance__gt=0, laybuy_due_date__lt=today)
-        queryset.update(laybuy_status='overdue')
         orders = OrderListSerializer(queryset.order_by('laybuy_due_date'), many=True).data
         return Response({'orders': orders, 'count': len(orders)})
 
@@ -863,6 +870,31 @@ class OrderViewSet(viewsets.ModelViewSet):
             'recent_completed': OrderListSerializer(completed.order_by('-updated_at')[:20], many=True).data,
         })
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the filtered order list as CSV or XLSX (?file_format=csv|xlsx)"""
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f'file_format must be one of: {", ".join(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        return streaming_export(queryset, [
+            ('Order Number', 'order_number'),
+            ('Created', 'created_at'),
+            ('Customer', 'customer__name'),
+            ('Order Status', 'order_status'),
+            ('Production Status', 'production_status'),
+            ('Payment Status', 'payment_status'),
+            ('Payment Method', 'payment_method'),
+            ('Total Amount', 'total_amount'),
+            ('Deposit Amount', 'deposit_amount'),
+            ('Balance Amount', 'balance_amount'),
+            ('Delivery Deadline', 'delivery_deadline'),
+        ], 'orders', export_format, totals={
+            'total_amount': Sum('total_amount'),
+            'deposit_amount': Sum('deposit_amount'),
+            'balance_amount': Sum('balance_amount'),
+        })
+
     def list(self, request, *args, **kwargs):
         if not Order.objects.exists():
             # Return mock data for frontend testing
@@ -986,7 +1018,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         warehouse_orders = self.get_queryset().filter(
             order_status__in=['deposit_paid', 'order_ready'],
             production_status__in=['not_started', 'cutting', 'sewing', 'finishing', 'quality_check']
-        ).select_related('customer').prefetch_related('items__product', 'tasks')
+        ).select_related('customer', 'task_progress').prefetch_related('items__product', 'tasks')
         
         # Organize by priority/urgency
         today = timezone.now().date()
@@ -1015,11 +1047,12 @@ class OrderViewSet(viewsets.ModelViewSet):
                 urgency = 'medium'
             
             # Count tasks by status
+            progress = getattr(order, 'task_progress', None)
             task_counts = {
-                'total': assigned_tasks.count(),
-                'not_started': assigned_tasks.filter(status='assigned').count(),
-                'in_progress': assigned_tasks.filter(status='started').count(),
-                'completed': assigned_tasks.filter(status__in=['completed', 'approved']).count(),
+                'total': progress.total if progress else 0,
+                'not_started': progress.assigned if progress else 0,
+                'in_progress': progress.started if progress else 0,
+                'completed': progress.done if progress else 0,
             }
             
             # Get order items with detailed specifications
@@ -1184,70 +1217,36 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not tasks_data:
             return Response({'error': 'No tasks provided'}, status=status.HTTP_400_BAD_REQUEST)
         
+        from tasks.factory import create_tasks
+        from tasks.models import Task
+        
+        rows = [
+            {
+                'assigned_to': task_data.get('assigned_to_id'),
+                'task_type': task_data.get('task_type_id'),
+                'task_type_name': task_data.get('task_type_name'),
+                'order_item': task_data.get('order_item_id'),  # Optional: specific item
+                **{key: task_data[key] for key in ('title', 'description', 'priority', 'due_date', 'required_materials')
+                   if key in task_data},
+            }
+            if isinstance(task_data, dict) else {}
+            for task_data in tasks_data
+        ]
         created_tasks = []
         errors = []
-        
-        for task_data in tasks_data:
-            try:
-                from users.models import User
-                from tasks.models import TaskType, Task
-                
-                # Get required data
-                assigned_to = User.objects.get(id=task_data['assigned_to_id'])
-                if not assigned_to.is_warehouse_worker:
-                    raise User.DoesNotExist('Assigned user is not a warehouse worker')
-                task_type = None
-                if 'task_type_id' in task_data and task_data['task_type_id'] is not None:
-                    task_type = TaskType.objects.get(id=task_data['task_type_id'])
-                elif 'task_type_name' in task_data and task_data['task_type_name']:
-                    task_type = TaskType.objects.get(name=task_data['task_type_name'])
-                else:
-                    raise TaskType.DoesNotExist('task_type_id or task_type_name required')
-                
-                # Create the task
-                task = Task.objects.create(
-                    title=task_data.get('title', f"{task_type.name} - {order.order_number}"),
-                    description=task_data.get('description', f"{task_type.name} for order {order.order_number}"),
-                    task_type=task_type,
-                    assigned_to=assigned_to,
-                    assigned_by=request.user,
-                    order=order,
-                    order_item_id=task_data.get('order_item_id'),  # Optional: specific item
-                    priority=task_data.get('priority', 'normal'),
-                    due_date=task_data.get('due_date'),
-                    estimated_duration=timedelta(minutes=task_type.estimated_duration_minutes)
-                )
-                
-                # If materials are specified, create task materials
-                if 'required_materials' in task_data:
-                    from tasks.models import TaskMaterial
-                    from inventory.models import Material
-                    
-                    for material_data in task_data['required_materials']:
-                        material = Material.objects.get(id=material_data['material_id'])
-                        TaskMaterial.objects.create(
-                            task=task,
-                            material=material,
-                            quantity_needed=material_data['quantity_needed']
-                        )
-                
+        for task_data, result in zip(tasks_data, create_tasks(rows, request.user, order=order, workers_only=True)):
+            if isinstance(result, Task):
                 created_tasks.append({
-                    'task_id': task.id,
-                    'title': task.title,
-                    'assigned_to': assigned_to.get_full_name() or assigned_to.username,
-                    'task_type': task_type.name,
+                    'task_id': result.id,
+                    'title': result.title,
+                    'assigned_to': result.assigned_to.get_full_name() or result.assigned_to.username,
+                    'task_type': result.task_type.name,
                     'status': 'created'
                 })
-                
-            except (User.DoesNotExist, TaskType.DoesNotExist) as e:
-                errors.append({
-                    'task_data': task_data,
-                    'error': str(e)
-                })
-            except Exception as e:
+            else:
                 errors.append({
                     'task_data': task_data,
-                    'error': f'Unexpected error: {str(e)}'
+                    'error': result
                 })
         
         # Update order production status if tasks were created
@@ -1307,6 +1306,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Priority orders
         priority_orders = all_orders.filter(is_priority_order=True)
         
+        # Orders whose forecast completion (tasks.forecast) is after their delivery deadline
+        forecast_late_orders = all_orders.filter(
+            order_status__in=['deposit_pending', 'deposit_paid'],
+            estimated_completion_date__gt=F('delivery_deadline')
+        )
+        
         return Response({
             'dashboard_type': 'owner',
             'permissions': {
@@ -1327,11 +1332,13 @@ class OrderViewSet(viewsets.ModelViewSet):
                     'total_balance': float(financial_stats['total_balance'] or 0)
                 },
                 'overdue_count': overdue_orders.count(),
-                'priority_count': priority_orders.count()
+                'priority_count': priority_orders.count(),
+                'forecast_late_count': forecast_late_orders.count()
             },
             'recent_orders': OrderListSerializer(recent_orders, many=True).data,
             'overdue_orders': OrderListSerializer(overdue_orders, many=True).data,
-            'priority_orders': OrderListSerializer(priority_orders, many=True).data
+            'priority_orders': OrderListSerializer(priority_orders, many=True).data,
+            'forecast_late_orders': OrderListSerializer(forecast_late_orders, many=True).data
         })
     
     @action(detail=False, methods=['get'])
@@ -2003,7 +2010,10 @@ class OrderViewSet(viewsets.ModelViewSet):
         """List payment transactions for a specific order."""
         order = self.get_object()
         from .models import PaymentTransaction
-        txns = PaymentTransaction.objects.filter(order=order).select_related('actor_user', 'proof', 'order')
+        txns = with_archived_after(
+            PaymentTransaction.objects.filter(order=order).select_related('actor_user', 'proof', 'order'),
+            order.created_at,
+        )
         from .serializers import PaymentTransactionSerializer
         page = self.paginate_queryset(txns)
         if page is not None:
@@ -2046,8 +2056,104 @@ class OrderViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _document_response(self, kind):
+        file_format = self.request.query_params.get('file_format', 'json')
+        if file_format not in ('json', 'pdf'):
+            return Response({'error': 'file_format must be one of: json, pdf'}, status=status.HTTP_400_BAD_REQUEST)
+        order = get_object_or_404(document_queryset(self.get_queryset()), pk=self.kwargs['pk'])
+        if file_format == 'json':
+            return Response(build_payload(order, kind))
+        prefix = 'invoice' if kind == 'invoice' else 'delivery-note'
+        response = HttpResponse(
+            render_pdf([order], kind, title=f"{prefix.replace('-', ' ').title()} {order.order_number}"),
+            content_type='application/pdf',
+        )
+        response['Content-Disposition'] = f'inline; filename="{prefix}-{order.order_number}.pdf"'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def invoice_data(self, request, pk=None):
+        """Invoice for an order as JSON, or as a PDF with ?file_format=pdf"""
+        return self._document_response('invoice')
+
+    @action(detail=True, methods=['get'])
+    def delivery_note_data(self, request, pk=None):
+        """Delivery note for an order as JSON, or as a PDF with ?file_format=pdf"""
+        return self._document_response('delivery_note')
+
+    @action(detail=False, methods=['get', 'post'])
+    def delivery_run(self, request):
+        """POST queues one PDF of delivery notes for every order out for delivery; GET ?job=<id> downloads it"""
+        if request.user.role not in ['owner', 'admin', 'delivery']:
+            return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+        if request.method == 'POST':
+            queued = enqueue('orders.render_delivery_run', idempotency_key='orders.render_delivery_run')
+            return Response({
+                'message': 'Delivery run queued',
+                'job_id': queued.id,
+                'job_status': queued.status,
+            }, status=status.HTTP_202_ACCEPTED)
+
+        job_id = request.query_params.get('job', '')
+        run = Job.objects.filter(name='orders.render_delivery_run', pk=job_id).first() if job_id.isdigit() else None
+        if run is None:
+            return Response({'error': 'Pass ?job=<id> of a queued delivery run'}, status=status.HTTP_404_NOT_FOUND)
+        if run.status != 'succeeded':
+            return Response({
+                'job_id': run.id,
+                'job_status': run.status,
+                'error': run.last_error if run.status == 'failed' else '',
+            }, status=status.HTTP_200_OK if run.status == 'failed' else status.HTTP_202_ACCEPTED)
+        path = (run.result or {}).get('file')
+        if not path or not default_storage.exists(path):
+            return Response({'error': 'Delivery run file is no longer available'}, status=status.HTTP_410_GONE)
+        return deliver_file(request, path, content_type='application/pdf', as_attachment=True)
+
+    @action(detail=False, methods=['get'])
+    def payments_data(self, request):
+        """Payments report for ?since=&until= (dates, default last 30 days) by method, status and day"""
+        if request.user.role not in ['owner', 'admin']:
+            return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+        from .models import PaymentTransaction
+        today = timezone.localdate()
+        since = request.query_params.get('since')
+        until = request.query_params.get('until')
+        try:
+            since = datetime.strptime(since, '%Y-%m-%d').date() if since else today - timedelta(days=29)
+            until = datetime.strptime(until, '%Y-%m-%d').date() if until else today
+        except ValueError:
+            return Response({'error': 'since and until must be dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Ranges reaching archived months include the archived transactions
+        txns = with_archived(PaymentTransaction.objects.all(), since, until)
+        measures = {'count': Count('id'), 'amount': Sum('amount_delta')}
+
+        def rows(key):
+            groups = sorted(grouped(txns, key, **measures), key=lambda row: row['amount'] or 0, reverse=True)
+            return [
+                {key: row[key] or 'unknown', 'count': row['count'], 'amount': float(row['amount'] or 0)}
+                for row in groups
+            ]
+
+        totals = aggregate(txns, **measures)
+        outstanding = Order.objects.exclude(order_status='cancelled').filter(balance_amount__gt=0).aggregate(
+            count=Count('id'), balance=Sum('balance_amount')
+        )
+        return Response({
+            'since': since,
+            'until': until,
+            'totals': {'count': totals['count'], 'amount': float(totals['amount'] or 0)},
+            'by_method': rows('payment_method'),
+            'by_status': rows('payment_status'),
+            'by_day': [
+                {'date': row['day'], 'count': row['count'], 'amount': float(row['amount'] or 0)}
+                for row in sorted(grouped(txns, 'day', by=TruncDate('created_at'), **measures), key=lambda row: row['day'])
+            ],
+            'outstanding': {'orders': outstanding['count'], 'balance': float(outstanding['balance'] or 0)},
+        })
 
-class PaymentTransactionViewSet(viewsets.ReadOnlyModelViewSet):
+
+class PaymentTransactionViewSet(ArchiveRangeMixin, viewsets.ReadOnlyModelViewSet):
     """Global read-only view of all payment transactions with filters for owner dashboard."""
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -2069,32 +2175,57 @@ class PaymentTransactionViewSet(viewsets.ReadOnlyModelViewSet):
             qs = qs.filter(payment_status__iexact=params.get('status'))
         if params.get('user'):
             qs = qs.filter(actor_user_id=params.get('user'))
-        from django.utils import timezone
-        from datetime import datetime
-        if params.get('since'):
-            qs = qs.filter(created_at__date__gte=params.get('since'))
-        if params.get('until'):
-            qs = qs.filter(created_at__date__lte=params.get('until'))
+        # ?since= / ?until= are applied by ArchiveRangeMixin, which also reads archived months
         return qs
 
     def list(self, request, *args, **kwargs):
         from .serializers import PaymentTransactionSerializer
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = PaymentTransactionSerializer(page, many=True)
-            # Add aggregates
-            total_amount_delta = sum([t.amount_delta for t in page]) if page else 0
+            # Aggregates cover every transaction matching the filters, not just this page
+            totals = aggregate(queryset, sum_amount_delta=Sum('amount_delta'))
             response = self.get_paginated_response(serializer.data)
             response.data.update({
                 'aggregates': {
-                    'total_amount_delta': float(total_amount_delta)
+                    'total_amount_delta': float(totals['sum_amount_delta'] or 0)
                 }
             })
             return response
         serializer = PaymentTransactionSerializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream all matching transactions as CSV or XLSX (?file_format=csv|xlsx)"""
+        if request.user.role not in ['owner', 'admin']:
+            return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f'file_format must be one of: {", ".join(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        return streaming_export(queryset, [
+            ('Date', 'created_at'),
+            ('Order Number', 'order__order_number'),
+            ('Customer', 'order__customer__name'),
+            ('User', 'actor_user__username'),
+            ('Payment Method', 'payment_method'),
+            ('Payment Status', 'payment_status'),
+            ('Amount Paid', 'amount_delta'),
+            ('Total Amount Change', 'total_amount_delta'),
+            ('Deposit Change', 'deposit_delta'),
+            ('Balance Change', 'balance_delta'),
+            ('Previous Balance', 'previous_balance'),
+            ('New Balance', 'new_balance'),
+            ('Notes', 'notes'),
+        ], 'payment-transactions', export_format, totals={
+            'amount_delta': Sum('amount_delta'),
+            'total_amount_delta': Sum('total_amount_delta'),
+            'deposit_delta': Sum('deposit_delta'),
+            'balance_delta': Sum('balance_delta'),
+        })
+
 class PaymentProofViewSet(viewsets.ModelViewSet):
     queryset = PaymentProof.objects.all()
     serializer_class = PaymentProofSerializer
@@ -2103,6 +2234,25 @@ class PaymentProofViewSet(viewsets.ModelViewSet):
     filterset_fields = ['order', 'payment_type']
     ordering = ['-uploaded_at']
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Must be set before the body is parsed: uploads are streamed, hashed and checked as they arrive
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            request.upload_handlers = [PaymentProofUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def _rejected_upload(self, request):
+        try:
+            request.data
+        except UploadRejected as exc:
+            return Response({'error': str(exc)}, status=exc.status_code)
+        return None
+
+    def create(self, request, *args, **kwargs):
+        return self._rejected_upload(request) or super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self._rejected_upload(request) or super().update(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(uploaded_by=self.request.user)
 
@@ -2112,12 +2262,7 @@ class PaymentProofViewSet(viewsets.ModelViewSet):
         proof = self.get_object()
         if not proof.proof_image:
             raise Http404('File not found')
-        file = proof.proof_image.open('rb')
-        from mimetypes import guess_type
-        ctype, _ = guess_type(proof.proof_image.name)
-        response = FileResponse(file, content_type=ctype or 'application/octet-stream')
-        response['Content-Disposition'] = f"inline; filename=\"{proof.proof_image.name}\""
-        return response
+        return deliver_file(request, proof.proof_image.name, storage=proof.proof_image.storage)
 
     @action(detail=True, methods=['get'], url_path='signed_url')
     def signed_url(self, request, pk=None):
@@ -2147,7 +2292,6 @@ def payment_proof_signed_file(request):
     from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
     from django.utils.http import urlsafe_base64_decode
     from django.shortcuts import get_object_or_404
-    from mimetypes import guess_type
     from .models import PaymentProof
     from io import BufferedReader
     # Validate token
@@ -2168,13 +2312,9 @@ def payment_proof_signed_file(request):
     proof = get_object_or_404(PaymentProof, id=proof_id)
     if not proof.proof_image:
         raise Http404('File not found')
-    file = proof.proof_image.open('rb')
-    ctype, _ = guess_type(proof.proof_image.name)
-    response = FileResponse(file, content_type=ctype or 'application/octet-stream')
-    response['Content-Disposition'] = f"inline; filename=\"{proof.proof_image.name}\""
-    return response
+    return deliver_file(request, proof.proof_image.name, storage=proof.proof_image.storage)
 
-class OrderHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderHistoryViewSet(ArchiveRangeMixin, viewsets.ReadOnlyModelViewSet):
     queryset = OrderHistory.objects.all()
     serializer_class = OrderHistorySerializer
     permission_classes = [IsAuthenticated]
@@ -2182,6 +2322,22 @@ class OrderHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['order', 'user', 'action']
     ordering = ['-timestamp']
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the filtered order history as CSV or XLSX (?file_format=csv|xlsx)"""
+        if request.user.role not in ['owner', 'admin']:
+            return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f'file_format must be one of: {", ".join(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        return streaming_export(self.filter_queryset(self.get_queryset()), [
+            ('Timestamp', 'timestamp'),
+            ('Order Number', 'order__order_number'),
+            ('User', 'user__username'),
+            ('Action', 'action'),
+            ('Details', 'details'),
+        ], 'order-history', export_format)
+
 class ColorViewSet(viewsets.ModelViewSet):
     queryset = Color.objects.all()
     serializer_class = ColorSerializer
@@ -2201,8 +2357,9 @@ class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]  # Allow read access without auth
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     search_fields = ['product_name', 'name', 'description', 'model_code']
+    search_entity = 'product'
     ordering_fields = ['created_at', 'product_name', 'unit_price', 'stock']
     ordering = ['-created_at']
 
@@ -2241,6 +2398,8 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         product.main_image = blob
         product.save(update_fields=['main_image'])
+        # Orientation/downscaling happens in the background; the raw upload is served until then
+        enqueue('orders.process_product_image', {'product_id': product.id, 'sha256': hashlib.sha256(blob).hexdigest()})
 
         serializer = self.get_serializer(product)
         return Response({
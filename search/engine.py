@@ -0,0 +1,162 @@
+"""Query the search index.
+
+Candidates come from the database index for the active backend:
+
+* Postgres: ``search_vector @@ to_tsquery('simple', 'word:* & ...')`` for
+  word prefixes, ``pg_trgm`` word similarity (``<%``) for typos and
+  ``LIKE '%digits%'`` on the trigram-indexed phone column.
+* SQLite: an FTS5 ``unicode61`` table with prefix indexes for word prefixes
+  and an FTS5 ``trigram`` table for typos and phone substrings.
+* Anything else: ``icontains`` scans.
+
+Candidates are then scored in Python with the same trigram measure on every
+backend, so results rank the same way in development and production.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import SearchDocument
+from .text import normalize_text, query_digits, similarity, tokens, word_similarity
+
+FTS_TABLE = 'search_document_fts'
+TRIGRAM_TABLE = 'search_document_trigram'
+
+_sqlite_fts_ready = False
+
+
+def _has_sqlite_fts():
+    global _sqlite_fts_ready
+    if not _sqlite_fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TRIGRAM_TABLE])
+            _sqlite_fts_ready = cursor.fetchone() is not None
+    return _sqlite_fts_ready
+
+
+def _postgres_ids(words, digits, entity_types, limit, fuzzy):
+    conditions, params = [], []
+    tsquery = ' & '.join(f'{word}:*' for word in words)
+    if words:
+        conditions.append("search_vector @@ to_tsquery('simple', %s)")
+        params.append(tsquery)
+        if fuzzy:
+            conditions.append('%s <%% body')
+            params.append(' '.join(words))
+        else:
+            long_words = [word for word in words if len(word) >= 3]
+            if long_words:
+                conditions.append('(' + ' AND '.join(['body LIKE %s'] * len(long_words)) + ')')
+                params.extend(f'%{word}%' for word in long_words)
+    if digits:
+        conditions.append('phone_digits LIKE %s')
+        params.append(f'%{digits}%')
+    queryset = SearchDocument.objects.filter(entity_type__in=entity_types).extra(
+        where=['(' + ' OR '.join(conditions) + ')'], params=params,
+    )
+    if words:
+        queryset = queryset.annotate(match_rank=RawSQL(
+            "ts_rank(search_vector, to_tsquery('simple', %s)) + word_similarity(%s, body)",
+            [tsquery, ' '.join(words)],
+        )).order_by('-match_rank')
+    ids = queryset.values_list('id', flat=True)
+    return list(ids[:limit] if limit else ids)
+
+
+def _sqlite_ids(words, digits, entity_types, limit, fuzzy):
+    types = ', '.join(['%s'] * len(entity_types))
+    found = {}
+
+    def run(table, match):
+        sql = (f'SELECT d.id FROM {table} JOIN search_searchdocument d ON d.id = {table}.rowid '
+               f'WHERE {table} MATCH %s AND d.entity_type IN ({types}) ORDER BY {table}.rank')
+        params = [match, *entity_types]
+        if limit:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for (doc_id,) in cursor.fetchall():
+                found.setdefault(doc_id, None)
+
+    if words:
+        run(FTS_TABLE, ' '.join(f'"{word}"*' for word in words))
+        # The trigram tokenizer cannot match fragments shorter than three characters
+        long_words = [word for word in words if len(word) >= 3]
+        if long_words and fuzzy:
+            grams = sorted({word[i:i + 3] for word in long_words for i in range(len(word) - 2)})
+            run(TRIGRAM_TABLE, 'body : (' + ' OR '.join(f'"{gram}"' for gram in grams) + ')')
+        elif long_words:
+            run(TRIGRAM_TABLE, ' AND '.join(f'body : "{word}"' for word in long_words))
+    if digits:
+        run(TRIGRAM_TABLE, f'phone_digits : "{digits}"')
+    ids = list(found)
+    return ids[:limit] if limit else ids
+
+
+def _scan_ids(words, digits, entity_types, limit, fuzzy):
+    queryset = SearchDocument.objects.filter(entity_type__in=entity_types)
+    matches = SearchDocument.objects.none()
+    if words:
+        word_matches = queryset
+        for word in words:
+            word_matches = word_matches.filter(body__contains=word)
+        matches = matches | word_matches
+    if digits:
+        matches = matches | queryset.filter(phone_digits__contains=digits)
+    ids = matches.order_by('-updated_at').values_list('id', flat=True)
+    return list(ids[:limit] if limit else ids)
+
+
+def candidate_ids(query, entity_types, limit=None, fuzzy=True):
+    """Ids of documents matching ``query``; with ``fuzzy`` also near misses (typos)."""
+    words = tokens(query)
+    digits = query_digits(query)
+    if not words and not digits:
+        return []
+    if connection.vendor == 'postgresql':
+        return _postgres_ids(words, digits, entity_types, limit, fuzzy)
+    if connection.vendor == 'sqlite' and _has_sqlite_fts():
+        return _sqlite_ids(words, digits, entity_types, limit, fuzzy)
+    return _scan_ids(words, digits, entity_types, limit, fuzzy)
+
+
+def score(document, query):
+    """Relevance of ``document`` for ``query``: exact/prefix title hits first, then coverage and similarity."""
+    needle = normalize_text(query)
+    title = normalize_text(document.title)
+    words = tokens(query)
+    body_words = document.body.split()
+    value = 0.0
+    if title == needle:
+        value += 3.0
+    elif title.startswith(needle):
+        value += 2.0
+    if words:
+        covered = sum(1 for word in words if any(body_word.startswith(word) for body_word in body_words))
+        value += covered / len(words)
+        value += max(similarity(needle, title), word_similarity(needle, document.body))
+    digits = query_digits(query)
+    if digits and document.phone_digits:
+        forms = document.phone_digits.split()
+        if any(form.startswith(digits) for form in forms):
+            value += 2.0
+        elif any(digits in form for form in forms):
+            value += 1.5
+    return round(value, 3)
+
+
+def search(query, entity_types, limit=20):
+    """Ranked ``[(document, score), ...]`` across ``entity_types``."""
+    ids = candidate_ids(query, entity_types, limit=settings.SEARCH_CANDIDATE_LIMIT)
+    documents = SearchDocument.objects.in_bulk(ids)
+    ranked = [(document, score(document, query)) for document in documents.values()]
+    ranked = [item for item in ranked if item[1] >= settings.SEARCH_MIN_SCORE]
+    ranked.sort(key=lambda item: (-item[1], item[0].title))
+    return ranked[:limit]
+
+
+def matching_object_ids(query, entity_type):
+    """Primary keys of ``entity_type`` rows matching ``query`` by word prefix or substring (no typos)."""
+    ids = candidate_ids(query, [entity_type], limit=settings.SEARCH_FILTER_LIMIT, fuzzy=False)
+    return SearchDocument.objects.filter(id__in=ids).values_list('object_id', flat=True)
@@ -0,0 +1,96 @@
+"""Build and store search documents.
+
+Document builders only read plain model fields, so they work with the
+historical models inside migrations as well as the live ones.
+"""
+from django.apps import apps as global_apps
+
+from .text import normalize_text, phone_digits
+
+DOCUMENT_FIELDS = ['title', 'subtitle', 'body', 'phone_digits', 'updated_at']
+
+
+def customer_document(customer):
+    return {
+        'title': customer.name[:255],
+        'subtitle': customer.phone or '',
+        'body': normalize_text(customer.name, customer.email, customer.address),
+        'phone_digits': phone_digits(customer.phone),
+    }
+
+
+def order_document(order):
+    customer = order.customer
+    name = (customer.name if customer else '') or order.customer_name or ''
+    # "OOX000014" is also findable as "000014" and "14"
+    digits = order.order_number[3:] if order.order_number[:3].isalpha() else ''
+    return {
+        'title': order.order_number,
+        'subtitle': ' · '.join(filter(None, [name, customer.phone if customer else ''])),
+        'body': normalize_text(order.order_number, digits, digits.lstrip('0'), name,
+                               order.customer_name if order.customer_name != name else '', order.revamp_name),
+        'phone_digits': phone_digits(customer.phone if customer else ''),
+    }
+
+
+def product_document(product):
+    title = product.product_name or product.name or 'Unnamed Product'
+    return {
+        'title': title[:255],
+        'subtitle': ' · '.join(filter(None, [product.model_code, product.category])),
+        'body': normalize_text(product.product_name, product.name if product.name != product.product_name else '',
+                               product.model_code, product.category, product.description),
+        'phone_digits': '',
+    }
+
+
+# entity type -> (model label, document builder, queryset tweak for bulk loading)
+ENTITIES = {
+    'order': ('orders.Order', order_document, lambda qs: qs.select_related('customer')),
+    'customer': ('orders.Customer', customer_document, lambda qs: qs),
+    'product': ('orders.Product', product_document, lambda qs: qs.defer('main_image')),
+}
+
+
+def _document_model(apps):
+    return (apps or global_apps).get_model('search', 'SearchDocument')
+
+
+def index_objects(entity_type, objects, apps=None):
+    """Insert or refresh the documents for ``objects`` in one statement."""
+    SearchDocument = _document_model(apps)
+    builder = ENTITIES[entity_type][1]
+    documents = [
+        SearchDocument(entity_type=entity_type, object_id=obj.pk, **builder(obj))
+        for obj in objects
+    ]
+    if documents:
+        SearchDocument.objects.bulk_create(
+            documents, update_conflicts=True,
+            unique_fields=['entity_type', 'object_id'], update_fields=DOCUMENT_FIELDS,
+        )
+    return len(documents)
+
+
+def remove_objects(entity_type, object_ids, apps=None):
+    return _document_model(apps).objects.filter(entity_type=entity_type, object_id__in=object_ids).delete()[0]
+
+
+def rebuild_index(apps=None, batch_size=500):
+    """Re-index every order, customer and product; drop documents of deleted rows."""
+    SearchDocument = _document_model(apps)
+    counts = {}
+    for entity_type, (label, _, prepare) in ENTITIES.items():
+        model = (apps or global_apps).get_model(label)
+        batch, indexed = [], 0
+        for obj in prepare(model.objects.order_by('pk')).iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                indexed += index_objects(entity_type, batch, apps)
+                batch = []
+        indexed += index_objects(entity_type, batch, apps)
+        SearchDocument.objects.filter(entity_type=entity_type).exclude(
+            object_id__in=model.objects.values('pk')
+        ).delete()
+        counts[entity_type] = indexed
+    return counts
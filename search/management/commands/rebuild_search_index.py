@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from search.indexing import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents for every order, customer and product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows indexed per statement')
+
+    def handle(self, *args, **options):
+        counts = rebuild_index(batch_size=max(options['batch_size'], 1))
+        for entity_type, count in counts.items():
+            self.stdout.write(f'{entity_type}: {count} indexed')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE search_searchdocument ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED",
+    "CREATE INDEX search_document_vector_idx ON search_searchdocument USING GIN (search_vector)",
+    "CREATE INDEX search_document_body_trgm_idx ON search_searchdocument USING GIN (body gin_trgm_ops)",
+    "CREATE INDEX search_document_phone_trgm_idx ON search_searchdocument USING GIN (phone_digits gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS search_document_phone_trgm_idx",
+    "DROP INDEX IF EXISTS search_document_body_trgm_idx",
+    "DROP INDEX IF EXISTS search_document_vector_idx",
+    "ALTER TABLE search_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+# External-content FTS5 tables over search_searchdocument, kept in sync by triggers
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE search_document_fts USING fts5(body, phone_digits, "
+    "content='search_searchdocument', content_rowid='id', tokenize='unicode61', prefix='2 3')",
+    "CREATE VIRTUAL TABLE search_document_trigram USING fts5(body, phone_digits, "
+    "content='search_searchdocument', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER search_document_ai AFTER INSERT ON search_searchdocument BEGIN "
+    "INSERT INTO search_document_fts(rowid, body, phone_digits) VALUES (new.id, new.body, new.phone_digits); "
+    "INSERT INTO search_document_trigram(rowid, body, phone_digits) VALUES (new.id, new.body, new.phone_digits); "
+    "END",
+    "CREATE TRIGGER search_document_ad AFTER DELETE ON search_searchdocument BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, body, phone_digits) "
+    "VALUES ('delete', old.id, old.body, old.phone_digits); "
+    "INSERT INTO search_document_trigram(search_document_trigram, rowid, body, phone_digits) "
+    "VALUES ('delete', old.id, old.body, old.phone_digits); "
+    "END",
+    "CREATE TRIGGER search_document_au AFTER UPDATE ON search_searchdocument BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, body, phone_digits) "
+    "VALUES ('delete', old.id, old.body, old.phone_digits); "
+    "INSERT INTO search_document_trigram(search_document_trigram, rowid, body, phone_digits) "
+    "VALUES ('delete', old.id, old.body, old.phone_digits); "
+    "INSERT INTO search_document_fts(rowid, body, phone_digits) VALUES (new.id, new.body, new.phone_digits); "
+    "INSERT INTO search_document_trigram(rowid, body, phone_digits) VALUES (new.id, new.body, new.phone_digits); "
+    "END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS search_document_au",
+    "DROP TRIGGER IF EXISTS search_document_ad",
+    "DROP TRIGGER IF EXISTS search_document_ai",
+    "DROP TABLE IF EXISTS search_document_trigram",
+    "DROP TABLE IF EXISTS search_document_fts",
+]
+
+
+def _run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+def backfill(apps, schema_editor):
+    from search.indexing import rebuild_index
+    rebuild_index(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('orders', '0019_order_orders_laybuy_due_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """Denormalized, pre-normalized search text for one order, customer or product.
+
+    ``body`` and ``phone_digits`` are indexed outside the ORM (see migration
+    0002): a ``tsvector`` plus ``pg_trgm`` GIN indexes on Postgres, FTS5
+    tables kept in sync by triggers on SQLite.
+    """
+    ENTITY_CHOICES = [
+        ('order', 'Order'),
+        ('customer', 'Customer'),
+        ('product', 'Product'),
+    ]
+
+    entity_type = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True, help_text="Lower-cased, accent-free text that is matched")
+    phone_digits = models.CharField(max_length=100, blank=True, help_text="Phone number digits in each dialling form")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entity_type', 'object_id'], name='search_document_entity_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.entity_type} #{self.object_id}: {self.title}"
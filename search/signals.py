@@ -0,0 +1,47 @@
+"""Keep search documents in step with orders, customers and products.
+
+Documents are written after the surrounding transaction commits, so a
+rolled-back save never reaches the index and an indexing error never undoes
+a save. Queryset ``update()`` calls bypass these receivers; run
+``manage.py rebuild_search_index`` after bulk edits to indexed fields.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from orders.models import Customer, Order, Product
+
+from .indexing import index_objects, remove_objects
+
+
+@receiver(post_save, sender=Customer, dispatch_uid='search_index_customer')
+def index_customer(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    def update():
+        index_objects('customer', [instance])
+        # Order documents carry the customer's name and phone
+        index_objects('order', Order.objects.filter(customer_id=instance.pk).select_related('customer'))
+    transaction.on_commit(update, robust=True)
+
+
+@receiver(post_save, sender=Order, dispatch_uid='search_index_order')
+def index_order(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: index_objects('order', [instance]), robust=True)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='search_index_product')
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: index_objects('product', [instance]), robust=True)
+
+
+@receiver(post_delete, sender=Customer, dispatch_uid='search_unindex_customer')
+@receiver(post_delete, sender=Order, dispatch_uid='search_unindex_order')
+@receiver(post_delete, sender=Product, dispatch_uid='search_unindex_product')
+def unindex(sender, instance, **kwargs):
+    entity_type = sender._meta.model_name
+    object_id = instance.pk
+    transaction.on_commit(lambda: remove_objects(entity_type, [object_id]), robust=True)
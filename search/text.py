@@ -0,0 +1,73 @@
+"""Text normalization and trigram similarity shared by indexing and ranking."""
+import re
+import unicodedata
+
+from django.conf import settings
+
+from orders.models import normalize_phone
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_text(*values):
+    """Lower-case, accent-free text of all non-empty ``values`` joined by spaces."""
+    text = ' '.join(str(value) for value in values if value)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def tokens(text):
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+def phone_digits(phone):
+    """Digits of ``phone`` in both international (27...) and local (0...) form, space separated.
+
+    Storing both lets ``082 555`` and ``+27 82 555`` find the same customer.
+    """
+    key = normalize_phone(phone)
+    if not key:
+        return ''
+    country = settings.PHONE_COUNTRY_CODE
+    forms = [key]
+    if key.startswith(country) and len(key) > len(country) + 6:
+        forms.append('0' + key[len(country):])
+    return ' '.join(forms)
+
+
+def query_digits(query):
+    """Digits typed in a query, if it looks like (part of) a phone number."""
+    stripped = re.sub(r'[\s()+\-./]', '', query or '')
+    return stripped if len(stripped) >= 3 and stripped.isdigit() else ''
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing."""
+    grams = set()
+    for word in tokens(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Jaccard similarity of the trigram sets, like pg_trgm's ``similarity()``."""
+    first, second = trigrams(a), trigrams(b)
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def word_similarity(query, text):
+    """Best similarity between ``query`` and any run of words in ``text`` of the same length."""
+    query_words = tokens(query)
+    words = tokens(text)
+    if not query_words or not words:
+        return 0.0
+    width = len(query_words)
+    best = 0.0
+    needle = ' '.join(query_words)
+    for start in range(max(len(words) - width + 1, 1)):
+        best = max(best, similarity(needle, ' '.join(words[start:start + width])))
+    return best
@@ -0,0 +1,59 @@
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from orders.permissions import visible_orders
+
+from .engine import search
+from .models import SearchDocument
+
+ENTITY_TYPES = [choice for choice, _ in SearchDocument.ENTITY_CHOICES]
+
+RESULT_URLS = {
+    'order': '/api/orders/{}/',
+    'customer': '/api/customers/{}/',
+    'product': '/api/products/{}/',
+}
+
+
+class SearchView(APIView):
+    """Ranked orders, customers and products for ``?q=`` (name, phone, order number, model code...)
+
+    Optional ``?types=order,customer`` narrows the entity types and
+    ``?limit=`` caps the results (default 20, max 50).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if len(query) < 2:
+            return Response({'error': 'q must be at least 2 characters'}, status=status.HTTP_400_BAD_REQUEST)
+        types = request.query_params.get('types')
+        entity_types = [t.strip() for t in types.split(',') if t.strip()] if types else ENTITY_TYPES
+        unknown = set(entity_types) - set(ENTITY_TYPES)
+        if unknown:
+            return Response({'error': f'Unknown types: {", ".join(sorted(unknown))}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Rank a few extra so dropping orders the user cannot see still fills the page
+        ranked = search(query, entity_types, limit=limit * 2)
+        order_ids = [document.object_id for document, _ in ranked if document.entity_type == 'order']
+        if order_ids:
+            allowed = set(visible_orders(request.user).filter(pk__in=order_ids).values_list('pk', flat=True))
+            ranked = [
+                (document, score) for document, score in ranked
+                if document.entity_type != 'order' or document.object_id in allowed
+            ]
+        results = [{
+            'type': document.entity_type,
+            'id': document.object_id,
+            'title': document.title,
+            'subtitle': document.subtitle,
+            'score': score,
+            'url': RESULT_URLS[document.entity_type].format(document.object_id),
+        } for document, score in ranked[:limit]]
+        return Response({'query': query, 'count': len(results), 'results': results})
@@ -0,0 +1,109 @@
+"""Task duration analytics grouped by worker, task type, week or month.
+
+Completed tasks in the date range are read as plain columns (group key,
+actual time, estimate) in one ``values_list`` query, already sorted by the
+group key, which the database computes (``TruncWeek``/``TruncMonth`` for the
+calendar groupings). Each group's columns are then reduced in one pass:
+count, total, mean, duration percentiles, and actual time against
+``estimated_duration``. Time worked per worker, week or month comes from the
+daily ledger in one more grouped ``SUM``.
+"""
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import DateField, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from users.models import User
+from .models import DailyWorkedTime, Task, TaskType
+
+GROUP_BY = ('worker', 'task_type', 'week', 'month')
+PERCENTILES = (50, 75, 90)
+
+
+def _task_key(group_by):
+    return {
+        'worker': F('assigned_to_id'),
+        'task_type': F('task_type_id'),
+        'week': TruncWeek('completed_at', output_field=DateField()),
+        'month': TruncMonth('completed_at', output_field=DateField()),
+    }[group_by]
+
+
+def _ledger_key(group_by):
+    return {
+        'worker': F('worker_id'),
+        'week': TruncWeek('date'),
+        'month': TruncMonth('date'),
+    }.get(group_by)
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated ``pct`` percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _labels(group_by, keys):
+    if group_by == 'worker':
+        users = User.objects.in_bulk(keys)
+        return {key: users[key].get_full_name() or users[key].username for key in keys if key in users}
+    if group_by == 'task_type':
+        return {key: task_type.name for key, task_type in TaskType.objects.in_bulk(keys).items()}
+    return {key: key.isoformat() for key in keys}
+
+
+def _summarize(actual, estimated):
+    count = len(actual)
+    total_actual, total_estimated = sum(actual), sum(estimated)
+    ordered = sorted(actual)
+    return {
+        'tasks_completed': count,
+        'total_seconds': total_actual,
+        'average_seconds': round(total_actual / count) if count else None,
+        'duration_percentiles': {f'p{pct}': round(percentile(ordered, pct)) if count else None for pct in PERCENTILES},
+        'estimated_seconds': total_estimated,
+        'estimate_ratio': round(total_actual / total_estimated, 3) if total_estimated else None,
+        'over_estimate': sum(1 for spent, estimate in zip(actual, estimated) if spent > estimate),
+    }
+
+
+def task_report(group_by, since, until, worker=None):
+    """One summary per group of the tasks completed between ``since`` and ``until`` (dates, inclusive).
+
+    ``worker`` limits the report to one worker's tasks and time.
+    """
+    tasks = Task.objects.all() if worker is None else Task.objects.filter(assigned_to=worker)
+    rows = (
+        tasks.filter(status__in=['completed', 'approved'], completed_at__date__range=(since, until))
+        .annotate(group=_task_key(group_by))
+        .order_by('group')
+        .values_list('group', 'total_time_spent', 'estimated_duration')
+    )
+    summaries = {}
+    for key, group in groupby(rows.iterator(chunk_size=5000), key=itemgetter(0)):
+        _, actual, estimated = zip(*group)
+        summaries[key] = _summarize(
+            [int(spent.total_seconds()) for spent in actual],
+            [int(estimate.total_seconds()) for estimate in estimated],
+        )
+
+    ledger_key = _ledger_key(group_by)
+    if ledger_key is not None:
+        worked = DailyWorkedTime.objects.filter(date__range=(since, until))
+        if worker is not None:
+            worked = worked.filter(worker=worker)
+        worked = worked.annotate(group=ledger_key).values('group').annotate(seconds=Sum('seconds')).order_by()
+        for row in worked:
+            summary = summaries.get(row['group']) or summaries.setdefault(row['group'], _summarize([], []))
+            summary['worked_seconds'] = row['seconds']
+
+    labels = _labels(group_by, list(summaries))
+    return [
+        {'key': key, 'label': labels.get(key, str(key)), **summary}
+        for key, summary in sorted(summaries.items())
+    ]
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
-    verbose_name = 'Task Management'
\ No newline at end of file
+    verbose_name = 'Task Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (keeps order task counters in step with deleted tasks)
@@ -0,0 +1,214 @@
+"""Task duration estimates learned from worked time.
+
+Once a task is approved, the ``tasks.refresh_duration_estimates`` job adds
+its worked time (its closed time sessions) to the
+:class:`~tasks.models.TaskDurationStats` row for its task type, product
+(through its order item) and worker. :class:`DurationEstimator` turns those
+counts into an estimate for a new task: the task type's mean, adjusted for
+the product and then for how fast the worker is at that task type. Each
+figure is blended with the coarser one (``PRIOR_WEIGHT`` pseudo-samples), so
+a single unusual task barely moves it; with no history at all the task
+type's ``estimated_duration_minutes`` is used.
+
+:func:`order_completion_date` dates an order from the estimated work ahead
+of it in the production queue and the time actually worked per business day
+(the daily ledger, see ``tasks.ledger``); :func:`initial_completion_date`
+gives a new order its first date from it.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import DailyWorkedTime, OrderTaskProgress, Task, TaskDurationStats, TaskTimeSession, TaskType
+
+# Samples' worth of weight given to the coarser estimate
+PRIOR_WEIGHT = 3
+# Business days of the daily ledger averaged into the production capacity
+CAPACITY_WINDOW_DAYS = 20
+# Business days to completion assumed for a new order without enough history
+FALLBACK_BUSINESS_DAYS = 20
+OPEN_STATUSES = ('assigned', 'started', 'paused')
+BATCH_SIZE = 1000
+
+
+def add_business_days(start, days):
+    """The date ``days`` working days (Monday to Friday) after ``start``"""
+    current = start
+    while days > 0:
+        current += timedelta(days=1)
+        if current.weekday() < 5:
+            days -= 1
+    return current
+
+
+def _blend(counts, prior):
+    samples, total = counts
+    return (total + PRIOR_WEIGHT * prior) / (samples + PRIOR_WEIGHT)
+
+
+class DurationEstimator:
+    """Estimates for tasks of the given task types (ids), from one query"""
+
+    def __init__(self, task_type_ids):
+        self.by_type = defaultdict(lambda: [0, 0])
+        self.by_product = defaultdict(lambda: [0, 0])
+        self.by_worker = defaultdict(lambda: [0, 0])
+        self.cells = {}
+        rows = TaskDurationStats.objects.filter(task_type_id__in=set(task_type_ids)).values_list(
+            'task_type_id', 'product_id', 'worker_id', 'samples', 'total_seconds',
+        )
+        for task_type_id, product_id, worker_id, samples, total in rows:
+            for counts in (self.by_type[task_type_id], self.by_worker[task_type_id, worker_id]):
+                counts[0] += samples
+                counts[1] += total
+            if product_id:
+                counts = self.by_product[task_type_id, product_id]
+                counts[0] += samples
+                counts[1] += total
+                self.cells[task_type_id, product_id, worker_id] = (samples, total)
+
+    def seconds(self, task_type, product_id=None, worker_id=None, default=None):
+        """Expected worked seconds for a ``task_type`` task, optionally for a product and a worker.
+
+        ``default`` (seconds) replaces the task type's ``estimated_duration_minutes`` as the starting point.
+        """
+        prior = default if default is not None else task_type.estimated_duration_minutes * 60
+        base = _blend(self.by_type.get(task_type.pk, (0, 0)), prior)
+        expected = _blend(self.by_product.get((task_type.pk, product_id), (0, 0)), base) if product_id else base
+        if worker_id and base > 0:
+            # How the worker's times on this task type compare with everyone's
+            expected *= _blend(self.by_worker.get((task_type.pk, worker_id), (0, 0)), base) / base
+            if product_id:
+                expected = _blend(self.cells.get((task_type.pk, product_id, worker_id), (0, 0)), expected)
+        return expected
+
+    def estimate(self, task_type, product_id=None, worker_id=None, default=None):
+        return timedelta(seconds=round(self.seconds(task_type, product_id, worker_id, default)))
+
+
+def estimate_duration(task_type, product_id=None, worker_id=None):
+    """Estimated duration of one new task"""
+    return DurationEstimator([task_type.pk]).estimate(task_type, product_id, worker_id)
+
+
+def record_approved_durations():
+    """Add the worked time of approved tasks not counted yet to their statistics; returns the number of tasks"""
+    counted = 0
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            pending = list(Task.objects.filter(
+                status='approved', duration_sampled_at__isnull=True,
+            ).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+            if not pending:
+                return counted
+            # Claim the batch first: a concurrent run only sees rows it marked itself
+            Task.objects.filter(pk__in=pending, duration_sampled_at__isnull=True).update(duration_sampled_at=now)
+            claimed = Task.objects.filter(pk__in=pending, duration_sampled_at=now).values_list(
+                'pk', 'task_type_id', 'order_item__product_id', 'assigned_to_id',
+            )
+            worked = defaultdict(int)
+            sessions = TaskTimeSession.objects.filter(task_id__in=pending, ended_at__isnull=False)
+            for task_id, started_at, ended_at in sessions.values_list('task_id', 'started_at', 'ended_at'):
+                worked[task_id] += int((ended_at - started_at).total_seconds())
+
+            deltas = defaultdict(lambda: [0, 0])
+            for task_id, task_type_id, product_id, worker_id in claimed:
+                counted += 1
+                if worked[task_id] > 0:
+                    counts = deltas[task_type_id, product_id, worker_id]
+                    counts[0] += 1
+                    counts[1] += worked[task_id]
+            for (task_type_id, product_id, worker_id), (samples, seconds) in deltas.items():
+                rows = TaskDurationStats.objects.filter(task_type_id=task_type_id, product_id=product_id, worker_id=worker_id)
+                changes = {'samples': F('samples') + samples, 'total_seconds': F('total_seconds') + seconds}
+                if not rows.update(**changes):
+                    TaskDurationStats.objects.get_or_create(task_type_id=task_type_id, product_id=product_id, worker_id=worker_id)
+                    rows.update(**changes)
+
+
+def daily_capacity(today=None):
+    """Average seconds worked per business day over the last ``CAPACITY_WINDOW_DAYS`` business days"""
+    today = today or timezone.localdate()
+    since = today
+    for _ in range(CAPACITY_WINDOW_DAYS):
+        since -= timedelta(days=1)
+        while since.weekday() >= 5:
+            since -= timedelta(days=1)
+    days = DailyWorkedTime.objects.filter(date__gte=since, date__lt=today).values('date').annotate(
+        seconds=Sum('seconds'),
+    ).order_by()
+    worked = [row['seconds'] for row in days if row['date'].weekday() < 5 and row['seconds']]
+    return sum(worked) / len(worked) if worked else None
+
+
+def _product_work(product_ids):
+    """Estimated seconds of work for one order item of each product, ``None`` without any history"""
+    stats = TaskDurationStats.objects.filter(product__isnull=False)
+    steps = defaultdict(set)
+    for product_id, task_type_id in stats.values_list('product_id', 'task_type_id').distinct():
+        steps[product_id].add(task_type_id)
+    if not steps:
+        return None
+    task_types = TaskType.objects.in_bulk({pk for pks in steps.values() for pk in pks})
+    estimator = DurationEstimator(task_types)
+    known = {
+        product_id: sum(estimator.seconds(task_types[pk], product_id) for pk in pks)
+        for product_id, pks in steps.items()
+    }
+    # A product never made before is taken to be an average one
+    average = sum(known.values()) / len(known)
+    return {product_id: known.get(product_id, average) for product_id in set(product_ids) | {None}}
+
+
+def order_completion_date(order, start_date=None):
+    """Estimated production completion date of ``order``, or ``None`` without enough history.
+
+    The work ahead of it is what remains of every open task, except on orders
+    queued behind it, plus the estimated tasks of queued orders (and this one)
+    that have none yet, judged from their products. It is spread over the
+    recent business-day capacity starting from ``start_date`` (default today).
+    """
+    from orders.models import Order, OrderItem
+
+    capacity = daily_capacity()
+    if not capacity:
+        return None
+
+    queued = Order.objects.filter(order_status='deposit_paid', queue_position__isnull=False)
+    if order.pk:
+        queued = queued.exclude(pk=order.pk)
+    behind = queued.filter(queue_position__gt=order.queue_position) if order.queue_position else queued.none()
+    ahead = queued.filter(queue_position__lte=order.queue_position) if order.queue_position else queued
+
+    work = 0
+    open_tasks = Task.objects.filter(status__in=OPEN_STATUSES).exclude(order__in=behind)
+    for estimated, spent in open_tasks.values_list('estimated_duration', 'total_time_spent'):
+        work += max((estimated - spent).total_seconds(), 0)
+
+    with_tasks = OrderTaskProgress.objects.filter(total__gt=0).values('order_id')
+    waiting = list(ahead.exclude(pk__in=with_tasks).values_list('pk', flat=True))
+    if order.pk and not OrderTaskProgress.objects.filter(order_id=order.pk, total__gt=0).exists():
+        waiting.append(order.pk)
+    items = list(OrderItem.objects.filter(order_id__in=waiting).values_list('order_id', 'product_id'))
+    product_work = _product_work(product_id for _, product_id in items)
+    if product_work is None:
+        return None
+    work += sum(product_work[product_id] for _, product_id in items)
+    if not order.pk:
+        # Not saved yet, so no items: count it as one average item
+        work += product_work[None]
+
+    return add_business_days(start_date or timezone.localdate(), max(math.ceil(work / capacity), 1))
+
+
+def initial_completion_date(order, start_date):
+    """A new order's completion date until the forecast (``tasks.forecast``) refines it.
+
+    :func:`order_completion_date`, or ``FALLBACK_BUSINESS_DAYS`` after ``start_date`` without enough history.
+    """
+    return order_completion_date(order, start_date) or add_business_days(start_date, FALLBACK_BUSINESS_DAYS)
@@ -0,0 +1,168 @@
+"""Create many tasks in a fixed number of queries.
+
+:func:`create_tasks` backs bulk assignment, order task assignment and
+template expansion. The users, task types, orders, order items and materials
+the rows refer to are loaded with one query each. The valid rows are then
+inserted with ``bulk_create`` in one transaction: the tasks, their required
+materials and a ``task_assigned`` notification for each task. Each order's
+task counters are bumped once.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from users.models import User
+from .estimates import DurationEstimator
+from .models import Notification, Task, TaskMaterial, TaskType
+from .progress import record_tasks_added
+
+
+class RowError(Exception):
+    pass
+
+
+def _pk(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _pks(rows, key):
+    return {_pk(row.get(key)) for row in rows} - {None}
+
+
+def _material_rows(rows):
+    for row in rows:
+        yield from row.get('required_materials') or []
+
+
+class _Lookups:
+    """Everything the rows refer to, loaded up front"""
+
+    def __init__(self, rows, order):
+        from inventory.models import Material
+        from orders.models import Order, OrderItem
+
+        self.users = User.objects.in_bulk(_pks(rows, 'assigned_to'))
+        self.task_types = TaskType.objects.in_bulk(_pks(rows, 'task_type'))
+        names = {row['task_type_name'] for row in rows if row.get('task_type_name')}
+        self.task_types_by_name = {task_type.name: task_type for task_type in TaskType.objects.filter(name__in=names)} if names else {}
+        order_ids = _pks(rows, 'order') - {order.pk if order else None}
+        self.orders = Order.objects.only('id', 'order_number').in_bulk(order_ids) if order_ids else {}
+        if order:
+            self.orders[order.pk] = order
+        item_ids = _pks(rows, 'order_item')
+        self.order_items = OrderItem.objects.only('id', 'order_id', 'product_id').in_bulk(item_ids) if item_ids else {}
+        material_ids = {_pk(material.get('material_id')) for material in _material_rows(rows)} - {None}
+        self.materials = Material.objects.only('id').in_bulk(material_ids) if material_ids else {}
+        self.estimator = DurationEstimator([*self.task_types, *(task_type.pk for task_type in self.task_types_by_name.values())])
+
+
+def _build(row, lookups, assigned_by, default_order, workers_only):
+    """Unsaved task and ``{material_id: quantity}`` for one row; raises RowError if the row is invalid."""
+    assigned_to = lookups.users.get(_pk(row.get('assigned_to')))
+    if assigned_to is None:
+        raise RowError('User matching query does not exist.')
+    if workers_only and not assigned_to.is_warehouse_worker:
+        raise RowError('Assigned user is not a warehouse worker')
+
+    if row.get('task_type') is not None:
+        task_type = lookups.task_types.get(_pk(row['task_type']))
+    elif row.get('task_type_name'):
+        task_type = lookups.task_types_by_name.get(row['task_type_name'])
+    else:
+        raise RowError('task_type_id or task_type_name required')
+    if task_type is None:
+        raise RowError('TaskType matching query does not exist.')
+
+    order = default_order
+    if row.get('order') is not None:
+        order = lookups.orders.get(_pk(row['order']))
+        if order is None:
+            raise RowError('Order matching query does not exist.')
+    order_item_id = _pk(row.get('order_item'))
+    if row.get('order_item') is not None and order_item_id not in lookups.order_items:
+        raise RowError('OrderItem matching query does not exist.')
+    order_item = lookups.order_items.get(order_item_id)
+
+    materials = {}
+    for material in row.get('required_materials') or []:
+        material_id = _pk(material.get('material_id'))
+        if material_id not in lookups.materials:
+            raise RowError('Material matching query does not exist.')
+        try:
+            quantity = Decimal(str(material['quantity_needed']))
+        except (KeyError, InvalidOperation):
+            raise RowError('quantity_needed must be a number')
+        materials[material_id] = materials.get(material_id, Decimal(0)) + quantity
+
+    if order:
+        default_title = f"{task_type.name} - {order.order_number}"
+        default_description = f"{task_type.name} for order {order.order_number}"
+    else:
+        default_title, default_description = task_type.name, ''
+    priority = row.get('priority') or 'normal'
+    task = Task(
+        title=row.get('title') or default_title,
+        description=row['description'] if 'description' in row else default_description,
+        task_type=task_type,
+        assigned_to=assigned_to,
+        assigned_by=assigned_by,
+        order=order,
+        order_item_id=order_item_id,
+        priority=priority,
+        priority_rank=Task.rank_for(priority),
+        due_date=row.get('due_date'),
+        estimated_duration=row.get('estimated_duration') or lookups.estimator.estimate(
+            task_type, order_item.product_id if order_item else None, assigned_to.pk,
+            row['default_duration'].total_seconds() if row.get('default_duration') else None,
+        ),
+    )
+    return task, materials
+
+
+def create_tasks(rows, assigned_by, order=None, workers_only=False):
+    """Create a task for each row; returns, per row, the new ``Task`` or an error message.
+
+    Row keys: ``assigned_to`` and ``task_type`` (ids) or ``task_type_name``, plus
+    optional ``title``, ``description``, ``priority``, ``due_date``, ``order`` (id,
+    default ``order``), ``order_item`` (id), ``estimated_duration`` (default learned
+    from past tasks, see ``tasks.estimates``), ``default_duration`` (the starting
+    point of that estimate instead of the task type's) and ``required_materials``
+    (``[{material_id, quantity_needed}]``).
+    With ``workers_only`` rows must be assigned to warehouse workers.
+    """
+    lookups = _Lookups(rows, order)
+    results, materials = [], {}
+    for row in rows:
+        try:
+            task, row_materials = _build(row, lookups, assigned_by, order, workers_only)
+        except RowError as error:
+            results.append(str(error))
+            continue
+        results.append(task)
+        materials[id(task)] = row_materials
+
+    tasks = [result for result in results if isinstance(result, Task)]
+    if not tasks:
+        return results
+    with transaction.atomic():
+        Task.objects.bulk_create(tasks, batch_size=500)
+        TaskMaterial.objects.bulk_create([
+            TaskMaterial(task=task, material_id=material_id, quantity_needed=quantity)
+            for task in tasks
+            for material_id, quantity in materials[id(task)].items()
+        ], batch_size=500)
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=task.assigned_to_id,
+                message=f"New task assigned: {task.title}" + (f" for Order {task.order.order_number}" if task.order else ''),
+                type='task_assigned',
+                task=task,
+                order_id=task.order_id,
+            )
+            for task in tasks
+        ], batch_size=500)
+        record_tasks_added(tasks)
+    return results
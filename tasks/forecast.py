@@ -0,0 +1,210 @@
+"""Production completion forecasts for orders.
+
+Every order with open tasks, and every queued order still waiting for its
+tasks, becomes a small dependency graph:
+
+* an order's open tasks, layered by their task type's ``sequence_order``;
+  a layer waits for the one before it unless the production template's step
+  for that task type has ``requires_previous_completion`` off;
+* for a queued order without tasks, the steps of the production template
+  (``PRODUCTION_TEMPLATE``, default the first active template), with the
+  same rule between consecutive steps.
+
+The graphs are laid onto the workers' calendars with a serial schedule:
+repeatedly take the most urgent task whose predecessors are all planned (a
+running task first, then priority orders, then by ``queue_position``, then
+by step) and plan it on its worker, or on whichever worker would finish a
+template step first, at the later of the worker being free and its
+predecessors finishing. Time counts only inside each worker's shift (see
+``tasks.scheduler.Shift``). Durations are the remaining estimate of an
+open task, or the duration estimate for a template step (``tasks.estimates``).
+
+An order's forecast is when its last task is planned to finish, and
+:func:`store_forecasts` saves its date in
+``Order.estimated_completion_date``. Workers are shared between orders, so
+any task change can move other orders' forecasts: changes call
+:func:`request_refresh`, which queues one ``tasks.refresh_order_etas`` job
+(repeat requests while one is queued are merged), and the job recomputes
+every forecast in one pass and writes only the dates that changed.
+"""
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from users.models import User
+from .estimates import OPEN_STATUSES, DurationEstimator
+from .models import OrderTaskProgress, Task, TaskTemplate, TaskTimeSession
+from .scheduler import Shift
+
+
+def request_refresh():
+    """Queue a forecast refresh, unless one is already waiting"""
+    enqueue('tasks.refresh_order_etas', idempotency_key='tasks.refresh_order_etas')
+
+
+def production_template():
+    templates = TaskTemplate.objects.filter(is_active=True).prefetch_related('steps__task_type')
+    if settings.PRODUCTION_TEMPLATE:
+        templates = templates.filter(name=settings.PRODUCTION_TEMPLATE)
+    return templates.order_by('pk').first()
+
+
+class _Job:
+    __slots__ = ('key', 'index', 'order_id', 'worker_id', 'seconds', 'task_type', 'step', 'successors', 'waiting_on', 'ready_at')
+
+    def __init__(self, key, order_id, worker_id=None, seconds=0.0, task_type=None, step=None):
+        self.key = key
+        self.index = None
+        self.order_id = order_id
+        self.worker_id = worker_id
+        self.seconds = seconds
+        self.task_type = task_type
+        self.step = step
+        self.successors = []
+        self.waiting_on = 0
+        self.ready_at = None
+
+
+def _link(layers, runs_parallel):
+    """Make each layer of jobs wait for the previous one, or for what that one waits for if it runs in parallel"""
+    waits_for, previous = [], []
+    for number, layer in enumerate(layers):
+        if number == 0 or not runs_parallel(layer):
+            waits_for = previous
+        for job in layer:
+            for predecessor in waits_for:
+                predecessor.successors.append(job)
+                job.waiting_on += 1
+        previous = layer
+
+
+def _order_rank(order_id, priority, position):
+    # Priority orders first, then queue order; orders without a position have left the queue for production
+    return (0 if priority else 1, position or 0, order_id)
+
+
+def build_jobs(now, template):
+    """The dependency graph of all open production work, as a list of jobs"""
+    from orders.models import Order, OrderItem
+
+    jobs = []
+    parallel_types = {step.task_type_id for step in template.steps.all() if not step.requires_previous_completion} if template else set()
+
+    tasks = list(
+        Task.objects.filter(status__in=OPEN_STATUSES)
+        .values_list('pk', 'order_id', 'assigned_to_id', 'status', 'priority_rank', 'task_type__sequence_order',
+                     'task_type_id', 'estimated_duration', 'total_time_spent')
+    )
+    running = dict(TaskTimeSession.objects.filter(ended_at__isnull=True).values_list('task_id', 'started_at'))
+    orders = Order.objects.filter(
+        pk__in={task[1] for task in tasks if task[1]},
+    ).values_list('pk', 'is_priority_order', 'queue_position')
+    ranks = {pk: _order_rank(pk, priority, position) for pk, priority, position in orders}
+
+    layers = defaultdict(lambda: defaultdict(list))
+    for pk, order_id, worker_id, status, priority_rank, sequence, task_type_id, estimated, spent in tasks:
+        remaining = (estimated - spent).total_seconds()
+        if pk in running:
+            remaining -= (now - running[pk]).total_seconds()
+        rank = ranks.get(order_id, (-1,))
+        job = _Job((0 if status == 'started' else 1, rank, sequence, priority_rank, pk), order_id, worker_id,
+                   max(remaining, 0), task_type=task_type_id)
+        jobs.append(job)
+        layers[order_id][sequence].append(job)
+    for order_id, by_sequence in layers.items():
+        if order_id:
+            _link([by_sequence[sequence] for sequence in sorted(by_sequence)],
+                  lambda layer: all(job.task_type in parallel_types for job in layer))
+
+    if template is None:
+        return jobs
+    steps = sorted(template.steps.all(), key=lambda step: step.sequence_order)
+    waiting = list(Order.objects.filter(order_status='deposit_paid', queue_position__isnull=False).exclude(
+        pk__in=OrderTaskProgress.objects.filter(total__gt=0).values('order_id'),
+    ).values_list('pk', 'is_priority_order', 'queue_position'))
+    products = defaultdict(set)
+    for order_id, product_id in OrderItem.objects.filter(order__in=[pk for pk, _, _ in waiting]).values_list('order_id', 'product_id'):
+        products[order_id].add(product_id)
+    for pk, priority, position in waiting:
+        product_id = next(iter(products[pk])) if len(products[pk]) == 1 else None
+        order_jobs = [
+            _Job((1, _order_rank(pk, priority, position), step.sequence_order, 0, step.pk), pk,
+                 task_type=step.task_type_id, step=(step, product_id))
+            for step in steps
+        ]
+        jobs.extend(order_jobs)
+        _link([[job] for job in order_jobs], lambda layer: not layer[0].step[0].requires_previous_completion)
+    return jobs
+
+
+def forecast(now=None):
+    """``{order_id: planned finish}`` for every order with open or waiting production work"""
+    now = now or timezone.now()
+    template = production_template()
+    jobs = build_jobs(now, template)
+    if not jobs:
+        return {}
+
+    workers = {worker.pk: worker for worker in User.objects.filter(
+        role='warehouse_worker', is_active=True, is_active_worker=True,
+    )}
+    # Template steps can go to any active worker; open tasks stay with whoever has them
+    pool = list(workers)
+    missing = {job.worker_id for job in jobs if job.worker_id and job.worker_id not in workers}
+    workers.update(User.objects.in_bulk(missing))
+    shifts = {pk: Shift(worker.shift_start, worker.shift_end) for pk, worker in workers.items()}
+    free_at = {pk: shift.advance(now, 0) for pk, shift in shifts.items()}
+    estimator = DurationEstimator({job.task_type for job in jobs if job.step})
+
+    finish = {}
+    eligible = []
+    for index, job in enumerate(jobs):
+        job.index = index
+        if not job.waiting_on:
+            job.ready_at = now
+            heapq.heappush(eligible, (job.key, index))
+    while eligible:
+        _, index = heapq.heappop(eligible)
+        job = jobs[index]
+        if job.step:
+            if not pool:
+                continue
+            # A template step goes to whoever would finish it first
+            step, product_id = job.step
+            candidates = []
+            for worker_id in pool:
+                seconds = estimator.seconds(step.task_type, product_id, worker_id, step.estimated_duration.total_seconds())
+                start = shifts[worker_id].advance(max(free_at[worker_id], job.ready_at), 0)
+                candidates.append((shifts[worker_id].advance(start, seconds), worker_id))
+            end, worker_id = min(candidates)
+        else:
+            worker_id = job.worker_id
+            start = shifts[worker_id].advance(max(free_at[worker_id], job.ready_at), 0)
+            end = shifts[worker_id].advance(start, job.seconds)
+        free_at[worker_id] = end
+        if job.order_id:
+            finish[job.order_id] = max(finish.get(job.order_id, end), end)
+        for successor in job.successors:
+            successor.ready_at = max(successor.ready_at or end, end)
+            successor.waiting_on -= 1
+            if not successor.waiting_on:
+                heapq.heappush(eligible, (successor.key, successor.index))
+    return finish
+
+
+def store_forecasts(now=None):
+    """Store every order's forecast completion date; returns how many orders were forecast and updated"""
+    from orders.models import Order
+
+    finish = forecast(now)
+    changed = []
+    for order in Order.objects.filter(pk__in=finish).only('pk', 'estimated_completion_date'):
+        eta = timezone.localtime(finish[order.pk]).date()
+        if order.estimated_completion_date != eta:
+            order.estimated_completion_date = eta
+            changed.append(order)
+    Order.objects.bulk_update(changed, ['estimated_completion_date'], batch_size=500)
+    return {'orders': len(finish), 'updated': len(changed)}
@@ -0,0 +1,93 @@
+from datetime import date
+
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from jobs.queue import job
+from users.models import User
+from .estimates import record_approved_durations
+from .forecast import store_forecasts
+from .models import Task, TaskNotification, WorkerProductivity
+
+
+@job()
+def calculate_daily_productivity(date_str=None):
+    """Calculate productivity for all warehouse workers for one day (ISO date, default today)"""
+    target_date = date.fromisoformat(date_str) if date_str else timezone.now().date()
+    warehouse_users = User.objects.filter(role='warehouse')
+    calculated_count = 0
+    for worker in warehouse_users:
+        if WorkerProductivity.calculate_daily_productivity(worker, target_date):
+            calculated_count += 1
+    return {'date': target_date.isoformat(), 'calculated': calculated_count, 'total_workers': len(warehouse_users)}
+
+
+@job()
+def notify_task_completed(task_id):
+    """Notify warehouse supervisors/admins that a task is awaiting QA approval"""
+    task = Task.objects.select_related('assigned_to').filter(pk=task_id).first()
+    if not task:
+        return {'notified': 0}
+    worker_name = task.assigned_to.get_full_name() or task.assigned_to.username
+    # assigned_by was already notified when the task was completed
+    supervisors = User.objects.filter(
+        role__in=['warehouse', 'admin', 'owner'], is_active=True
+    ).exclude(pk=task.assigned_by_id)
+    notifications = [
+        TaskNotification(
+            task=task,
+            recipient=supervisor,
+            notification_type='task_completed',
+            message=f"Task '{task.title}' completed by {worker_name} – awaiting QA approval"
+        )
+        for supervisor in supervisors
+    ]
+    TaskNotification.objects.bulk_create(notifications)
+    return {'notified': len(notifications)}
+
+
+@job()
+def notify_overdue_tasks():
+    """Send a task_overdue notification once for each open task that has passed its deadline"""
+    now = timezone.now()
+    overdue = list(Task.objects.annotate(
+        effective_deadline=Coalesce('deadline', 'due_date')
+    ).filter(
+        status__in=['assigned', 'started', 'paused'],
+        overdue_notified_at__isnull=True,
+        effective_deadline__lt=now,
+    ).select_related('assigned_to'))
+
+    notifications = []
+    for task in overdue:
+        notifications.append(TaskNotification(
+            task=task,
+            recipient_id=task.assigned_to_id,
+            notification_type='task_overdue',
+            message=f"Task '{task.title}' is overdue"
+        ))
+        if task.assigned_by_id != task.assigned_to_id:
+            worker_name = task.assigned_to.get_full_name() or task.assigned_to.username
+            notifications.append(TaskNotification(
+                task=task,
+                recipient_id=task.assigned_by_id,
+                notification_type='task_overdue',
+                message=f"Task '{task.title}' assigned to {worker_name} is overdue"
+            ))
+    with transaction.atomic():
+        TaskNotification.objects.bulk_create(notifications)
+        Task.objects.filter(pk__in=[task.pk for task in overdue]).update(overdue_notified_at=now)
+    return {'overdue_tasks': len(overdue), 'notifications': len(notifications)}
+
+
+@job()
+def refresh_duration_estimates():
+    """Add newly approved tasks' worked time to the duration statistics used for estimates"""
+    return {'tasks': record_approved_durations()}
+
+
+@job()
+def refresh_order_etas():
+    """Recompute every order's production completion forecast and store the dates that changed"""
+    return store_forecasts()
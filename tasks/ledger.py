@@ -0,0 +1,52 @@
+"""Worked time per worker per day.
+
+When a time session closes (a task is paused or completed) its span is split
+at local midnights and each day's seconds are added to that worker's
+:class:`~tasks.models.DailyWorkedTime` row. A session from 22:00 to 02:00
+counts 2h on each day. Time worked over a day, week or month is then one
+``SUM`` over the ``(worker, date)`` index. :func:`worked_seconds` adds the
+running part of any session that is still open.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import DailyWorkedTime, TaskTimeSession
+
+
+def split_by_day(started_at, ended_at):
+    """``[(local date, seconds)]`` covered by ``started_at``..``ended_at``, cut at local midnights."""
+    parts = []
+    start = timezone.localtime(started_at)
+    end = timezone.localtime(ended_at)
+    while start < end:
+        midnight = timezone.make_aware(datetime.combine(start.date() + timedelta(days=1), time.min))
+        part_end = min(end, midnight)
+        seconds = int((part_end - start).total_seconds())
+        if seconds:
+            parts.append((start.date(), seconds))
+        start = timezone.localtime(part_end)
+    return parts
+
+
+def record_session(worker_id, started_at, ended_at):
+    """Add a closed session's time to ``worker_id``'s daily totals."""
+    for day, seconds in split_by_day(started_at, ended_at):
+        rows = DailyWorkedTime.objects.filter(worker_id=worker_id, date=day)
+        if not rows.update(seconds=F('seconds') + seconds):
+            DailyWorkedTime.objects.get_or_create(worker_id=worker_id, date=day)
+            rows.update(seconds=F('seconds') + seconds)
+
+
+def worked_seconds(worker, since, until=None, now=None):
+    """Seconds ``worker`` worked from local date ``since`` through ``until`` (default ``since``), open sessions included."""
+    until = until or since
+    now = now or timezone.now()
+    total = DailyWorkedTime.objects.filter(
+        worker=worker, date__range=(since, until),
+    ).aggregate(seconds=Sum('seconds'))['seconds'] or 0
+    open_sessions = TaskTimeSession.objects.filter(task__assigned_to=worker, ended_at__isnull=True)
+    for started_at in open_sessions.values_list('started_at', flat=True):
+        total += sum(seconds for day, seconds in split_by_day(started_at, now) if since <= day <= until)
+    return total
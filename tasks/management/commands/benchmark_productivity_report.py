@@ -0,0 +1,88 @@
+import random
+import time as clock
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.analytics import GROUP_BY, percentile, task_report
+from tasks.models import DailyWorkedTime, Task, TaskType
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Time the productivity report on generated task history (default: a year). '
+            'The data is created in a transaction that is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--tasks-per-day', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per grouping; the best time is reported')
+
+    def handle(self, *args, **options):
+        workers = list(User.objects.filter(role__in=['warehouse_worker', 'warehouse'], is_active=True)[:20])
+        task_types = list(TaskType.objects.all()[:10])
+        if not workers or not task_types:
+            raise CommandError('Needs at least one active warehouse user and one task type')
+
+        with transaction.atomic():
+            until = timezone.localdate()
+            since = until - timedelta(days=options['days'] - 1)
+            created = self.generate(workers, task_types, since, options['days'], options['tasks_per_day'])
+            self.stdout.write(f'{created} completed tasks over {options["days"]} days, '
+                              f'{len(workers)} workers, {len(task_types)} task types')
+            for group_by in GROUP_BY:
+                best = min(self.timed(task_report, group_by, since, until) for _ in range(options['repeat']))
+                self.stdout.write(f'  group_by={group_by:<9} {best * 1000:8.1f} ms')
+            best = min(self.timed(self.row_by_row, since, until) for _ in range(options['repeat']))
+            self.stdout.write(f'  model instances, by worker {best * 1000:8.1f} ms (for comparison)')
+            transaction.set_rollback(True)
+
+    def timed(self, function, *args):
+        started = clock.perf_counter()
+        function(*args)
+        return clock.perf_counter() - started
+
+    def generate(self, workers, task_types, since, days, per_day):
+        generator = random.Random(0)
+        tasks, worked = [], defaultdict(int)
+        for offset in range(days):
+            day = since + timedelta(days=offset)
+            day_start = timezone.make_aware(datetime.combine(day, time(8)))
+            for _ in range(per_day):
+                worker = generator.choice(workers)
+                task_type = generator.choice(task_types)
+                estimate = timedelta(minutes=task_type.estimated_duration_minutes or 60)
+                spent = estimate * generator.lognormvariate(0, 0.4)
+                completed_at = day_start + timedelta(minutes=generator.randrange(600))
+                tasks.append(Task(
+                    title=f'Benchmark {task_type.name}', task_type=task_type, assigned_to=worker,
+                    assigned_by=worker, status='approved', priority_rank=Task.rank_for('normal'),
+                    estimated_duration=estimate, total_time_spent=spent,
+                    actual_start_time=completed_at - spent, completed_at=completed_at,
+                ))
+                worked[worker.pk, day] += int(spent.total_seconds())
+        Task.objects.bulk_create(tasks, batch_size=1000)
+        DailyWorkedTime.objects.filter(worker__in=workers, date__gte=since).delete()
+        DailyWorkedTime.objects.bulk_create([
+            DailyWorkedTime(worker_id=worker_id, date=day, seconds=seconds)
+            for (worker_id, day), seconds in worked.items()
+        ], batch_size=1000)
+        return len(tasks)
+
+    def row_by_row(self, since, until):
+        """The same per-worker figures computed from full model instances"""
+        durations = defaultdict(list)
+        tasks = Task.objects.filter(
+            status__in=['completed', 'approved'], completed_at__date__range=(since, until),
+        ).select_related('assigned_to', 'task_type')
+        for task in tasks:
+            durations[task.assigned_to.pk].append(
+                (task.total_time_spent.total_seconds(), task.estimated_duration.total_seconds())
+            )
+        return {
+            worker_id: percentile(sorted(spent for spent, _ in rows), 90)
+            for worker_id, rows in durations.items()
+        }
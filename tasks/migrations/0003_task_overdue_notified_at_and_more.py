@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:19
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def mark_existing_overdue_as_notified(apps, schema_editor):
+    # Only tasks that become overdue after this migration get a task_overdue notification
+    Task = apps.get_model('tasks', 'Task')
+    now = timezone.now()
+    Task.objects.filter(
+        Q(deadline__lt=now) | Q(deadline__isnull=True, due_date__lt=now),
+        status__in=['assigned', 'started', 'paused'],
+    ).update(overdue_notified_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_alter_tasktemplate_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='overdue_notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'due_date'], name='tasks_task_status_due_idx'),
+        ),
+        migrations.RunPython(mark_existing_overdue_as_notified, migrations.RunPython.noop),
+    ]
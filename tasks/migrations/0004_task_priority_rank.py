@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:45
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+# Task.PRIORITY_RANKS as of this migration
+PRIORITY_RANKS = {'critical': 1, 'urgent': 2, 'high': 3, 'normal': 4, 'low': 5}
+
+
+def backfill_priority_rank(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.update(priority_rank=Case(
+        *[When(priority=priority, then=Value(rank)) for priority, rank in PRIORITY_RANKS.items()],
+        default=Value(PRIORITY_RANKS['normal']),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_task_overdue_notified_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='task',
+            options={'ordering': ['priority_rank', 'due_date', 'created_at']},
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=4, editable=False, help_text='Set from priority on save (1 = critical)'),
+        ),
+        migrations.RunPython(backfill_priority_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'status', 'priority_rank', 'due_date', 'created_at'], name='tasks_task_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:47
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def close_duplicate_open_sessions(apps, schema_editor):
+    # Double-started tasks left extra open sessions; keep the latest and end the others when it began
+    TaskTimeSession = apps.get_model('tasks', 'TaskTimeSession')
+    task_ids = (
+        TaskTimeSession.objects.filter(ended_at__isnull=True).values('task_id')
+        .annotate(open_count=Count('id')).filter(open_count__gt=1).values_list('task_id', flat=True)
+    )
+    for task_id in list(task_ids):
+        sessions = list(TaskTimeSession.objects.filter(task_id=task_id, ended_at__isnull=True).order_by('-started_at', '-id'))
+        latest = sessions[0]
+        TaskTimeSession.objects.filter(pk__in=[session.pk for session in sessions[1:]]).update(ended_at=latest.started_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_task_priority_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tasktimesession',
+            constraint=models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('task',), name='tasks_timesession_one_open'),
+        ),
+    ]
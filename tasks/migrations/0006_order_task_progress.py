@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:49
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def count_existing_tasks(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    OrderTaskProgress = apps.get_model('tasks', 'OrderTaskProgress')
+    counts = Task.objects.filter(order__isnull=False).values('order_id').annotate(
+        total=Count('id'),
+        **{status: Count('id', filter=Q(status=status))
+           for status in ('assigned', 'started', 'paused', 'completed', 'approved')},
+    ).order_by()
+    OrderTaskProgress.objects.bulk_create([OrderTaskProgress(**row) for row in counts], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0022_payment_proof_variants'),
+        ('tasks', '0005_timesession_one_open'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderTaskProgress',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_progress', serialize=False, to='orders.order')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('assigned', models.PositiveIntegerField(default=0)),
+                ('started', models.PositiveIntegerField(default=0)),
+                ('paused', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0, help_text='Completed and awaiting approval')),
+                ('approved', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(count_existing_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:52
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+# tasks.ledger.split_by_day as of this migration
+def split_by_day(started_at, ended_at):
+    parts = []
+    start = timezone.localtime(started_at)
+    end = timezone.localtime(ended_at)
+    while start < end:
+        midnight = timezone.make_aware(datetime.combine(start.date() + timedelta(days=1), time.min))
+        part_end = min(end, midnight)
+        seconds = int((part_end - start).total_seconds())
+        if seconds:
+            parts.append((start.date(), seconds))
+        start = timezone.localtime(part_end)
+    return parts
+
+
+def record_closed_sessions(apps, schema_editor):
+    TaskTimeSession = apps.get_model('tasks', 'TaskTimeSession')
+    DailyWorkedTime = apps.get_model('tasks', 'DailyWorkedTime')
+    totals = Counter()
+    sessions = TaskTimeSession.objects.filter(ended_at__isnull=False).values_list('task__assigned_to_id', 'started_at', 'ended_at')
+    for worker_id, started_at, ended_at in sessions.iterator(chunk_size=2000):
+        for day, seconds in split_by_day(started_at, ended_at):
+            totals[worker_id, day] += seconds
+    DailyWorkedTime.objects.bulk_create([
+        DailyWorkedTime(worker_id=worker_id, date=day, seconds=seconds)
+        for (worker_id, day), seconds in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0006_order_task_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyWorkedTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_worked_time', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyworkedtime',
+            constraint=models.UniqueConstraint(fields=('worker', 'date'), name='tasks_dailyworkedtime_worker_date'),
+        ),
+        migrations.RunPython(record_closed_sessions, migrations.RunPython.noop),
+    ]
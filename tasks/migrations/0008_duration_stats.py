@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0022_payment_proof_variants'),
+        ('tasks', '0007_daily_worked_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='duration_sampled_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='TaskDurationStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='task_duration_stats', to='orders.product')),
+                ('task_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duration_stats', to='tasks.tasktype')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_duration_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='taskdurationstats',
+            constraint=models.UniqueConstraint(fields=('task_type', 'product', 'worker'), name='tasks_durationstats_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskdurationstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('product__isnull', True)), fields=('task_type', 'worker'), name='tasks_durationstats_key_no_product'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from datetime import timedelta
@@ -67,6 +67,10 @@ class Task(models.Model):
         ('urgent', 'Urgent'),
         ('critical', 'Critical'),  # Added critical priority
     ]
+    # Queue position of each priority, most urgent first; stored in priority_rank
+    PRIORITY_RANKS = {'critical': 1, 'urgent': 2, 'high': 3, 'normal': 4, 'low': 5}
+    # Order in which a worker's tasks should be picked up
+    QUEUE_ORDERING = ['priority_rank', 'due_date', 'created_at']
     
     # Basic task info
     title = models.CharField(max_length=200)
@@ -80,6 +84,7 @@ class Task(models.Model):
     # Status and priority
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='assigned')
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='normal')
+    priority_rank = models.PositiveSmallIntegerField(default=4, editable=False, help_text="Set from priority on save (1 = critical)")
     
     # Order relationship - REQUIRED for order-task workflow
     order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='tasks', null=True, blank=True)
@@ -96,6 +101,8 @@ class Task(models.Model):
     # Deadlines
     due_date = models.DateTimeField(null=True, blank=True)
     deadline = models.DateTimeField(null=True, blank=True)  # Alternative field name for frontend compatibility
+    overdue_notified_at = models.DateTimeField(null=True, blank=True)  # Set by the scheduled overdue check
+    duration_sampled_at = models.DateTimeField(null=True, blank=True, editable=False)  # Set once counted in TaskDurationStats
     
     # Additional workflow fields
     instructions = models.TextField(blank=True)
@@ -114,11 +121,36 @@ class Task(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
-        ordering = ['-priority', 'due_date', 'created_at']
+        ordering = ['priority_rank', 'due_date', 'created_at']
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='tasks_task_status_due_idx'),
+            models.Index(fields=['assigned_to', 'status', 'priority_rank', 'due_date', 'created_at'], name='tasks_task_queue_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.assigned_to.username} ({self.get_status_display()})"
     
+    @classmethod
+    def rank_for(cls, priority):
+        return cls.PRIORITY_RANKS.get(priority, cls.PRIORITY_RANKS['normal'])
+    
+    def save(self, *args, **kwargs):
+        self.priority_rank = self.rank_for(self.priority)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'priority' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'priority_rank'}
+        if update_fields is not None and not {'status', 'order', 'order_id'} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        # Keep the order progress counters in step with status and order changes
+        from .progress import record_task_change
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Task.objects.select_for_update().filter(pk=self.pk).values_list('order_id', 'status').first()
+            super().save(*args, **kwargs)
+            record_task_change(previous, (self.order_id, self.status))
+    
     @property
     def is_overdue(self):
         """Check if task is overdue"""
@@ -141,207 +173,60 @@ class Task(models.Model):
         """Check if task is currently running (started but not completed)"""
         return self.status == 'started' and self.is_timer_running
     
-    # Added: properly scoped task state transition methods within Task class
+    # State transitions; see tasks.transitions
     def start_task(self) -> bool:
         """Start the task and begin time tracking"""
-        if self.status == 'assigned':
-            self.status = 'started'
-            if not self.actual_start_time:
-                self.actual_start_time = timezone.now()
-            self.is_timer_running = True
-            self.save()
-            
-            # Create time session
-            TaskTimeSession.objects.create(
-                task=self,
-                started_at=timezone.now()
-            )
-            # Auto-advance order production status when work starts
-            if self.order:
-                order = self.order
-                if order.production_status == 'not_started':
-                    order.production_status = 'in_production'
-                    order.save(update_fields=['production_status', 'updated_at'])
-            return True
-        return False
+        from .transitions import apply_transition
+        return apply_transition(self, 'start')
     
     def pause_task(self, reason: str = "") -> bool:
         """Pause the task and stop time tracking"""
-        if self.status == 'started':
-            self.status = 'paused'
-            self.is_timer_running = False
-            current_time = timezone.now()
-            
-            # End current time session
-            current_session = self.time_sessions.filter(ended_at__isnull=True).first()
-            if current_session:
-                current_session.ended_at = current_time
-                current_session.save()
-                
-                # Update total time spent
-                session_duration = current_session.ended_at - current_session.started_at
-                self.total_time_spent += session_duration
-                self.time_elapsed_seconds = int(self.total_time_spent.total_seconds())
-            
-            self.save()
-            
-            # Log the pause
-            TaskNote.objects.create(
-                task=self,
-                user=self.assigned_to,
-                note_type='pause',
-                content=f"Task paused. Reason: {reason}" if reason else "Task paused."
-            )
-            return True
-        return False
+        from .transitions import apply_transition
+        return apply_transition(self, 'pause', reason=reason)
     
     def resume_task(self) -> bool:
         """Resume a paused task"""
-        if self.status == 'paused':
-            self.status = 'started'
-            self.is_timer_running = True
-            current_time = timezone.now()
-            self.save()
-            
-            # Create new time session
-            TaskTimeSession.objects.create(
-                task=self,
-                started_at=current_time
-            )
-            return True
-        return False
+        from .transitions import apply_transition
+        return apply_transition(self, 'resume')
     
     def complete_task(self):
         """Mark task as completed"""
-        if self.status in ['started', 'paused']:
-            self.status = 'completed'
-            self.completed_at = timezone.now()
-            self.actual_end_time = self.completed_at
-            
-            # End current time session if running
-            current_session = self.time_sessions.filter(ended_at__isnull=True).first()
-            if current_session:
-                current_session.ended_at = self.completed_at
-                current_session.save()
-                
-                # Update total time spent
-                session_duration = current_session.ended_at - current_session.started_at
-                self.total_time_spent += session_duration
-            
-            self.save()
-            
-            # Create notification for supervisor
-            TaskNotification.objects.create(
-                task=self,
-                recipient=self.assigned_by,
-                notification_type='task_completed',
-                message=f"Task '{self.title}' has been completed by {self.assigned_to.get_full_name() or self.assigned_to.username}"
-            )
-
-            # Also notify warehouse supervisors/admins so it appears in their QA queue
-            try:
-                from users.models import User as UsersModel
-                supervisors = UsersModel.objects.filter(role__in=['warehouse', 'admin', 'owner'], is_active=True)
-                for sup in supervisors:
-                    # Avoid duplicate notification to the same assigned_by already notified
-                    if sup == self.assigned_by:
-                        continue
-                    TaskNotification.objects.create(
-                        task=self,
-                        recipient=sup,
-                        notification_type='task_completed',
-                        message=f"Task '{self.title}' completed by {self.assigned_to.get_full_name() or self.assigned_to.username} – awaiting QA approval"
-                    )
-            except Exception:
-                # Best-effort notifications; do not break completion if notification fails
-                pass
-
-            # Recompute order production state
-            self._update_order_after_task_change()
-            return True
-        return False
+        from .transitions import apply_transition
+        return apply_transition(self, 'complete')
     
     def approve_task(self, approver):
         """Approve a completed task"""
-        if self.status == 'completed':
-            self.status = 'approved'
-            self.save()
-            
-            # Create notification for worker
-            TaskNotification.objects.create(
-                task=self,
-                recipient=self.assigned_to,
-                notification_type='task_approved',
-                message=f"Your task '{self.title}' has been approved by {approver.get_full_name() or approver.username}"
-            )
-            # Recompute order production and readiness when approvals happen
-            self._update_order_after_task_change()
-            return True
-        return False
+        from .transitions import apply_transition
+        return apply_transition(self, 'approve', actor=approver)
     
     def reject_task(self, rejector, reason=""):
         """Reject a completed task and send back for revision"""
-        if self.status == 'completed':
-            self.status = 'rejected'
-            self.save()
-            
-            # Log rejection reason
-            TaskNote.objects.create(
-                task=self,
-                user=rejector,
-                note_type='rejection',
-                content=f"Task rejected. Reason: {reason}" if reason else "Task rejected."
-            )
-            
-            # Notify worker
-            TaskNotification.objects.create(
-                task=self,
-                recipient=self.assigned_to,
-                notification_type='task_rejected',
-                message=f"Your task '{self.title}' was rejected by {rejector.get_full_name() or rejector.username}. {('Reason: ' + reason) if reason else ''}"
-            )
-            return True
-        return False
+        from .transitions import apply_transition
+        return apply_transition(self, 'reject', actor=rejector, reason=reason)
 
-    def _update_order_after_task_change(self):
-        """Recalculate and persist the related order's production and order status from task progress."""
-        if not self.order:
-            return
-        order = self.order
-        task_statuses = list(order.tasks.values_list('status', flat=True))
-        if not task_statuses:
-            return
-        total_tasks = len(task_statuses)
-        approved_count = sum(1 for s in task_statuses if s == 'approved')
-        in_progress = any(s in ['started', 'paused'] for s in task_statuses)
 
-        # If everything is approved, production is complete and order is ready for delivery handoff
-        if approved_count == total_tasks:
-            changed = False
-            if order.production_status != 'completed':
-                order.production_status = 'completed'
-                changed = True
-            # Don't auto-set order_status to 'order_ready' - let frontend handle address prompt
-            # Keep current order status - frontend will handle the transition through ready_for_delivery
-            pass
-            if changed:
-                order.save()
-                try:
-                    from orders.models import OrderHistory
-                    OrderHistory.objects.create(
-                        order=order,
-                        user=self.assigned_by,
-                        action='Order production completed',
-                        details='All tasks approved; moved to Ready for Delivery'
-                    )
-                except Exception:
-                    pass
-            return
-
-        # Otherwise, if any task is running, ensure production is marked active
-        if in_progress and order.production_status == 'not_started':
-            order.production_status = 'in_production'
-            order.save(update_fields=['production_status', 'updated_at'])
+class OrderTaskProgress(models.Model):
+    """Running count of an order's tasks by status, kept up to date by tasks.progress"""
+    order = models.OneToOneField('orders.Order', on_delete=models.CASCADE, primary_key=True, related_name='task_progress')
+    total = models.PositiveIntegerField(default=0)
+    assigned = models.PositiveIntegerField(default=0)
+    started = models.PositiveIntegerField(default=0)
+    paused = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0, help_text="Completed and awaiting approval")
+    approved = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Order {self.order_id}: {self.approved}/{self.total} tasks approved"
+    
+    @property
+    def done(self):
+        """Completed tasks, approved or not"""
+        return self.completed + self.approved
+    
+    @property
+    def all_approved(self):
+        return self.total > 0 and self.approved == self.total
 
 
 class Notification(models.Model):
@@ -410,6 +295,11 @@ class TaskTimeSession(models.Model):
     
     class Meta:
         ordering = ['-started_at']
+        constraints = [
+            # A task is timed by at most one running session
+            models.UniqueConstraint(fields=['task'], condition=models.Q(ended_at__isnull=True),
+                                    name='tasks_timesession_one_open'),
+        ]
     
     def __str__(self):
         return f"{self.task.title} - Session {self.started_at.strftime('%Y-%m-%d %H:%M')}"
@@ -549,6 +439,44 @@ class TaskTemplateStep(models.Model):
         return f"{self.template.name} - Step {self.sequence_order}: {self.task_type.name}"
 
 
+class DailyWorkedTime(models.Model):
+    """Seconds a worker spent in closed task time sessions on one (local) day; see tasks.ledger"""
+    worker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_worked_time')
+    date = models.DateField()
+    seconds = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['worker', 'date'], name='tasks_dailyworkedtime_worker_date'),
+        ]
+    
+    def __str__(self):
+        return f"{self.worker.username} - {self.date}: {self.seconds}s"
+
+
+class TaskDurationStats(models.Model):
+    """Worked time of approved tasks per task type, product and worker; see tasks.estimates"""
+    task_type = models.ForeignKey(TaskType, on_delete=models.CASCADE, related_name='duration_stats')
+    product = models.ForeignKey('orders.Product', on_delete=models.CASCADE, null=True, blank=True, related_name='task_duration_stats')
+    worker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_duration_stats')
+    samples = models.PositiveIntegerField(default=0)
+    total_seconds = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task_type', 'product', 'worker'], name='tasks_durationstats_key'),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(fields=['task_type', 'worker'], condition=models.Q(product__isnull=True),
+                                    name='tasks_durationstats_key_no_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_type.name} / {self.product_id or '-'} / {self.worker.username}: {self.samples} tasks"
+
+
 class WorkerProductivity(models.Model):
     """Track worker productivity metrics"""
     worker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='productivity_records')
@@ -585,14 +513,10 @@ class WorkerProductivity(models.Model):
         completed_tasks = tasks.filter(status__in=['completed', 'approved'])
         approved_tasks = tasks.filter(status='approved')
         
-        total_time = timedelta(0)
-        for task in completed_tasks:
-            total_time += task.total_time_spent
-        
-        # Calculate average task time
-        avg_time = None
-        if completed_tasks.count() > 0:
-            avg_time = total_time / completed_tasks.count()
+        # Average over the completed tasks' own time; time worked on the day comes from the ledger
+        avg_time = completed_tasks.aggregate(avg=models.Avg('total_time_spent'))['avg']
+        day_time = DailyWorkedTime.objects.filter(worker=worker, date=date).values_list('seconds', flat=True).first()
+        total_time = timedelta(seconds=day_time or 0)
         
         # Calculate completion rate
         completion_rate = 0
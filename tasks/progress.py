@@ -0,0 +1,110 @@
+"""Per-order task counters and the production status derived from them.
+
+Every change to a task's status or order moves it between the counters of
+the order's :class:`~tasks.models.OrderTaskProgress` row with one ``UPDATE
+... SET started = started + 1, assigned = assigned - 1`` in the same
+transaction as the change: ``Task.save()`` and the transitions in
+``tasks.transitions`` call :func:`record_task_change` (bulk reassignment
+calls :func:`record_status_changes`), ``tasks.factory`` calls
+:func:`record_tasks_added`, and deletes are counted by a
+``post_delete`` receiver. Readers get an order's task summary from that one
+row instead of counting its tasks.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import F
+
+from .models import OrderTaskProgress
+
+COUNTED_STATUSES = ('assigned', 'started', 'paused', 'completed', 'approved')
+
+
+def record_task_change(previous, current):
+    """Move one task from ``previous`` to ``current``, each ``(order_id, status)`` or ``None`` (no task)."""
+    previous_order, previous_status = previous or (None, None)
+    current_order, current_status = current or (None, None)
+    if previous == current:
+        return
+    _forecast_changed()
+    if previous_order == current_order:
+        _adjust(current_order, {previous_status: -1, current_status: 1})
+        return
+    _adjust(previous_order, {'total': -1, previous_status: -1})
+    _adjust(current_order, {'total': 1, current_status: 1})
+
+
+def record_tasks_added(tasks):
+    """Count newly bulk-created ``tasks`` (which skip ``Task.save()``), one UPDATE per order."""
+    added = defaultdict(Counter)
+    for task in tasks:
+        if task.order_id:
+            added[task.order_id]['total'] += 1
+            added[task.order_id][task.status] += 1
+    for order_id, deltas in added.items():
+        _adjust(order_id, deltas)
+    if tasks:
+        _forecast_changed()
+
+
+def record_status_changes(changes):
+    """Move several tasks between statuses within their orders, one UPDATE per order.
+
+    ``changes`` are ``(order_id, previous status, status)`` tuples.
+    """
+    moved = defaultdict(Counter)
+    for order_id, previous_status, current_status in changes:
+        if order_id and previous_status != current_status:
+            moved[order_id][previous_status] -= 1
+            moved[order_id][current_status] += 1
+    for order_id, deltas in moved.items():
+        _adjust(order_id, deltas)
+    if changes:
+        _forecast_changed()
+
+
+def _forecast_changed():
+    # Any change to open work can move the completion forecasts (see tasks.forecast)
+    from .forecast import request_refresh
+    request_refresh()
+
+
+def _adjust(order_id, deltas):
+    changes = {
+        field: F(field) + delta
+        for field, delta in deltas.items()
+        if field == 'total' or field in COUNTED_STATUSES
+    }
+    if order_id is None or not changes:
+        return
+    if OrderTaskProgress.objects.filter(order_id=order_id).update(**changes) or deltas.get('total', 0) <= 0:
+        # A missing row on removal means the order itself is being deleted
+        return
+    # First task of the order
+    OrderTaskProgress.objects.get_or_create(order_id=order_id)
+    OrderTaskProgress.objects.filter(order_id=order_id).update(**changes)
+
+
+def update_order_production(order, user_id=None):
+    """Advance ``order.production_status`` from its task counters.
+
+    Production is completed once every task is approved, and in production
+    as soon as any task has been started.
+    """
+    progress = OrderTaskProgress.objects.filter(order_id=order.pk).first()
+    if progress is None or not progress.total:
+        return
+    if progress.all_approved:
+        if order.production_status != 'completed':
+            order.production_status = 'completed'
+            # Don't auto-set order_status to 'order_ready' - let frontend handle address prompt
+            order.save()
+            from orders.models import OrderHistory
+            OrderHistory.objects.create(
+                order=order,
+                user_id=user_id,
+                action='Order production completed',
+                details='All tasks approved; moved to Ready for Delivery'
+            )
+    elif (progress.started or progress.paused) and order.production_status == 'not_started':
+        order.production_status = 'in_production'
+        order.save(update_fields=['production_status', 'updated_at'])
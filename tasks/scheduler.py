@@ -0,0 +1,170 @@
+"""Proposed task assignments for the production queue.
+
+:func:`plan` expands a task template for each queued order that has no
+tasks yet, most urgent first (priority orders, then ``queue_position``), and
+hands the steps to warehouse workers by list scheduling on two heaps:
+workers keyed by the time they are next free, which starts at the end of the
+work already assigned to them, and ready steps keyed by order urgency and
+step number. The worker who is free first takes the most urgent ready step.
+A step's duration is that worker's estimate (see ``tasks.estimates``) and
+only counts inside the worker's shift (``shift_start`` to ``shift_end``,
+Monday to Friday). A step that requires the previous one is ready when that
+one is planned to finish.
+
+:func:`apply_plan` creates the planned tasks in one batch through
+``tasks.factory``.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import User
+from .estimates import OPEN_STATUSES, DurationEstimator
+from .factory import create_tasks
+from .models import OrderTaskProgress, Task
+
+# Used for workers without shift times
+DEFAULT_SHIFT = (time(8), time(17))
+
+
+class Shift:
+    """A worker's working hours, Monday to Friday"""
+
+    def __init__(self, start=None, end=None):
+        self.start, self.end = (start, end) if start and end else DEFAULT_SHIFT
+
+    def _windows(self, moment):
+        day = timezone.localtime(moment).date() - timedelta(days=1)
+        while True:
+            if day.weekday() < 5:
+                closes_on = day + timedelta(days=1) if self.end <= self.start else day
+                yield (timezone.make_aware(datetime.combine(day, self.start)),
+                       timezone.make_aware(datetime.combine(closes_on, self.end)))
+            day += timedelta(days=1)
+
+    def advance(self, moment, seconds):
+        """When ``seconds`` of working time starting at ``moment`` are over (the next start with 0)"""
+        for opens, closes in self._windows(moment):
+            if closes <= moment:
+                continue
+            start = max(moment, opens)
+            available = (closes - start).total_seconds()
+            if seconds <= available:
+                return start + timedelta(seconds=seconds)
+            seconds -= available
+
+
+def _queued_orders(order_ids=None, limit=10):
+    from orders.models import Order
+
+    queue = Order.objects.filter(order_status='deposit_paid', queue_position__isnull=False).exclude(
+        pk__in=OrderTaskProgress.objects.filter(total__gt=0).values('order_id'),
+    )
+    if order_ids is not None:
+        queue = queue.filter(pk__in=order_ids)
+    return list(queue.order_by('-is_priority_order', 'queue_position')[:limit])
+
+
+def _order_products(orders):
+    """The product of each order that is for a single product"""
+    from orders.models import OrderItem
+
+    products = defaultdict(set)
+    for order_id, product_id in OrderItem.objects.filter(order__in=orders).values_list('order_id', 'product_id'):
+        products[order_id].add(product_id)
+    return {order_id: product_ids.pop() for order_id, product_ids in products.items() if len(product_ids) == 1}
+
+
+def _workers(now):
+    """Active warehouse workers with their shift and when they finish the work they already have"""
+    workers = list(User.objects.filter(role='warehouse_worker', is_active=True, is_active_worker=True))
+    remaining = defaultdict(float)
+    open_tasks = Task.objects.filter(assigned_to__in=workers, status__in=OPEN_STATUSES)
+    for worker_id, estimated, spent in open_tasks.values_list('assigned_to_id', 'estimated_duration', 'total_time_spent'):
+        remaining[worker_id] += max((estimated - spent).total_seconds(), 0)
+    shifts = {worker.pk: Shift(worker.shift_start, worker.shift_end) for worker in workers}
+    free_at = {worker.pk: shifts[worker.pk].advance(now, remaining[worker.pk]) for worker in workers}
+    return workers, shifts, free_at
+
+
+def plan(template, order_ids=None, limit=10, now=None):
+    """Proposed tasks for up to ``limit`` queued orders without tasks, from ``template``.
+
+    Returns ``(orders, workers, planned)``; each planned task is a dict with
+    ``order``, ``step``, ``worker``, ``estimated_duration``, ``start`` and
+    ``finish``, in the order they were planned.
+    """
+    now = now or timezone.now()
+    steps = list(template.steps.select_related('task_type').order_by('sequence_order'))
+    orders = _queued_orders(order_ids, limit)
+    workers, shifts, free_at = _workers(now)
+    if not steps or not orders or not workers:
+        return orders, workers, []
+
+    products = _order_products(orders)
+    estimator = DurationEstimator({step.task_type_id for step in steps})
+    workers_by_id = {worker.pk: worker for worker in workers}
+
+    free = [(moment, worker_id) for worker_id, moment in free_at.items()]
+    heapq.heapify(free)
+    # (urgency, step index, ready at) of steps whose predecessor is planned
+    ready = []
+    # (ready at, urgency, step index) of steps waiting for their predecessor to finish
+    waiting = [(now, rank, 0) for rank in range(len(orders))]
+    heapq.heapify(waiting)
+
+    planned = []
+    while ready or waiting:
+        moment, worker_id = heapq.heappop(free)
+        while waiting and waiting[0][0] <= moment:
+            ready_at, rank, index = heapq.heappop(waiting)
+            heapq.heappush(ready, (rank, index, ready_at))
+        if not ready:
+            # Nothing to start yet: this worker picks up again once the next step is ready
+            heapq.heappush(free, (shifts[worker_id].advance(waiting[0][0], 0), worker_id))
+            continue
+
+        rank, index, ready_at = heapq.heappop(ready)
+        order, step = orders[rank], steps[index]
+        duration = estimator.estimate(
+            step.task_type, products.get(order.pk), worker_id, step.estimated_duration.total_seconds(),
+        )
+        start = shifts[worker_id].advance(moment, 0)
+        finish = shifts[worker_id].advance(start, duration.total_seconds())
+        planned.append({
+            'order': order, 'step': step, 'worker': workers_by_id[worker_id],
+            'estimated_duration': duration, 'start': start, 'finish': finish,
+        })
+        heapq.heappush(free, (shifts[worker_id].advance(finish, 0), worker_id))
+
+        if index + 1 < len(steps):
+            next_ready = finish if steps[index + 1].requires_previous_completion else ready_at
+            heapq.heappush(waiting, (next_ready, rank, index + 1))
+    return orders, workers, planned
+
+
+def apply_plan(planned, assigned_by):
+    """Create the ``planned`` tasks; returns the new tasks, or ``None`` if an order got tasks meanwhile."""
+    from orders.models import Order
+
+    order_ids = {entry['order'].pk for entry in planned}
+    with transaction.atomic():
+        list(Order.objects.select_for_update().filter(pk__in=order_ids).values_list('pk', flat=True))
+        if OrderTaskProgress.objects.filter(order_id__in=order_ids, total__gt=0).exists():
+            return None
+        rows = [
+            {
+                'order': entry['order'].pk,
+                'assigned_to': entry['worker'].pk,
+                'task_type': entry['step'].task_type_id,
+                'estimated_duration': entry['estimated_duration'],
+                'due_date': entry['finish'],
+                'priority': 'high' if entry['order'].is_priority_order else 'normal',
+                **({'description': entry['step'].description} if entry['step'].description else {}),
+            }
+            for entry in planned
+        ]
+        return create_tasks(rows, assigned_by, workers_only=True)
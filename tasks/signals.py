@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Task
+from .progress import record_task_change
+
+
+@receiver(post_delete, sender=Task, dispatch_uid='tasks_order_progress_delete')
+def count_deleted_task(sender, instance, **kwargs):
+    record_task_change((instance.order_id, instance.status), None)
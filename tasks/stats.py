@@ -0,0 +1,86 @@
+"""Task totals and per-worker rollups for the task and warehouse dashboards.
+
+Every figure is a conditional ``COUNT``/``AVG`` over the same rows, so the
+overall totals are one aggregate query and the per-worker rollup is one
+``GROUP BY assigned_to`` query, whatever the headcount. Active tasks for the
+rollup are then fetched together in one more query.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from .models import Task
+
+OPEN_STATUSES = ['assigned', 'started', 'paused']
+DONE_STATUSES = ['completed', 'approved']
+
+# Relations read by TaskListSerializer
+TASK_LIST_RELATED = ['assigned_to', 'assigned_by', 'task_type', 'order', 'order_item__product']
+
+
+def _expressions():
+    now = timezone.now()
+    today_start = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    return {
+        'total': Count('id'),
+        'assigned': Count('id', filter=Q(status='assigned')),
+        'in_progress': Count('id', filter=Q(status='started')),
+        'paused': Count('id', filter=Q(status='paused')),
+        'completed': Count('id', filter=Q(status__in=DONE_STATUSES)),
+        'approved': Count('id', filter=Q(status='approved')),
+        'completed_today': Count('id', filter=Q(
+            status__in=DONE_STATUSES, completed_at__gte=today_start, completed_at__lt=today_start + timedelta(days=1),
+        )),
+        'overdue': Count('id', filter=Q(due_date__lt=now, status__in=OPEN_STATUSES)),
+        'active': Count('id', filter=Q(status__in=['assigned', 'started'])),
+        'avg_time': Avg('total_time_spent', filter=Q(status__in=DONE_STATUSES)),
+    }
+
+
+EMPTY = {
+    'total': 0, 'assigned': 0, 'in_progress': 0, 'paused': 0, 'completed': 0, 'approved': 0,
+    'completed_today': 0, 'overdue': 0, 'active': 0, 'avg_time': None,
+}
+
+
+def task_totals(queryset=None):
+    """Counts for ``queryset`` (default: every task) in one aggregate query."""
+    queryset = Task.objects.all() if queryset is None else queryset
+    return queryset.order_by().aggregate(**_expressions())
+
+
+def worker_stats(workers, queryset=None, with_active_tasks=False):
+    """``{worker_id: rollup}`` for ``workers`` (users or ids) over ``queryset`` (default: every task).
+
+    Each rollup holds the :data:`EMPTY` keys; with ``with_active_tasks`` it
+    also has ``active_task``, the worker's started task loaded for
+    ``TaskListSerializer`` (all of them in one query).
+    """
+    worker_ids = [getattr(worker, 'pk', worker) for worker in workers]
+    queryset = Task.objects.all() if queryset is None else queryset
+    stats = {worker_id: dict(EMPTY) for worker_id in worker_ids}
+    rows = (
+        queryset.filter(assigned_to_id__in=worker_ids)
+        .values('assigned_to_id')
+        .annotate(**_expressions())
+        .order_by()
+    )
+    for row in rows:
+        stats[row.pop('assigned_to_id')].update(row)
+
+    if with_active_tasks:
+        for rollup in stats.values():
+            rollup['active_task'] = None
+        started = queryset.filter(assigned_to_id__in=worker_ids, status='started').select_related(*TASK_LIST_RELATED)
+        # First in the model's default ordering, as ``.first()`` per worker would pick
+        for task in started:
+            if stats[task.assigned_to_id]['active_task'] is None:
+                stats[task.assigned_to_id]['active_task'] = task
+    return stats
+
+
+def format_hours_minutes(duration):
+    """'3h 25m' for a timedelta (``None`` counts as zero)."""
+    total_seconds = int(duration.total_seconds()) if duration else 0
+    return f"{total_seconds // 3600}h {(total_seconds % 3600) // 60}m"
@@ -0,0 +1,90 @@
+import threading
+
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+
+from users.models import User
+from .models import OrderTaskProgress, Task, TaskNote, TaskNotification, TaskTimeSession, TaskType
+from .transitions import apply_transition, reassign_tasks
+
+
+class TransitionConcurrencyTests(TransactionTestCase):
+    """Concurrent requests for the same transition (a double tap on a tablet) are applied once"""
+
+    threads = 8
+
+    def setUp(self):
+        self.worker = User.objects.create_user('worker', password='x', role='warehouse_worker')
+        self.manager = User.objects.create_user('manager', password='x', role='warehouse_manager')
+        self.task = Task.objects.create(
+            title='Transition concurrency check', task_type=TaskType.objects.create(name='General'),
+            assigned_to=self.worker, assigned_by=self.manager,
+        )
+
+    def race(self, action, actor):
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def attempt():
+            task = Task.objects.get(pk=self.task.pk)
+            barrier.wait()
+            try:
+                results.append(apply_transition(task, action, actor=actor))
+            except OperationalError:
+                # e.g. SQLite's busy timeout; the request fails rather than double-applying
+                results.append(None)
+            finally:
+                connection.close()
+
+        attempts = [threading.Thread(target=attempt) for _ in range(self.threads)]
+        for attempt_thread in attempts:
+            attempt_thread.start()
+        for attempt_thread in attempts:
+            attempt_thread.join()
+        return results.count(True)
+
+    def test_each_transition_applies_once(self):
+        # action, open sessions expected afterwards
+        steps = [('start', 1), ('pause', 0), ('resume', 1), ('complete', 0), ('approve', 0)]
+        for action, open_sessions in steps:
+            with self.subTest(action=action):
+                self.assertEqual(self.race(action, self.manager), 1)
+                self.assertEqual(TaskTimeSession.objects.filter(task=self.task, ended_at__isnull=True).count(),
+                                 open_sessions)
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'approved')
+        self.assertEqual(TaskNote.objects.filter(task=self.task, note_type='pause').count(), 1)
+        self.assertEqual(TaskNotification.objects.filter(task=self.task, notification_type='task_completed').count(), 1)
+        self.assertEqual(TaskNotification.objects.filter(task=self.task, notification_type='task_approved').count(), 1)
+
+
+class ReassignTests(TransactionTestCase):
+
+    def setUp(self):
+        from orders.models import Customer, Order
+
+        manager = User.objects.create_user('manager', password='x', role='warehouse_manager')
+        self.worker = User.objects.create_user('worker', password='x', role='warehouse_worker')
+        self.other = User.objects.create_user('other', password='x', role='warehouse_worker')
+        customer = Customer.objects.create(name='Customer', phone='0000000000')
+        self.order = Order.objects.create(customer=customer, total_amount=100, balance_amount=100)
+        self.task = Task.objects.create(
+            title='Reassigned', task_type=TaskType.objects.create(name='General'), order=self.order,
+            assigned_to=self.worker, assigned_by=manager,
+        )
+
+    def test_running_task_is_reassigned(self):
+        self.assertTrue(apply_transition(self.task, 'start'))
+        self.assertEqual(reassign_tasks([self.task.pk], self.other), 1)
+
+        progress = OrderTaskProgress.objects.get(order=self.order)
+        self.assertEqual((progress.total, progress.assigned, progress.started), (1, 1, 0))
+        self.assertFalse(TaskTimeSession.objects.filter(task=self.task, ended_at__isnull=True).exists())
+
+        task = Task.objects.get(pk=self.task.pk)
+        self.assertEqual((task.assigned_to, task.status), (self.other, 'assigned'))
+        self.assertTrue(apply_transition(task, 'start'))
+        task.delete()
+        progress.refresh_from_db()
+        self.assertEqual((progress.total, progress.assigned, progress.started), (0, 0, 0))
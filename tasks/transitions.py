@@ -0,0 +1,165 @@
+"""Task state transitions (start, pause, resume, complete, approve, reject, and reassignment).
+
+Each transition runs in one transaction. The task row is locked first
+(``SELECT ... FOR UPDATE``; on SQLite, the database write lock) and its status, timer and time
+totals are written in a single ``UPDATE ... WHERE status=<status read>``, so
+a repeated or concurrent request for the same transition (a double tap on a
+tablet) matches no row and returns ``False`` instead of opening a second time
+session or sending a second notification. The time-session write, notes and
+notifications, the worker's daily time (``tasks.ledger``) and the order's
+task counters (``tasks.progress``) then follow inside the same transaction.
+
+:func:`reassign_tasks` hands tasks to another worker the same way: it locks
+them, reads their statuses and moves them back to ``assigned`` with their
+counters adjusted from what it read. A running task's session is closed as
+a pause would close it, so the time counts for the worker who did it and
+the new worker starts a session of their own.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from .ledger import record_session
+from .models import Task, TaskNote, TaskNotification, TaskTimeSession
+from .progress import record_status_changes, record_task_change, update_order_production
+
+# action: (statuses it is allowed from, status it moves to)
+TRANSITIONS = {
+    'start': (('assigned',), 'started'),
+    'pause': (('started',), 'paused'),
+    'resume': (('paused',), 'started'),
+    'complete': (('started', 'paused'), 'completed'),
+    'approve': (('completed',), 'approved'),
+    'reject': (('completed',), 'rejected'),
+}
+
+
+def _display_name(user):
+    return user.get_full_name() or user.username
+
+
+def _lock(rows):
+    """``rows``, locked until the end of the transaction"""
+    if connection.features.has_select_for_update:
+        return rows.select_for_update()
+    # No row locks (SQLite): a no-op write takes the database write lock up front, so concurrent
+    # transitions wait for it instead of failing when they upgrade from a read lock
+    rows.update(updated_at=F('updated_at'))
+    return rows
+
+
+def _locked(task_id):
+    return _lock(Task.objects.filter(pk=task_id)).first()
+
+
+def _changes(action, current, now, actor, reason, open_session):
+    """Fields written to the task row, and the notes and notifications that go with them."""
+    fields = {'status': TRANSITIONS[action][1], 'updated_at': now}
+    notes, notifications = [], []
+
+    if open_session:
+        # Whatever the action, a running session ends now and its time is added to the task
+        total = current.total_time_spent + (now - open_session.started_at)
+        fields['total_time_spent'] = total
+        fields['time_elapsed_seconds'] = int(total.total_seconds())
+    if action in ('start', 'resume'):
+        fields['is_timer_running'] = True
+        if action == 'start' and not current.actual_start_time:
+            fields['actual_start_time'] = now
+    elif action in ('pause', 'complete'):
+        fields['is_timer_running'] = False
+
+    if action == 'pause':
+        notes.append(TaskNote(task=current, user_id=current.assigned_to_id, note_type='pause',
+                              content=f"Task paused. Reason: {reason}" if reason else "Task paused."))
+    elif action == 'complete':
+        fields['completed_at'] = fields['actual_end_time'] = now
+        notifications.append(TaskNotification(
+            task=current, recipient_id=current.assigned_by_id, notification_type='task_completed',
+            message=f"Task '{current.title}' has been completed by {_display_name(current.assigned_to)}",
+        ))
+    elif action == 'approve':
+        fields['approved_by'] = actor
+        fields['approved_at'] = now
+        notifications.append(TaskNotification(
+            task=current, recipient_id=current.assigned_to_id, notification_type='task_approved',
+            message=f"Your task '{current.title}' has been approved by {_display_name(actor)}",
+        ))
+    elif action == 'reject':
+        notes.append(TaskNote(task=current, user=actor, note_type='rejection',
+                              content=f"Task rejected. Reason: {reason}" if reason else "Task rejected."))
+        notifications.append(TaskNotification(
+            task=current, recipient_id=current.assigned_to_id, notification_type='task_rejected',
+            message=f"Your task '{current.title}' was rejected by {_display_name(actor)}. "
+                    f"{('Reason: ' + reason) if reason else ''}",
+        ))
+    return fields, notes, notifications
+
+
+def apply_transition(task, action, actor=None, reason=''):
+    """Apply ``action`` to ``task``; ``False`` if the task is not (or no longer) in a state that allows it.
+
+    On success the written fields are copied onto ``task``.
+    """
+    sources, _ = TRANSITIONS[action]
+    with transaction.atomic():
+        current = _locked(task.pk)
+        if current is None or current.status not in sources:
+            return False
+        now = timezone.now()
+        # Normally only pause and complete find one, but a start or resume closes a stray session too
+        open_session = TaskTimeSession.objects.filter(task_id=task.pk, ended_at__isnull=True).first()
+        fields, notes, notifications = _changes(action, current, now, actor, reason, open_session)
+
+        if not Task.objects.filter(pk=task.pk, status=current.status).update(**fields):
+            return False
+
+        if open_session:
+            TaskTimeSession.objects.filter(task_id=task.pk, ended_at__isnull=True).update(ended_at=now)
+            record_session(current.assigned_to_id, open_session.started_at, now)
+        if action in ('start', 'resume'):
+            TaskTimeSession.objects.create(task_id=task.pk, started_at=now)
+        TaskNote.objects.bulk_create(notes)
+        TaskNotification.objects.bulk_create(notifications)
+
+        if action == 'complete':
+            # Supervisors/admins are notified in the background so it appears in their QA queue
+            enqueue('tasks.notify_task_completed', {'task_id': task.pk},
+                    idempotency_key=f'tasks.notify_task_completed:{task.pk}')
+        elif action == 'approve':
+            # Its worked time now counts towards future duration estimates
+            enqueue('tasks.refresh_duration_estimates', idempotency_key='tasks.refresh_duration_estimates')
+
+        record_task_change((current.order_id, current.status), (current.order_id, fields['status']))
+        for name, value in fields.items():
+            setattr(task, name, value)
+        if current.order_id:
+            update_order_production(task.order, user_id=current.assigned_by_id)
+    return True
+
+
+def reassign_tasks(task_ids, worker):
+    """Hand the tasks ``task_ids`` to ``worker`` as newly assigned tasks; returns how many there were."""
+    with transaction.atomic():
+        rows = _lock(Task.objects.filter(pk__in=task_ids))
+        previous = {
+            pk: (order_id, status, worker_id, spent)
+            for pk, order_id, status, worker_id, spent
+            in rows.values_list('pk', 'order_id', 'status', 'assigned_to_id', 'total_time_spent')
+        }
+        if not previous:
+            return 0
+        now = timezone.now()
+        sessions = TaskTimeSession.objects.filter(task_id__in=previous, ended_at__isnull=True)
+        for task_id, started_at in sessions.values_list('task_id', 'started_at'):
+            _, _, worker_id, spent = previous[task_id]
+            total = spent + (now - started_at)
+            Task.objects.filter(pk=task_id).update(total_time_spent=total, time_elapsed_seconds=int(total.total_seconds()))
+            record_session(worker_id, started_at, now)
+        sessions.update(ended_at=now)
+        Task.objects.filter(pk__in=previous).update(
+            assigned_to=worker, status='assigned', is_timer_running=False, updated_at=now,
+        )
+        record_status_changes([(order_id, status, 'assigned') for order_id, status, _, _ in previous.values()])
+    return len(previous)
@@ -1,6 +1,7 @@
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db.models import Q, Count, Sum, Avg
+from django.utils.dateparse import parse_date
+from django.db.models import Q, Count, Sum, Case, When, Value, IntegerField, Prefetch
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -8,7 +9,17 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from datetime import timedelta, date
 
+from jobs.queue import enqueue
+from archive.mixins import ArchiveRangeMixin
+
 from users.models import User
+from .analytics import GROUP_BY, task_report
+from .estimates import estimate_duration
+from .factory import create_tasks
+from .ledger import worked_seconds
+from .scheduler import apply_plan, plan
+from .transitions import reassign_tasks
+from .stats import TASK_LIST_RELATED, format_hours_minutes, task_totals, worker_stats
 from .models import (
     TaskType, Task, TaskTimeSession, TaskNote, TaskNotification,
     TaskMaterial, TaskTemplate, TaskTemplateStep, WorkerProductivity,
@@ -58,7 +69,7 @@ class TaskViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['priority', 'assigned_to', 'assigned_by', 'task_type', 'order']
     search_fields = ['title', 'description', 'assigned_to__username', 'order__order_number']
-    ordering = ['-priority', 'due_date', 'created_at']
+    ordering = Task.QUEUE_ORDERING
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -112,7 +123,13 @@ class TaskViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Set assigned_by to current user when creating task"""
-        serializer.save(assigned_by=self.request.user)
+        data, extra = serializer.validated_data, {}
+        if 'estimated_duration' not in data:
+            order_item = data.get('order_item')
+            extra['estimated_duration'] = estimate_duration(
+                data['task_type'], order_item.product_id if order_item else None, data['assigned_to'].pk,
+            )
+        serializer.save(assigned_by=self.request.user, **extra)
     
     @action(detail=False, methods=['get'])
     def my_tasks(self, request):
@@ -228,38 +245,21 @@ class TaskViewSet(viewsets.ModelViewSet):
         serializer = TaskAssignmentSerializer(data=request.data, many=True)
         
         if serializer.is_valid():
+            rows = [{'description': '', **task_data} for task_data in serializer.validated_data]
             created_tasks = []
-            
-            for task_data in serializer.validated_data:
-                try:
-                    assigned_to = User.objects.get(id=task_data['assigned_to'])
-                    task_type = TaskType.objects.get(id=task_data['task_type'])
-                    
-                    task = Task.objects.create(
-                        assigned_to=assigned_to,
-                        assigned_by=request.user,
-                        task_type=task_type,
-                        title=task_data['title'],
-                        description=task_data.get('description', ''),
-                        priority=task_data.get('priority', 'normal'),
-                        due_date=task_data.get('due_date'),
-                        order_id=task_data.get('order'),
-                        order_item_id=task_data.get('order_item'),
-                        estimated_duration=timedelta(minutes=task_type.estimated_duration_minutes)
-                    )
-                    
+            for task_data, result in zip(rows, create_tasks(rows, request.user)):
+                if isinstance(result, Task):
                     created_tasks.append({
-                        'task_id': task.id,
-                        'title': task.title,
-                        'assigned_to': assigned_to.username,
+                        'task_id': result.id,
+                        'title': result.title,
+                        'assigned_to': result.assigned_to.username,
                         'status': 'created'
                     })
-                    
-                except (User.DoesNotExist, TaskType.DoesNotExist) as e:
+                else:
                     created_tasks.append({
                         'title': task_data.get('title', 'Unknown'),
                         'status': 'error',
-                        'message': str(e)
+                        'message': result
                     })
             
             return Response({'results': created_tasks})
@@ -283,11 +283,7 @@ class TaskViewSet(viewsets.ModelViewSet):
             if not worker.is_warehouse_worker:
                 return Response({'error': 'Can only assign tasks to warehouse workers'}, status=status.HTTP_400_BAD_REQUEST)
             
-            tasks = Task.objects.filter(id__in=task_ids)
-            updated_count = tasks.update(
-                assigned_to=worker,
-                status='assigned'
-            )
+            updated_count = reassign_tasks(task_ids, worker)
             
             # Send notification to worker
             create_notification(
@@ -305,6 +301,96 @@ class TaskViewSet(viewsets.ModelViewSet):
         except User.DoesNotExist:
             return Response({'error': 'Worker not found'}, status=status.HTTP_404_NOT_FOUND)
     
+    def _plan_schedule(self, request, params):
+        """Scheduler plan for the request's template_id, order_ids and limit, or an error response"""
+        if not request.user.can_manage_tasks:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        if not params.get('template_id'):
+            return Response({'error': 'template_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        order_ids = params.get('order_ids')
+        try:
+            template = TaskTemplate.objects.filter(is_active=True).get(pk=params['template_id'])
+            if isinstance(order_ids, str):
+                order_ids = [int(order_id) for order_id in order_ids.split(',') if order_id.strip()]
+            elif order_ids is not None:
+                order_ids = [int(order_id) for order_id in order_ids]
+            limit = int(params.get('limit', 10))
+        except TaskTemplate.DoesNotExist:
+            return Response({'error': 'Task template not found'}, status=status.HTTP_404_NOT_FOUND)
+        except (TypeError, ValueError):
+            return Response({'error': 'template_id, order_ids and limit must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
+        return plan(template, order_ids, min(limit, 50))
+    
+    def _schedule_data(self, orders, workers, planned):
+        tasks_by_order, tasks_by_worker = {}, {}
+        for entry in planned:
+            tasks_by_order.setdefault(entry['order'].pk, []).append(entry)
+            tasks_by_worker.setdefault(entry['worker'].pk, []).append(entry)
+        return {
+            'orders': [
+                {
+                    'order_id': order.id,
+                    'order_number': order.order_number,
+                    'queue_position': order.queue_position,
+                    'is_priority_order': order.is_priority_order,
+                    'planned_completion': max((entry['finish'] for entry in tasks_by_order.get(order.pk, [])), default=None),
+                    'tasks': [
+                        {
+                            'sequence': entry['step'].sequence_order,
+                            'task_type': entry['step'].task_type_id,
+                            'task_type_name': entry['step'].task_type.name,
+                            'assigned_to': entry['worker'].id,
+                            'assigned_to_name': entry['worker'].get_full_name() or entry['worker'].username,
+                            'estimated_duration': str(entry['estimated_duration']),
+                            'planned_start': entry['start'],
+                            'planned_finish': entry['finish'],
+                        }
+                        for entry in sorted(tasks_by_order.get(order.pk, []), key=lambda entry: entry['step'].sequence_order)
+                    ],
+                }
+                for order in orders
+            ],
+            'workers': [
+                {
+                    'id': worker.id,
+                    'name': worker.get_full_name() or worker.username,
+                    'planned_tasks': len(tasks_by_worker.get(worker.pk, [])),
+                    'planned_hours': round(sum(
+                        entry['estimated_duration'].total_seconds() for entry in tasks_by_worker.get(worker.pk, [])
+                    ) / 3600, 2),
+                }
+                for worker in workers
+            ],
+        }
+    
+    @action(detail=False, methods=['get'])
+    def schedule(self, request):
+        """Proposed assignment of a template's tasks for queued orders without tasks (dry run)"""
+        result = self._plan_schedule(request, request.query_params)
+        if isinstance(result, Response):
+            return result
+        return Response(self._schedule_data(*result))
+    
+    @action(detail=False, methods=['post'], url_path='schedule/apply')
+    def apply_schedule(self, request):
+        """Plan as ``schedule`` does and create the planned tasks"""
+        result = self._plan_schedule(request, request.data)
+        if isinstance(result, Response):
+            return result
+        if not result[2]:
+            return Response({'error': 'No queued orders without tasks to schedule'}, status=status.HTTP_400_BAD_REQUEST)
+        created = apply_plan(result[2], request.user)
+        if created is None:
+            return Response({'error': 'Some of these orders were given tasks in the meantime; plan again'},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({
+            'message': f'{len(created)} tasks created',
+            'task_ids': [task.id for task in created if isinstance(task, Task)],
+            **self._schedule_data(*result),
+        }, status=status.HTTP_201_CREATED)
+    
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get dashboard data for tasks"""
@@ -317,62 +403,38 @@ class TaskViewSet(viewsets.ModelViewSet):
             base_queryset = Task.objects.all()
         
         # Calculate statistics
-        total_tasks = base_queryset.count()
-        tasks_assigned = base_queryset.filter(status='assigned').count()
-        tasks_in_progress = base_queryset.filter(status='started').count()
-        tasks_completed = base_queryset.filter(status__in=['completed', 'approved']).count()
-        tasks_overdue = base_queryset.filter(
-            due_date__lt=timezone.now(),
-            status__in=['assigned', 'started', 'paused']
-        ).count()
+        totals = task_totals(base_queryset)
         
         # Recent tasks
-        recent_tasks = base_queryset.order_by('-created_at')[:10]
+        recent_tasks = base_queryset.select_related(*TASK_LIST_RELATED).order_by('-created_at')[:10]
         
         # Worker summaries (only for supervisors)
         worker_summaries = []
         if user.role in ['owner', 'admin', 'warehouse']:
-            warehouse_users = User.objects.filter(role='warehouse')
+            warehouse_users = list(User.objects.filter(role='warehouse'))
+            stats = worker_stats(warehouse_users)
             for worker in warehouse_users:
-                worker_tasks = Task.objects.filter(assigned_to=worker)
-                total_assigned = worker_tasks.count()
-                total_completed = worker_tasks.filter(status__in=['completed', 'approved']).count()
-                total_approved = worker_tasks.filter(status='approved').count()
-                total_in_progress = worker_tasks.filter(status='started').count()
-                total_overdue = worker_tasks.filter(
-                    due_date__lt=timezone.now(),
-                    status__in=['assigned', 'started', 'paused']
-                ).count()
-                
+                rollup = stats[worker.id]
+                total_assigned = rollup['total']
+                total_completed = rollup['completed']
                 completion_rate = (total_completed / total_assigned * 100) if total_assigned > 0 else 0
-                
-                # Calculate average task time
-                completed_tasks = worker_tasks.filter(status__in=['completed', 'approved'])
-                avg_time = completed_tasks.aggregate(avg_time=Avg('total_time_spent'))['avg_time']
-                avg_time_str = "0h 0m"
-                if avg_time:
-                    total_seconds = int(avg_time.total_seconds())
-                    hours = total_seconds // 3600
-                    minutes = (total_seconds % 3600) // 60
-                    avg_time_str = f"{hours}h {minutes}m"
-                
                 worker_summaries.append({
                     'worker': worker.get_full_name() or worker.username,
                     'total_assigned': total_assigned,
                     'total_completed': total_completed,
-                    'total_approved': total_approved,
-                    'total_in_progress': total_in_progress,
-                    'total_overdue': total_overdue,
+                    'total_approved': rollup['approved'],
+                    'total_in_progress': rollup['in_progress'],
+                    'total_overdue': rollup['overdue'],
                     'completion_rate': round(completion_rate, 2),
-                    'average_task_time': avg_time_str
+                    'average_task_time': format_hours_minutes(rollup['avg_time'])
                 })
         
         dashboard_data = {
-            'total_tasks': total_tasks,
-            'tasks_assigned': tasks_assigned,
-            'tasks_in_progress': tasks_in_progress,
-            'tasks_completed': tasks_completed,
-            'tasks_overdue': tasks_overdue,
+            'total_tasks': totals['total'],
+            'tasks_assigned': totals['assigned'],
+            'tasks_in_progress': totals['in_progress'],
+            'tasks_completed': totals['completed'],
+            'tasks_overdue': totals['overdue'],
             'recent_tasks': TaskListSerializer(recent_tasks, many=True).data,
             'worker_summaries': worker_summaries
         }
@@ -398,7 +460,7 @@ class TaskTimeSessionViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class TaskNoteViewSet(viewsets.ModelViewSet):
+class TaskNoteViewSet(ArchiveRangeMixin, viewsets.ModelViewSet):
     queryset = TaskNote.objects.all()
     serializer_class = TaskNoteSerializer
     permission_classes = [IsAuthenticated]
@@ -417,7 +479,7 @@ class TaskNoteViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class TaskNotificationViewSet(viewsets.ModelViewSet):
+class TaskNotificationViewSet(ArchiveRangeMixin, viewsets.ModelViewSet):
     queryset = TaskNotification.objects.all()
     serializer_class = TaskNotificationSerializer
     permission_classes = [IsAuthenticated]
@@ -496,32 +558,34 @@ class TaskTemplateViewSet(viewsets.ModelViewSet):
             from orders.models import Order
             order = Order.objects.get(id=order_id)
             assigned_to = User.objects.get(id=assigned_to_id)
-            
-            created_tasks = []
-            for step in template.steps.all():
-                task = Task.objects.create(
-                    title=f"{step.task_type.name} - {order.order_number}",
-                    description=step.description or f"{step.task_type.name} for order {order.order_number}",
-                    task_type=step.task_type,
-                    assigned_to=assigned_to,
-                    assigned_by=request.user,
-                    order=order,
-                    estimated_duration=step.estimated_duration,
-                    priority='normal'
-                )
-                created_tasks.append({
-                    'task_id': task.id,
-                    'title': task.title,
-                    'sequence': step.sequence_order
-                })
-            
-            return Response({
-                'message': f'{len(created_tasks)} tasks created from template',
-                'tasks': created_tasks
-            })
-            
         except (Order.DoesNotExist, User.DoesNotExist) as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        steps = list(template.steps.all())
+        rows = [
+            {
+                'assigned_to': assigned_to.id,
+                'task_type': step.task_type_id,
+                # The step's duration is only the prior; past tasks refine it
+                'default_duration': step.estimated_duration,
+                'priority': 'normal',
+                **({'description': step.description} if step.description else {}),
+            }
+            for step in steps
+        ]
+        created_tasks = [
+            {
+                'task_id': task.id,
+                'title': task.title,
+                'sequence': step.sequence_order
+            }
+            for step, task in zip(steps, create_tasks(rows, request.user, order=order))
+        ]
+        
+        return Response({
+            'message': f'{len(created_tasks)} tasks created from template',
+            'tasks': created_tasks
+        })
 
 
 class WorkerProductivityViewSet(viewsets.ReadOnlyModelViewSet):
@@ -543,26 +607,27 @@ class WorkerProductivityViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['post'])
     def calculate_daily_productivity(self, request):
-        """Calculate productivity for all workers for a specific date"""
+        """Queue productivity calculation for all workers for a specific date"""
         target_date = request.data.get('date')
         if not target_date:
             target_date = timezone.now().date()
         else:
-            target_date = timezone.datetime.strptime(target_date, '%Y-%m-%d').date()
-        
-        warehouse_users = User.objects.filter(role='warehouse')
-        calculated_count = 0
-        
-        for worker in warehouse_users:
-            productivity = WorkerProductivity.calculate_daily_productivity(worker, target_date)
-            if productivity:
-                calculated_count += 1
-        
+            try:
+                target_date = timezone.datetime.strptime(target_date, '%Y-%m-%d').date()
+            except ValueError:
+                return Response({'error': 'date must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queued = enqueue(
+            'tasks.calculate_daily_productivity',
+            {'date_str': target_date.isoformat()},
+            idempotency_key=f'tasks.calculate_daily_productivity:{target_date.isoformat()}'
+        )
         return Response({
-            'message': f'Calculated productivity for {calculated_count} workers',
+            'message': 'Productivity calculation queued',
             'date': target_date,
-            'total_workers': warehouse_users.count()
-        })
+            'job_id': queued.id,
+            'job_status': queued.status
+        }, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['get'])
     def summary_report(self, request):
@@ -577,43 +642,32 @@ class WorkerProductivityViewSet(viewsets.ReadOnlyModelViewSet):
             start_date = timezone.datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = timezone.datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        productivity_records = self.get_queryset().filter(
+        # Aggregate by worker in one grouped query
+        totals = self.get_queryset().filter(
             date__range=[start_date, end_date]
-        )
+        ).values('worker').annotate(
+            total_tasks_assigned=Sum('tasks_assigned'),
+            total_tasks_completed=Sum('tasks_completed'),
+            total_tasks_approved=Sum('tasks_approved'),
+            total_time_worked=Sum('total_time_worked'),
+            completion_rate_sum=Sum('completion_rate'),
+            days_worked=Count('id'),
+        ).order_by('worker')
+        workers = User.objects.in_bulk([row['worker'] for row in totals])
         
-        # Aggregate by worker
         worker_summaries = {}
-        for record in productivity_records:
-            worker_id = record.worker.id
-            if worker_id not in worker_summaries:
-                worker_summaries[worker_id] = {
-                    'worker': record.worker.get_full_name() or record.worker.username,
-                    'total_tasks_assigned': 0,
-                    'total_tasks_completed': 0,
-                    'total_tasks_approved': 0,
-                    'total_time_worked': timedelta(0),
-                    'average_completion_rate': 0,
-                    'days_worked': 0
-                }
-            
-            summary = worker_summaries[worker_id]
-            summary['total_tasks_assigned'] += record.tasks_assigned
-            summary['total_tasks_completed'] += record.tasks_completed
-            summary['total_tasks_approved'] += record.tasks_approved
-            summary['total_time_worked'] += record.total_time_worked
-            summary['average_completion_rate'] += record.completion_rate
-            summary['days_worked'] += 1
-        
-        # Calculate averages
-        for summary in worker_summaries.values():
-            if summary['days_worked'] > 0:
-                summary['average_completion_rate'] = summary['average_completion_rate'] / summary['days_worked']
-            
-            # Format time worked
-            total_seconds = int(summary['total_time_worked'].total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            summary['total_time_worked_formatted'] = f"{hours}h {minutes}m"
+        for row in totals:
+            worker = workers[row['worker']]
+            worker_summaries[row['worker']] = {
+                'worker': worker.get_full_name() or worker.username,
+                'total_tasks_assigned': row['total_tasks_assigned'],
+                'total_tasks_completed': row['total_tasks_completed'],
+                'total_tasks_approved': row['total_tasks_approved'],
+                'total_time_worked': row['total_time_worked'],
+                'average_completion_rate': row['completion_rate_sum'] / row['days_worked'],
+                'days_worked': row['days_worked'],
+                'total_time_worked_formatted': format_hours_minutes(row['total_time_worked']),
+            }
         
         return Response({
             'date_range': {
@@ -624,6 +678,30 @@ class WorkerProductivityViewSet(viewsets.ReadOnlyModelViewSet):
             'manage_workers_endpoint': '/api/users/users/?role=warehouse_worker,warehouse',
             'can_manage_workers': True
         })
+    
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """Task duration report: ?group_by=worker|task_type|week|month&start_date=&end_date= (default last 30 days)"""
+        group_by = request.query_params.get('group_by', 'worker')
+        if group_by not in GROUP_BY:
+            return Response({'error': f"group_by must be one of: {', '.join(GROUP_BY)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end_date = parse_date(request.query_params.get('end_date') or '') or timezone.localdate()
+            start_date = parse_date(request.query_params.get('start_date') or '') or end_date - timedelta(days=29)
+        except ValueError:
+            return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Only task managers see everyone's figures; anyone else sees their own
+        worker = None if request.user.can_manage_tasks else request.user
+        return Response({
+            'date_range': {
+                'start_date': start_date,
+                'end_date': end_date
+            },
+            'group_by': group_by,
+            'groups': task_report(group_by, start_date, end_date, worker=worker),
+        })
 
 
 # Add comprehensive warehouse worker dashboard endpoints
@@ -631,6 +709,9 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
     """Comprehensive warehouse dashboard endpoints for frontend"""
     permission_classes = [IsAuthenticated]
     
+    # Indexed by the rank produced by _urgency_rank_annotation()
+    URGENCY_LEVELS = ('critical', 'high', 'medium', 'low')
+    
     @action(detail=False, methods=['get'])
     def worker_dashboard(self, request):
         """Complete dashboard for warehouse workers"""
@@ -661,7 +742,7 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
         active_task = my_tasks.filter(status='started').first()
         
         # Next task to work on (highest priority assigned task)
-        next_task = my_tasks.filter(status='assigned').order_by('-priority', 'due_date', 'created_at').first()
+        next_task = my_tasks.filter(status='assigned').order_by(*Task.QUEUE_ORDERING).first()
         
         # Recent notifications
         recent_notifications = TaskNotification.objects.filter(
@@ -670,7 +751,7 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
         ).order_by('-created_at')[:5]
         
         # Today's productivity
-        today = timezone.now().date()
+        today = timezone.localdate()
         today_productivity = WorkerProductivity.objects.filter(
             worker=user,
             date=today
@@ -678,7 +759,7 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
         
         # Time tracking for active task
         active_session = None
-        time_elapsed_today = timedelta(0)
+        time_elapsed_today = timedelta(seconds=worked_seconds(user, today))
         current_elapsed_seconds = 0
         task_total_elapsed_seconds = 0
         current_started_at = None
@@ -694,16 +775,6 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
             except Exception:
                 base_total = 0
             task_total_elapsed_seconds = base_total + (current_elapsed_seconds or 0)
-            # Calculate total time worked today
-            today_sessions = TaskTimeSession.objects.filter(
-                task__assigned_to=user,
-                started_at__date=today
-            )
-            for session in today_sessions:
-                if session.ended_at:
-                    time_elapsed_today += session.duration
-                elif session == active_session:
-                    time_elapsed_today += timezone.now() - session.started_at
         
         # Task history (last 10 completed tasks)
         completed_tasks = my_tasks.filter(
@@ -767,66 +838,56 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
         # All warehouse workers (include legacy and manager for overview)
-        warehouse_workers = User.objects.filter(
+        warehouse_workers = list(User.objects.filter(
             Q(role='warehouse_worker') | Q(role='warehouse')
-        )
+        ))
         
         # Task overview (restrict to warehouse roles only)
         all_tasks = Task.objects.filter(
             Q(assigned_to__role__in=['warehouse_worker', 'warehouse'])
         )
-        total_tasks = all_tasks.count()
-        assigned_tasks = all_tasks.filter(status='assigned').count()
-        in_progress_tasks = all_tasks.filter(status='started').count()
-        completed_tasks = all_tasks.filter(status__in=['completed', 'approved']).count()
-        overdue_tasks = all_tasks.filter(
-            due_date__lt=timezone.now(),
-            status__in=['assigned', 'started', 'paused']
-        ).count()
+        stats = worker_stats(warehouse_workers, with_active_tasks=True)
+        # Every task counted in the overview belongs to one of these workers
+        overview = {key: sum(rollup[key] for rollup in stats.values())
+                    for key in ('total', 'assigned', 'in_progress', 'completed', 'overdue')}
         
         # Worker status
         worker_status = []
         for worker in warehouse_workers:
-            worker_tasks = all_tasks.filter(assigned_to=worker)
-            active_task = worker_tasks.filter(status='started').first()
-            
+            rollup = stats[worker.id]
+            active_task = rollup['active_task']
             worker_status.append({
                 'worker_id': worker.id,
                 'worker_name': worker.get_full_name() or worker.username,
-                'total_tasks': worker_tasks.count(),
+                'total_tasks': rollup['total'],
                 'active_task': TaskListSerializer(active_task).data if active_task else None,
-                'completed_today': worker_tasks.filter(
-                    status__in=['completed', 'approved'],
-                    completed_at__date=timezone.now().date()
-                ).count(),
-                'overdue_tasks': worker_tasks.filter(
-                    due_date__lt=timezone.now(),
-                    status__in=['assigned', 'started', 'paused']
-                ).count()
+                'completed_today': rollup['completed_today'],
+                'overdue_tasks': rollup['overdue']
             })
         
         # Recent task activities
         recent_activities = Task.objects.filter(
             updated_at__gte=timezone.now() - timedelta(hours=24)
-        ).select_related('assigned_to', 'task_type').order_by('-updated_at')[:20]
+        ).select_related(*TASK_LIST_RELATED).order_by('-updated_at')[:20]
         
         # Tasks needing approval
-        tasks_for_approval = all_tasks.filter(status='completed')
+        listed_tasks = all_tasks.select_related(*TASK_LIST_RELATED)
+        tasks_for_approval = listed_tasks.filter(status='completed')
         
         return Response({
             'overview': {
-                'total_tasks': total_tasks,
-                'assigned': assigned_tasks,
-                'in_progress': in_progress_tasks,
-                'completed': completed_tasks,
-                'overdue': overdue_tasks,
-                'total_workers': warehouse_workers.count()
+                'total_tasks': overview['total'],
+                'assigned': overview['assigned'],
+                'in_progress': overview['in_progress'],
+                'completed': overview['completed'],
+                'overdue': overview['overdue'],
+                'total_workers': len(warehouse_workers)
             },
             'worker_status': worker_status,
             'recent_activities': TaskListSerializer(recent_activities, many=True).data,
             'tasks_for_approval': TaskListSerializer(tasks_for_approval, many=True).data,
             'overdue_tasks': TaskListSerializer(
-                all_tasks.filter(
+                listed_tasks.filter(
                     due_date__lt=timezone.now(),
                     status__in=['assigned', 'started', 'paused']
                 )[:10], 
@@ -838,10 +899,11 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
     def task_assignment_data(self, request):
         """Data needed for task assignment interface"""
         # Available workers
-        warehouse_workers = User.objects.filter(
+        warehouse_workers = list(User.objects.filter(
             Q(role='warehouse_worker') | Q(role='warehouse'), 
             is_active=True
-        )
+        ))
+        stats = worker_stats(warehouse_workers)
         
         # Available task types
         task_types = TaskType.objects.filter(is_active=True)
@@ -850,10 +912,10 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
         from orders.models import Order
         recent_orders = Order.objects.filter(
             order_status__in=['deposit_paid', 'order_ready']
-        ).order_by('-created_at')[:20]
+        ).select_related('customer').order_by('-created_at')[:20]
         
         # Task templates
-        task_templates = TaskTemplate.objects.filter(is_active=True)
+        task_templates = TaskTemplate.objects.filter(is_active=True).prefetch_related('steps__task_type')
         
         return Response({
             'workers': [
@@ -861,10 +923,7 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
                     'id': worker.id,
                     'name': worker.get_full_name() or worker.username,
                     'username': worker.username,
-                    'active_tasks_count': Task.objects.filter(
-                        assigned_to=worker,
-                        status__in=['assigned', 'started']
-                    ).count()
+                    'active_tasks_count': stats[worker.id]['active']
                 }
                 for worker in warehouse_workers
             ],
@@ -906,7 +965,7 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
                 priority=priority,
                 due_date=due_date,
                 order_id=order_id,
-                estimated_duration=timedelta(minutes=task_type.estimated_duration_minutes)
+                estimated_duration=estimate_duration(task_type, worker_id=assigned_to.pk)
             )
             
             return Response({
@@ -986,7 +1045,7 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
         next_task = Task.objects.filter(
             assigned_to=user,
             status='assigned'
-        ).order_by('-priority', 'due_date', 'created_at').first()
+        ).order_by(*Task.QUEUE_ORDERING).first()
         
         if not next_task:
             return Response({
@@ -1091,11 +1150,18 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
         """Get orders organized by task status for warehouse management"""
         from orders.models import Order
         
-        # Get orders that are in warehouse processing
+        # Task counts come from each order's progress counters and urgency is
+        # computed in SQL; tasks come from one prefetch query, so the cost does
+        # not grow with the number of orders.
         warehouse_orders = Order.objects.filter(
             order_status__in=['deposit_paid', 'order_ready'],
             production_status__in=['not_started', 'cutting', 'sewing', 'finishing', 'quality_check']
-        ).select_related('customer').prefetch_related('tasks__assigned_to', 'tasks__task_type')
+        ).select_related('customer', 'task_progress').annotate(
+            items_count=Count('items', distinct=True),
+            urgency_rank=self._urgency_rank_annotation(),
+        ).prefetch_related(
+            Prefetch('tasks', queryset=Task.objects.select_related('assigned_to', 'task_type'))
+        ).order_by('urgency_rank', '-created_at')
         
         orders_by_status = {
             'no_tasks': [],
@@ -1104,74 +1170,52 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
             'mixed_status': []
         }
         
+        # Rows arrive sorted by urgency, so each category stays sorted as it is filled
         for order in warehouse_orders:
-            tasks = order.tasks.all()
+            order_data = {
+                'id': order.id,
+                'order_number': order.order_number,
+                'customer_name': order.customer.name if order.customer else order.customer_name,
+                'delivery_deadline': order.delivery_deadline,
+                'urgency': self.URGENCY_LEVELS[order.urgency_rank],
+                'items_count': order.items_count,
+                'total_amount': float(order.total_amount),
+                'tasks': []
+            }
             
-            if not tasks.exists():
+            progress = getattr(order, 'task_progress', None)
+            if not progress or not progress.total:
                 # Orders without tasks assigned
-                orders_by_status['no_tasks'].append({
-                    'id': order.id,
-                    'order_number': order.order_number,
-                    'customer_name': order.customer.name if order.customer else order.customer_name,
-                    'delivery_deadline': order.delivery_deadline,
-                    'urgency': self._calculate_urgency(order),
-                    'items_count': order.items.count(),
-                    'total_amount': float(order.total_amount),
-                    'tasks': []
+                orders_by_status['no_tasks'].append(order_data)
+                continue
+            
+            for task in order.tasks.all():
+                order_data['tasks'].append({
+                    'id': task.id,
+                    'title': task.title,
+                    'task_type': task.task_type.name,
+                    'assigned_to': task.assigned_to.get_full_name() or task.assigned_to.username,
+                    'assigned_to_id': task.assigned_to.id,
+                    'status': task.status,
+                    'priority': task.priority,
+                    'is_running': task.is_running,
+                    'time_elapsed_formatted': self._format_duration(task.time_elapsed),
+                    'estimated_duration': str(task.estimated_duration)
                 })
+            order_data['task_summary'] = {
+                'total': progress.total,
+                'completed': progress.done,
+                'in_progress': progress.started,
+                'pending': progress.assigned
+            }
+            
+            # Categorize based on task completion
+            if progress.done == progress.total:
+                orders_by_status['completed'].append(order_data)
+            elif progress.started:
+                orders_by_status['in_progress'].append(order_data)
             else:
-                # Orders with tasks
-                task_statuses = list(tasks.values_list('status', flat=True))
-                completed_statuses = ['completed', 'approved']
-                in_progress_statuses = ['started']
-                
-                tasks_data = []
-                for task in tasks:
-                    tasks_data.append({
-                        'id': task.id,
-                        'title': task.title,
-                        'task_type': task.task_type.name,
-                        'assigned_to': task.assigned_to.get_full_name() or task.assigned_to.username,
-                        'assigned_to_id': task.assigned_to.id,
-                        'status': task.status,
-                        'priority': task.priority,
-                        'is_running': task.is_running,
-                        'time_elapsed_formatted': self._format_duration(task.time_elapsed),
-                        'estimated_duration': str(task.estimated_duration)
-                    })
-                
-                order_data = {
-                    'id': order.id,
-                    'order_number': order.order_number,
-                    'customer_name': order.customer.name if order.customer else order.customer_name,
-                    'delivery_deadline': order.delivery_deadline,
-                    'urgency': self._calculate_urgency(order),
-                    'items_count': order.items.count(),
-                    'total_amount': float(order.total_amount),
-                    'tasks': tasks_data,
-                    'task_summary': {
-                        'total': len(tasks_data),
-                        'completed': len([t for t in tasks_data if t['status'] in completed_statuses]),
-                        'in_progress': len([t for t in tasks_data if t['status'] in in_progress_statuses]),
-                        'pending': len([t for t in tasks_data if t['status'] == 'assigned'])
-                    }
-                }
-                
-                # Categorize based on task completion
-                if all(status in completed_statuses for status in task_statuses):
-                    orders_by_status['completed'].append(order_data)
-                elif any(status in in_progress_statuses for status in task_statuses):
-                    orders_by_status['in_progress'].append(order_data)
-                else:
-                    orders_by_status['mixed_status'].append(order_data)
-        
-        # Sort each category by urgency
-        for category in orders_by_status.values():
-            category.sort(key=lambda x: (
-                0 if x['urgency'] == 'critical' else
-                1 if x['urgency'] == 'high' else
-                2 if x['urgency'] == 'medium' else 3
-            ))
+                orders_by_status['mixed_status'].append(order_data)
         
         return Response({
             'orders_by_status': orders_by_status,
@@ -1186,7 +1230,11 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def tasks_by_order(self, request):
-        """Get tasks organized by order for worker view"""
+        """Get tasks organized by order for worker view
+        
+        Optional ``?order_ids=1,2,3`` limits the response to the orders on screen.
+        """
+        from orders.models import Order, OrderItem, ColorReference, FabricReference
         user = request.user
         
         # Get tasks assigned to current user (if warehouse worker)
@@ -1195,85 +1243,110 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
         else:
             tasks = Task.objects.all()
         
-        tasks = tasks.select_related('order', 'task_type', 'assigned_to').order_by('order__delivery_deadline', 'created_at')
+        order_ids_param = request.query_params.get('order_ids')
+        if order_ids_param:
+            try:
+                order_ids = [int(value) for value in order_ids_param.split(',') if value.strip()]
+            except ValueError:
+                return Response({'error': 'order_ids must be a comma-separated list of order IDs'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            tasks = tasks.filter(order_id__in=order_ids)
+        
+        # One query per entity type; everything below is grouped in memory
+        tasks = list(tasks.select_related('task_type', 'assigned_to').order_by('order__delivery_deadline', 'created_at'))
+        
+        order_ids = {task.order_id for task in tasks if task.order_id}
+        orders = Order.objects.select_related('customer').annotate(
+            urgency_rank=self._urgency_rank_annotation()
+        ).in_bulk(order_ids)
+        
+        item_ids = {task.order_item_id for task in tasks if task.order_item_id}
+        items_by_id = {}
+        items_by_order = {}
+        for item in OrderItem.objects.filter(Q(order_id__in=order_ids) | Q(id__in=item_ids)).select_related('product').order_by('id'):
+            items_by_id[item.id] = item
+            if item.order_id in order_ids:
+                items_by_order.setdefault(item.order_id, []).append(item)
+        
+        color_codes = {item.assigned_color_code for item in items_by_id.values() if item.assigned_color_code}
+        fabric_letters = {item.assigned_fabric_letter for item in items_by_id.values() if item.assigned_fabric_letter}
+        colors = {ref.color_code: ref for ref in ColorReference.objects.filter(color_code__in=color_codes)}
+        fabrics = {ref.fabric_letter: ref.fabric_name for ref in FabricReference.objects.filter(fabric_letter__in=fabric_letters)}
+        
+        # Same fallbacks as OrderItem.color_name / OrderItem.fabric_name, without a query per item
+        def item_color_name(item):
+            if not item.assigned_color_code:
+                return "No color assigned"
+            ref = colors.get(item.assigned_color_code)
+            return ref.color_name if ref else f"Color {item.assigned_color_code}"
+        
+        def item_fabric_name(item):
+            if not item.assigned_fabric_letter:
+                return "No fabric assigned"
+            return fabrics.get(item.assigned_fabric_letter, f"Fabric {item.assigned_fabric_letter}")
+        
+        def item_hex_color(item):
+            ref = colors.get(item.assigned_color_code) if item.assigned_color_code else None
+            return ref.hex_color if ref and ref.hex_color else None
+        
+        # All-items context is identical for every task of an order, so build it once per order
+        order_items_details = {}
+        for order_id, order_items in items_by_order.items():
+            items_data = [{
+                'id': item.id,
+                'product_name': item.product.product_name if item.product else 'Unknown Product',
+                'quantity': item.quantity,
+                'unit_price': float(item.unit_price),
+                'fabric_letter': item.assigned_fabric_letter,
+                'color_code': item.assigned_color_code,
+                'fabric_name': item_fabric_name(item),
+                'color_name': item_color_name(item),
+                'hex_color': item_hex_color(item),
+                'total_price': float(item.total_price)
+            } for item in order_items]
+            order_items_details[order_id] = {
+                'order_items': items_data,
+                'total_items': len(items_data),
+                'note': 'Showing all order items (no specific item assigned to this task)'
+            }
         
         # Group tasks by order
         tasks_by_order = {}
         for task in tasks:
-            order_key = task.order.order_number if task.order else 'No Order'
+            order = orders.get(task.order_id)
+            order_key = order.order_number if order else 'No Order'
             
             if order_key not in tasks_by_order:
                 tasks_by_order[order_key] = {
                     'order_info': {
-                        'id': task.order.id if task.order else None,
-                        'order_number': task.order.order_number if task.order else 'No Order',
-                        'customer_name': (task.order.customer.name if task.order.customer else task.order.customer_name) if task.order else 'N/A',
-                        'delivery_deadline': task.order.delivery_deadline if task.order else None,
-                        'urgency': self._calculate_urgency(task.order) if task.order else 'low',
-                        'total_amount': float(task.order.total_amount) if task.order and task.order.total_amount is not None else 0.0,
+                        'id': order.id if order else None,
+                        'order_number': order.order_number if order else 'No Order',
+                        'customer_name': (order.customer.name if order.customer else order.customer_name) if order else 'N/A',
+                        'delivery_deadline': order.delivery_deadline if order else None,
+                        'urgency': self.URGENCY_LEVELS[order.urgency_rank] if order else 'low',
+                        'total_amount': float(order.total_amount) if order and order.total_amount is not None else 0.0,
                     },
                     'tasks': []
                 }
             
             # Inline order item details for worker UI (product specs per task)
             order_item_details = None
-            try:
-                if getattr(task, 'order_item', None):
-                    item = task.order_item
-                    order_item_details = {
-                        'id': item.id,
-                        'product_name': getattr(item.product, 'product_name', None) or getattr(item.product, 'name', None),
-                        'quantity': item.quantity,
-                        'unit_price': str(item.unit_price),
-                        'color_name': getattr(item, 'color_name', None),
-                        'fabric_name': getattr(item, 'fabric_name', None),
-                    }
-                    # Try attach hex color from ColorReference if available
-                    try:
-                        if getattr(item, 'assigned_color_code', None):
-                            from orders.models import ColorReference
-                            ref = ColorReference.objects.filter(color_code=item.assigned_color_code).first()
-                            if ref and ref.hex_color:
-                                order_item_details['hex_color'] = ref.hex_color
-                    except Exception:
-                        pass
-                else:
-                    # If no specific order_item assigned to task, get all order items for context
-                    if task.order and task.order.items.exists():
-                        items_data = []
-                        for item in task.order.items.all():
-                            # Get hex color from ColorReference if available
-                            hex_color = None
-                            if item.assigned_color_code:
-                                try:
-                                    from orders.models import ColorReference
-                                    color_ref = ColorReference.objects.filter(color_code=item.assigned_color_code).first()
-                                    if color_ref and color_ref.hex_color:
-                                        hex_color = color_ref.hex_color
-                                except Exception:
-                                    pass
-                            
-                            items_data.append({
-                                'id': item.id,
-                                'product_name': item.product.product_name if item.product else 'Unknown Product',
-                                'quantity': item.quantity,
-                                'unit_price': float(item.unit_price),
-                                'fabric_letter': item.assigned_fabric_letter,
-                                'color_code': item.assigned_color_code,
-                                'fabric_name': item.fabric_name,
-                                'color_name': item.color_name,
-                                'hex_color': hex_color,
-                                'total_price': float(item.total_price)
-                            })
-                        
-                        order_item_details = {
-                            'order_items': items_data,
-                            'total_items': len(items_data),
-                            'note': 'Showing all order items (no specific item assigned to this task)'
-                        }
-            except Exception:
-                # Keep endpoint resilient even if related data is missing
-                order_item_details = None
+            item = items_by_id.get(task.order_item_id)
+            if item:
+                order_item_details = {
+                    'id': item.id,
+                    'product_name': getattr(item.product, 'product_name', None) or getattr(item.product, 'name', None),
+                    'quantity': item.quantity,
+                    'unit_price': str(item.unit_price),
+                    'color_name': item_color_name(item),
+                    'fabric_name': item_fabric_name(item),
+                }
+                hex_color = item_hex_color(item)
+                if hex_color:
+                    order_item_details['hex_color'] = hex_color
+            elif order:
+                # If no specific order_item assigned to task, show all order items for context
+                order_item_details = order_items_details.get(order.id)
 
             tasks_by_order[order_key]['tasks'].append({
                 'id': task.id,
@@ -1312,22 +1385,20 @@ class WarehouseDashboardViewSet(viewsets.ViewSet):
             }
         })
     
-    def _calculate_urgency(self, order):
-        """Helper method to calculate order urgency"""
-        if not order or not order.delivery_deadline:
-            return 'low'
-        
+    def _urgency_rank_annotation(self):
+        """Urgency of an order as an index into URGENCY_LEVELS, from days left to its delivery deadline.
+
+        Critical within 2 days, high within 5, medium within 10, low beyond that or without a deadline.
+        """
         today = timezone.now().date()
-        days_until_deadline = (order.delivery_deadline - today).days
-        
-        if days_until_deadline <= 2:
-            return 'critical'
-        elif days_until_deadline <= 5:
-            return 'high'
-        elif days_until_deadline <= 10:
-            return 'medium'
-        else:
-            return 'low'
+        return Case(
+            When(delivery_deadline__isnull=True, then=Value(3)),
+            When(delivery_deadline__lte=today + timedelta(days=2), then=Value(0)),
+            When(delivery_deadline__lte=today + timedelta(days=5), then=Value(1)),
+            When(delivery_deadline__lte=today + timedelta(days=10), then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField(),
+        )
     
     def _format_duration(self, duration):
         """Helper method to format duration"""